@@ -96,6 +96,25 @@ def create_s3_bucket_neobell():
         )
         print("Object Ownership set to BucketOwnerEnforced (ACLs effectively disabled).")
 
+        # 6. Abort abandoned multipart uploads
+        # Devices resume interrupted video uploads, but one that never finishes
+        # (e.g. the file was lost) would otherwise keep its parts billed forever.
+        print(f"Adding lifecycle rule to abort incomplete multipart uploads for bucket '{BUCKET_NAME}'...")
+        s3_client.put_bucket_lifecycle_configuration(
+            Bucket=BUCKET_NAME,
+            LifecycleConfiguration={
+                'Rules': [
+                    {
+                        'ID': 'AbortIncompleteMultipartUploads',
+                        'Filter': {'Prefix': 'video-messages/'},
+                        'Status': 'Enabled',
+                        'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 7}
+                    }
+                ]
+            }
+        )
+        print("Lifecycle rule applied.")
+
 
         print(f"\nConfiguration for bucket '{BUCKET_NAME}' complete.")
 
@@ -44,6 +44,7 @@ IOT_RULE_VIDEO_UPLOAD_REQ = "NeoBellRequestVideoUploadUrlRule"
 IOT_RULE_PERMISSIONS_REQ = "NeoBellRequestVisitorPermissionRule"
 IOT_RULE_PACKAGES_REQ = "NeoBellRequestPackageInfoRule"
 IOT_RULE_LOGS_SUBMIT = "NeoBellSubmitDeviceLogRule"
+IOT_RULE_PENDING_DELIVERIES_REQ = "NeoBellRequestPendingDeliveriesRule"
 
 # Bucket S3 (EXISTENTE)
 S3_BUCKET_NAME = "neobell-videomessages-hbwho"
@@ -107,6 +108,7 @@ def create_or_update_iot_device_policy():
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/status",
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/permissions/request",
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/packages/request",
+                    f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/packages/pending/request",
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/logs/submit"
                 ]
             },
@@ -118,7 +120,9 @@ def create_or_update_iot_device_policy():
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topicfilter/neobell/sbc/${{iot:ClientId}}/messages/upload-url-response",
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topicfilter/neobell/commands",
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topicfilter/neobell/sbc/${{iot:ClientId}}/permissions/response",
-                    f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topicfilter/neobell/sbc/${{iot:ClientId}}/packages/response"
+                    f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topicfilter/neobell/sbc/${{iot:ClientId}}/packages/response",
+                    f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topicfilter/neobell/sbc/${{iot:ClientId}}/packages/pending/response",
+                    f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topicfilter/neobell/sbc/${{iot:ClientId}}/packages/pending/changed"
                 ]
             },
             {
@@ -129,7 +133,9 @@ def create_or_update_iot_device_policy():
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/messages/upload-url-response",
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/commands",
                     f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/permissions/response",
-                    f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/packages/response"
+                    f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/packages/response",
+                    f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/packages/pending/response",
+                    f"arn:aws:iot:{AWS_REGION}:{ACCOUNT_ID}:topic/neobell/sbc/${{iot:ClientId}}/packages/pending/changed"
                 ]
             }
         ]
@@ -598,6 +604,11 @@ def main():
             sql_query=f"SELECT *, topic(3) as sbc_id, topic() as invoking_topic FROM 'neobell/sbc/+/logs/submit'",
             target_lambda_arn=lambda_sbc_helper_arn
         )
+        create_or_update_iot_rule(
+            rule_name=IOT_RULE_PENDING_DELIVERIES_REQ,
+            sql_query=f"SELECT *, topic(3) as sbc_id, topic() as invoking_topic FROM 'neobell/sbc/+/packages/pending/request'",
+            target_lambda_arn=lambda_sbc_helper_arn
+        )
 
     # 6. Notificações de Evento S3
     print("\n--- 6. Configurando Notificações de Evento S3 ---")
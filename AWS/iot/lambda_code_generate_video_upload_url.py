@@ -16,12 +16,47 @@ AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
 
 RESPONSE_TOPIC_TEMPLATE = "neobell/sbc/{sbc_id}/messages/upload-url-response"
 PRESIGNED_URL_EXPIRATION = 300  # Segundos (5 minutos)
+MULTIPART_THRESHOLD_BYTES = int(os.environ.get('MULTIPART_THRESHOLD_BYTES', 16 * 1024 * 1024))
+MULTIPART_PART_SIZE = 8 * 1024 * 1024  # Mínimo do S3 é 5 MB por parte (exceto a última)
+MULTIPART_MAX_PARTS = 100  # Mantém a resposta (uma URL por parte) abaixo do limite de 128 KB do MQTT
+MULTIPART_URL_EXPIRATION = 3600  # Mais longo: as partes podem ser enviadas ao longo de várias tentativas
 REQUIRED_PERMISSION_FOR_VIDEO = "Allowed"
 
 s3_client = boto3.client('s3', region_name="us-east-1", config=boto3.session.Config(signature_version='s3v4'))
 iot_data_client = boto3.client('iot-data', region_name="us-east-1")
 dynamodb_resource = boto3.resource('dynamodb', region_name="us-east-1")
 
+def presign_multipart_upload(object_key, upload_id, size_bytes):
+    """
+    Gera as URLs pré-assinadas de cada parte e a de conclusão de um upload
+    multipart. Usada tanto para um upload novo quanto para retomar um upload
+    interrompido (mesmo upload_id), já que as URLs antigas podem ter expirado.
+    """
+    part_size = max(MULTIPART_PART_SIZE, -(-size_bytes // MULTIPART_MAX_PARTS))
+    part_count = max(1, -(-size_bytes // part_size))
+    part_urls = [
+        s3_client.generate_presigned_url(
+            ClientMethod='upload_part',
+            Params={'Bucket': S3_BUCKET_NAME, 'Key': object_key, 'UploadId': upload_id, 'PartNumber': number},
+            ExpiresIn=MULTIPART_URL_EXPIRATION,
+            HttpMethod='PUT'
+        )
+        for number in range(1, part_count + 1)
+    ]
+    complete_url = s3_client.generate_presigned_url(
+        ClientMethod='complete_multipart_upload',
+        Params={'Bucket': S3_BUCKET_NAME, 'Key': object_key, 'UploadId': upload_id},
+        ExpiresIn=MULTIPART_URL_EXPIRATION,
+        HttpMethod='POST'
+    )
+    return {
+        'upload_id': upload_id,
+        'object_key': object_key,
+        'part_size': part_size,
+        'part_urls': part_urls,
+        'complete_url': complete_url
+    }
+
 def lambda_handler(event, context):
     logger.info(f"NeoBellGenerateVideoUploadUrlHandler - Evento recebido: {json.dumps(event)}")
 
@@ -32,6 +67,7 @@ def lambda_handler(event, context):
 
     sbc_id = event.get('sbc_id') # Injetado pela Regra IoT (ex: topic(3))
     visitor_face_tag_id = event.get('visitor_face_tag_id')
+    request_id = event.get('request_id') # Ecoado na resposta para o SBC correlacionar
     if not sbc_id or not visitor_face_tag_id:
         logger.error("Requisição incompleta. sbc_id e visitor_face_tag_id são obrigatórios")
         return {'statusCode': 400, 'body': json.dumps({'error': 'sbc_id e visitor_face_tag_id são obrigatórios'})}
@@ -45,6 +81,13 @@ def lambda_handler(event, context):
         except ValueError:
             logger.warning(f"Valor de duration_sec inválido: {duration_sec_str}. Será ignorado.")
 
+    # Tamanho do vídeo, enviado pelo SBC para decidir entre PUT único e multipart
+    size_bytes = None
+    try:
+        size_bytes = int(event['size_bytes']) if event.get('size_bytes') is not None else None
+    except (TypeError, ValueError):
+        logger.warning(f"Valor de size_bytes inválido: {event.get('size_bytes')}. Será ignorado.")
+
     try:
             # 1. Consultar NeoBellDevices para obter owner_user_id
         devices_table = dynamodb_resource.Table(NEOBELLDEVICES_TABLE_NAME)
@@ -67,7 +110,7 @@ def lambda_handler(event, context):
         if 'Item' not in permission_response:
             logger.warning(f"Permissão não encontrada para owner_user_id: {owner_user_id}, visitor_face_tag_id: {visitor_face_tag_id}. Upload não autorizado.")
             topic_to_publish_error = RESPONSE_TOPIC_TEMPLATE.format(sbc_id=sbc_id)
-            error_payload = {'error': 'Visitor not recognized or no permissions set.', 'visitor_face_tag_id': visitor_face_tag_id}
+            error_payload = {'error': 'Visitor not recognized or no permissions set.', 'visitor_face_tag_id': visitor_face_tag_id, 'request_id': request_id}
             iot_data_client.publish(topic=topic_to_publish_error, qos=1, payload=json.dumps(error_payload))
             return {'statusCode': 403, 'body': json.dumps({'error': 'Visitante não reconhecido ou sem permissões configuradas.'})}
 
@@ -80,10 +123,24 @@ def lambda_handler(event, context):
         if permission_level != REQUIRED_PERMISSION_FOR_VIDEO:
             logger.warning(f"Visitante {visitor_name} (face_tag: {visitor_face_tag_id}) não tem a permissão '{REQUIRED_PERMISSION_FOR_VIDEO}' (tem '{permission_level}'). Upload não autorizado.")
             topic_to_publish_error = RESPONSE_TOPIC_TEMPLATE.format(sbc_id=sbc_id)
-            error_payload = {'error': f'Visitor does not have permission to leave video messages. Required: {REQUIRED_PERMISSION_FOR_VIDEO}, Found: {permission_level}', 'visitor_face_tag_id': visitor_face_tag_id}
+            error_payload = {'error': f'Visitor does not have permission to leave video messages. Required: {REQUIRED_PERMISSION_FOR_VIDEO}, Found: {permission_level}', 'visitor_face_tag_id': visitor_face_tag_id, 'request_id': request_id}
             iot_data_client.publish(topic=topic_to_publish_error, qos=1, payload=json.dumps(error_payload))
             return {'statusCode': 403, 'body': json.dumps({'error': 'Visitante não tem permissão para deixar mensagens de vídeo.'})}
 
+        # Retomada de um upload multipart interrompido: apenas gera novas URLs para o mesmo upload
+        resume_upload_id = event.get('upload_id')
+        resume_object_key = event.get('object_key')
+        if resume_upload_id and resume_object_key and size_bytes:
+            if not resume_object_key.startswith(f"video-messages/{sbc_id}/"):
+                logger.error(f"object_key {resume_object_key} não pertence ao sbc_id {sbc_id}.")
+                return {'statusCode': 403, 'body': json.dumps({'error': 'object_key inválido para este dispositivo.'})}
+            response_payload_mqtt = presign_multipart_upload(resume_object_key, resume_upload_id, size_bytes)
+            response_payload_mqtt['request_id'] = request_id
+            topic_to_publish = RESPONSE_TOPIC_TEMPLATE.format(sbc_id=sbc_id)
+            iot_data_client.publish(topic=topic_to_publish, qos=1, payload=json.dumps(response_payload_mqtt))
+            logger.info(f"URLs multipart regeneradas para retomar o upload {resume_upload_id} ({resume_object_key}).")
+            return {'statusCode': 200, 'body': json.dumps({'message': 'URLs multipart regeneradas.', 'published_to_topic': topic_to_publish})}
+
         # 2. Gerar message_id e recorded_at timestamp
         message_id = str(uuid.uuid4())
         recorded_at = datetime.now(timezone.utc).isoformat()
@@ -107,6 +164,26 @@ def lambda_handler(event, context):
         if duration_sec is not None:
             required_metadata["duration-sec"] = str(duration_sec)
 
+        if size_bytes and size_bytes > MULTIPART_THRESHOLD_BYTES:
+            # Vídeos grandes: upload multipart, os metadados são definidos na criação do upload
+            multipart = s3_client.create_multipart_upload(
+                Bucket=S3_BUCKET_NAME,
+                Key=object_key,
+                ContentType='video/mp4',
+                Metadata=required_metadata
+            )
+            response_payload_mqtt = presign_multipart_upload(object_key, multipart['UploadId'], size_bytes)
+            response_payload_mqtt.update({'message_id': message_id, 'request_id': request_id})
+            logger.info(f"Upload multipart criado: {multipart['UploadId']} ({len(response_payload_mqtt['part_urls'])} partes).")
+
+            topic_to_publish = RESPONSE_TOPIC_TEMPLATE.format(sbc_id=sbc_id)
+            iot_data_client.publish(topic=topic_to_publish, qos=1, payload=json.dumps(response_payload_mqtt))
+            logger.info(f"Resposta publicada no tópico MQTT: {topic_to_publish}")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Upload multipart criado e publicado no MQTT.', 'published_to_topic': topic_to_publish})
+            }
+
         presigned_url_params = {
             'Bucket': S3_BUCKET_NAME,
             'Key': object_key,
@@ -126,7 +203,8 @@ def lambda_handler(event, context):
             'presigned_url': presigned_url,
             'message_id': message_id,
             'object_key': object_key,
-            'required_metadata_headers': {f"x-amz-meta-{k.lower()}": v for k,v in required_metadata.items()}
+            'required_metadata_headers': {f"x-amz-meta-{k.lower()}": v for k,v in required_metadata.items()},
+            'request_id': request_id
         }
 
         topic_to_publish = RESPONSE_TOPIC_TEMPLATE.format(sbc_id=sbc_id)
@@ -29,6 +29,7 @@ def lambda_handler(event, context):
     face_tag_id = event.get('face_tag_id')
     visitor_name = event.get('visitor_name')
     permission_level = event.get('permission_level')
+    request_id = event.get('request_id') # Ecoado na resposta para o SBC correlacionar
     if not all([sbc_id, face_tag_id, visitor_name]):
         logger.error("Requição incompleta. sbc_id, face_tag_id, visitor_name e permission_level são obrigatório")
         topic_to_publish_error = RESPONSE_TOPIC_TEMPLATE.format(sbc_id=sbc_id)
@@ -37,7 +38,8 @@ def lambda_handler(event, context):
             'sbc_id': sbc_id,
             'face_tag_id': face_tag_id,
             'visitor_name': visitor_name,
-            'permission_level': permission_level
+            'permission_level': permission_level,
+            'request_id': request_id
         }
         iot_data_client.publish(topic=topic_to_publish_error, qos=1, payload=json.dumps(error_payload))
         return {'statusCode': 400, 'body': json.dumps({'error': 'sbc_id, face_tag_id, visitor_name e permission_level são obrigatório'})}
@@ -51,7 +53,8 @@ def lambda_handler(event, context):
             'sbc_id': sbc_id,
             'face_tag_id': face_tag_id,
             'visitor_name': visitor_name,
-            'permission_level': permission_level
+            'permission_level': permission_level,
+            'request_id': request_id
         }
         iot_data_client.publish(topic=topic_to_publish_error, qos=1, payload=json.dumps(error_payload))
         return {'statusCode': 400, 'body': json.dumps({'error': 'Nível de permissão inválido. Deve ser "Allowed" ou "Denied"'})}
@@ -90,7 +93,8 @@ def lambda_handler(event, context):
             'visitor_name': visitor_name,
             'permission_level': permission_level,
             'message': 'Use esta URL para fazer upload da imagem do visitante com os metadados corretos.',
-            'required_metadata_headers': {f"x-amz-meta-{k.lower()}": v for k,v in required_metadata.items()}
+            'required_metadata_headers': {f"x-amz-meta-{k.lower()}": v for k,v in required_metadata.items()},
+            'request_id': request_id
         }
 
         topic_to_publish = RESPONSE_TOPIC_TEMPLATE.format(sbc_id=sbc_id)
@@ -16,12 +16,14 @@ EXPECTEDDELIVERIES_TABLE_NAME = os.environ.get('EXPECTEDDELIVERIES_TABLE_NAME',
 EVENTLOGS_TABLE_NAME = os.environ.get('EVENTLOGS_TABLE_NAME', 'EventLogs')
 DEVICEUSERLINKS_TABLE_NAME = os.environ.get('DEVICEUSERLINKS_TABLE_NAME', 'DeviceUserLinks')
 USER_NFC_TAGS_TABLE_NAME = os.environ.get('USER_NFC_TAGS_TABLE_NAME', 'UserNFCTags')
+USER_ID_STATUS_INDEX_NAME = os.environ.get('USER_ID_STATUS_INDEX', 'user-id-status-index') # PK: user_id, SK: status
 
 # Tópicos de resposta MQTT (parciais, sbc_id será formatado)
 PERMISSIONS_RESPONSE_TOPIC_TPL = "neobell/sbc/{sbc_id}/permissions/response"
 PACKAGES_RESPONSE_TOPIC_TPL = "neobell/sbc/{sbc_id}/packages/response"
 NFC_VERIFY_RESPONSE_TOPIC_TPL = "neobell/sbc/{sbc_id}/nfc/verify-tag/response"
 PACKAGE_STATUS_UPDATE_RESPONSE_TOPIC_TPL = "neobell/sbc/{sbc_id}/packages/status-update/response"
+PENDING_DELIVERIES_RESPONSE_TOPIC_TPL = "neobell/sbc/{sbc_id}/packages/pending/response"
 
 # Clientes AWS
 dynamodb_resource = boto3.resource('dynamodb', region_name=AWS_REGION)
@@ -201,6 +203,50 @@ def handle_package_request(sbc_id, payload):
         }
         return error_response_data
 
+def handle_pending_deliveries_request(sbc_id, payload):
+    """
+    Retorna um snapshot das encomendas pendentes (com tracking_number) de todos os
+    usuários vinculados ao SBC, para o cache local do dispositivo.
+    """
+    logger.info(f"Processando pending_deliveries_request para sbc_id: {sbc_id}")
+
+    if not EXPECTEDDELIVERIES_TABLE_NAME:
+        logger.error("Nome da tabela ExpectedDeliveries não configurado.")
+        return {"error": "Configuração da tabela de entregas esperadas ausente."}
+
+    try:
+        linked_user_ids = get_users_for_sbc(sbc_id)
+        deliveries_table = dynamodb_resource.Table(EXPECTEDDELIVERIES_TABLE_NAME)
+        deliveries = []
+
+        for user_id in linked_user_ids:
+            query_args = {
+                'IndexName': USER_ID_STATUS_INDEX_NAME,
+                'KeyConditionExpression': boto3.dynamodb.conditions.Key('user_id').eq(user_id) &
+                                          boto3.dynamodb.conditions.Key('status').eq('pending'),
+                'ProjectionExpression': 'user_id, order_id, tracking_number, carrier',
+            }
+            while True:
+                response = deliveries_table.query(**query_args)
+                for item in response.get('Items', []):
+                    if item.get('tracking_number'):
+                        deliveries.append({
+                            "tracking_number": item['tracking_number'],
+                            "order_id": item.get('order_id'),
+                            "user_id": item.get('user_id'),
+                            "carrier": item.get('carrier'),
+                        })
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        logger.info(f"{len(deliveries)} encomendas pendentes encontradas para sbc_id {sbc_id}.")
+        return {"deliveries": deliveries, "generated_at": datetime.now(timezone.utc).isoformat()}
+
+    except Exception as e:
+        logger.error(f"Erro crítico em handle_pending_deliveries_request para sbc_id {sbc_id}: {str(e)}", exc_info=True)
+        return {"error": "Erro interno do servidor ao listar encomendas pendentes."}
+
 def handle_package_status_update(sbc_id, payload):
     """
     Atualiza o status de um pacote específico.
@@ -313,43 +359,67 @@ def handle_package_status_update(sbc_id, payload):
             "requested_status": new_status
         }
 
+def _build_log_item(sbc_id, entry, received_at):
+    """Valida uma entrada de log e monta o item da tabela EventLogs. Retorna (item, erro)."""
+    log_timestamp = entry.get('log_timestamp')
+    event_type = entry.get('event_type')
+    event_details = entry.get('event_details', {})
+
+    if not log_timestamp or not event_type:
+        return None, 'Dados de log insuficientes.'
+    if not isinstance(event_details, dict):
+        return None, 'event_details deve ser um dicionário.'
+
+    return {
+        'log_source_id': sbc_id,
+        'timestamp_uuid': f"{log_timestamp}_{str(uuid.uuid4())}",
+        'event_type': event_type,
+        'timestamp': log_timestamp,
+        'received_at': received_at,
+        'summary': entry.get('summary', ''),
+        'details': event_details
+    }, None
+
 def handle_log_submission(sbc_id, payload):
-    logger.info(f"Processando enviar_log para sbc_id: {sbc_id}, payload: {payload}")
+    """
+    Salva os logs enviados pelo SBC. O firmware atual envia lotes em
+    payload['logs']; um payload com uma única entrada (firmware antigo)
+    continua aceito.
+    """
     if not EVENTLOGS_TABLE_NAME:
         logger.error("Nome da tabela EventLogs não configurado.")
         return {'error': 'Configuração da tabela de logs ausente.'}
 
-    log_timestamp = payload.get('log_timestamp') 
-    event_type = payload.get('event_type')
-    summary = payload.get('summary', '')
-    event_details = payload.get('event_details', {})
-
-    if not log_timestamp or not event_type:
-        logger.error("log_timestamp ou event_type ausente no payload para log.")
+    entries = payload.get('logs')
+    if entries is None:
+        entries = [payload]
+    if not isinstance(entries, list):
+        logger.error("'logs' deve ser uma lista.")
+        return {'error': "'logs' deve ser uma lista."}
+    logger.info(f"Processando enviar_log para sbc_id: {sbc_id}, {len(entries)} entrada(s).")
+
+    received_at = datetime.now(timezone.utc).isoformat()
+    items, rejected = [], 0
+    for entry in entries:
+        item, error = _build_log_item(sbc_id, entry, received_at) if isinstance(entry, dict) else (None, 'Entrada de log inválida.')
+        if error:
+            logger.error(f"Entrada de log ignorada: {error} Entrada: {entry}")
+            rejected += 1
+            continue
+        items.append(item)
+
+    if not items:
         return {'error': 'Dados de log insuficientes.'}
-        
-    if not isinstance(event_details, dict):
-        logger.error("event_details deve ser um dicionário.")
-        return {'error': 'event_details deve ser um dicionário.'}
 
     try:
-        sort_key_value = f"{log_timestamp}_{str(uuid.uuid4())}" 
-
         event_logs_table = dynamodb_resource.Table(EVENTLOGS_TABLE_NAME)
-        item_to_log = {
-            'log_source_id': sbc_id,
-            'timestamp_uuid': sort_key_value, 
-            'event_type': event_type,
-            'timestamp': log_timestamp, 
-            'received_at': datetime.now(timezone.utc).isoformat(),
-            'summary': summary,
-            'details': event_details
-        }
-        
-        event_logs_table.put_item(Item=item_to_log)
-        logger.info(f"Log salvo na tabela '{EVENTLOGS_TABLE_NAME}': {item_to_log}")
+        # batch_writer agrupa em BatchWriteItem de até 25 itens e reenvia os não processados
+        with event_logs_table.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+        logger.info(f"{len(items)} log(s) salvo(s) na tabela '{EVENTLOGS_TABLE_NAME}', {rejected} ignorado(s).")
 
-        return {'message': 'Log recebido e processado.'}
+        return {'message': 'Log recebido e processado.', 'saved': len(items), 'rejected': rejected}
 
     except Exception as e:
         logger.error(f"Erro crítico em handle_log_submission para sbc_id {sbc_id}: {str(e)}", exc_info=True)
@@ -452,6 +522,13 @@ def lambda_handler(event, context):
              topic_parts[5] == 'request':
             action_type = 'package_status_update'
         
+        # Formato: neobell/sbc/{sbc_id_from_topic}/packages/pending/request (6 partes)
+        elif len(topic_parts) == 6 and \
+             topic_parts[0] == 'neobell' and topic_parts[1] == 'sbc' and \
+             topic_parts[3] == 'packages' and topic_parts[4] == 'pending' and \
+             topic_parts[5] == 'request':
+            action_type = 'pending_deliveries_request'
+        
         # Formato: neobell/sbc/{sbc_id_from_topic}/action_keyword/verb (5 partes)
         elif len(topic_parts) == 5 : 
             potential_action_keyword = topic_parts[3] # permissions, packages, logs
@@ -488,6 +565,9 @@ def lambda_handler(event, context):
     elif action_type == 'package_status_update':
         response_topic = PACKAGE_STATUS_UPDATE_RESPONSE_TOPIC_TPL.format(sbc_id=sbc_id)
         result_payload_for_lambda_body = handle_package_status_update(sbc_id, event)
+    elif action_type == 'pending_deliveries_request':
+        response_topic = PENDING_DELIVERIES_RESPONSE_TOPIC_TPL.format(sbc_id=sbc_id)
+        result_payload_for_lambda_body = handle_pending_deliveries_request(sbc_id, event)
     elif action_type == 'log_submission':
         result_payload_for_lambda_body = handle_log_submission(sbc_id, event)
     elif action_type == 'nfc_verify_request':
@@ -507,6 +587,10 @@ def lambda_handler(event, context):
         else:
             lambda_response_status_code = 400
 
+    # Ecoa o request_id do SBC para que ele associe a resposta à requisição certa
+    if isinstance(result_payload_for_lambda_body, dict) and event.get('request_id'):
+        result_payload_for_lambda_body['request_id'] = event['request_id']
+
     if response_topic and isinstance(result_payload_for_lambda_body, dict):
         try:
             iot_data_client.publish(topic=response_topic, qos=1, payload=json.dumps(result_payload_for_lambda_body))
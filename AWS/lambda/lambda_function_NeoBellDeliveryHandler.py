@@ -15,14 +15,21 @@ logger.setLevel(logging.INFO)
 
 # Initialize AWS clients (outside handler for reuse)
 DYNAMODB_CLIENT = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+IOT_DATA_CLIENT = boto3.client('iot-data', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
 
 # DynamoDB Table Names (from environment variables)
 EXPECTED_DELIVERIES_TABLE_NAME = os.environ.get('EXPECTED_DELIVERIES_TABLE', 'ExpectedDeliveries')
 expected_deliveries_table = DYNAMODB_CLIENT.Table(EXPECTED_DELIVERIES_TABLE_NAME)
+DEVICE_USER_LINKS_TABLE_NAME = os.environ.get('DEVICE_USER_LINKS_TABLE', 'DeviceUserLinks')
+device_user_links_table = DYNAMODB_CLIENT.Table(DEVICE_USER_LINKS_TABLE_NAME)
 
 # Index Names (adjust according to your actual table definition)
 # Example: GSI to query by user_id and status
 USER_ID_STATUS_INDEX_NAME = os.environ.get('USER_ID_STATUS_INDEX', 'user-id-status-index') # PK: user_id, SK: status
+USER_ID_SBC_ID_INDEX_NAME = os.environ.get('USER_ID_SBC_ID_INDEX', 'user-id-sbc-id-index') # PK: user_id, SK: sbc_id
+
+# Devices keep a local snapshot of pending deliveries; this topic tells them to re-sync
+PENDING_DELIVERIES_CHANGED_TOPIC_TPL = "neobell/sbc/{sbc_id}/packages/pending/changed"
 
 # --- Utility Functions ---
 
@@ -70,6 +77,26 @@ def format_error_response(status_code, error_message, details=None):
         error_body['details'] = details
     return format_response(status_code, error_body)
 
+def notify_linked_devices(user_id, order_id):
+    """
+    Tells every device linked to the user that its pending deliveries changed,
+    so it refreshes its local cache. Failures are logged, never raised: the
+    devices also re-sync periodically.
+    """
+    try:
+        response = device_user_links_table.query(
+            IndexName=USER_ID_SBC_ID_INDEX_NAME,
+            KeyConditionExpression=boto3.dynamodb.conditions.Key('user_id').eq(user_id)
+        )
+        for link in response.get('Items', []):
+            IOT_DATA_CLIENT.publish(
+                topic=PENDING_DELIVERIES_CHANGED_TOPIC_TPL.format(sbc_id=link['sbc_id']),
+                qos=1,
+                payload=json.dumps({"order_id": order_id})
+            )
+    except Exception as e:
+        logger.warning(f"Could not notify devices of user {user_id} about delivery {order_id}: {e}")
+
 # --- Endpoint Handlers ---
 
 def handle_get_deliveries(requesting_user_id, path_params, query_params, body):
@@ -194,6 +221,7 @@ def handle_post_deliveries(requesting_user_id, path_params, query_params, reques
             Item=delivery_item,
             ConditionExpression="attribute_not_exists(order_id)" # Prevent overwrite if order_id already exists for this user
         )
+        notify_linked_devices(requesting_user_id, order_id)
         return format_response(201, delivery_item)
     except ClientError as e:
         if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
@@ -303,6 +331,7 @@ def handle_put_delivery_by_id(requesting_user_id, path_params, query_params, req
             ConditionExpression="attribute_exists(order_id)", # Ensure delivery exists
             ReturnValues="ALL_NEW" 
         )
+        notify_linked_devices(requesting_user_id, order_id)
         return format_response(200, response.get('Attributes'))
     except ClientError as e:
         if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
@@ -328,6 +357,7 @@ def handle_delete_delivery_by_id(requesting_user_id, path_params, query_params,
             Key={'user_id': requesting_user_id, 'order_id': order_id},
             ConditionExpression="attribute_exists(order_id)" # Optional: ensure it exists to return 404 if not
         )
+        notify_linked_devices(requesting_user_id, order_id)
         return format_response(204, "") # No content for successful DELETE
     except ClientError as e:
         if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
@@ -0,0 +1,85 @@
+import os
+import re
+import json
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CARRIERS_FILE = Path(
+    os.getenv("CARRIERS_FILE", Path(__file__).resolve().parent.parent / "config" / "carriers.json")
+)
+
+
+class CarrierRegistry:
+    """
+    Tracking-number formats of the supported carriers, compiled once into a
+    single alternation regex with one named group per format. Matching a code
+    is one regex call, and the matching group tells which carrier it belongs to.
+
+    The first format that matches wins, so specific formats (AM...SQ) must be
+    listed before generic ones ([A-Z]{2}...[A-Z]{2}). An optional example code
+    per format is checked at load to resolve to its own carrier, so a
+    misordered list fails at startup instead of mislabeling packages.
+    """
+
+    def __init__(self, carriers: list[dict]):
+        """
+        Args:
+            carriers: [{"name": ..., "pattern": ..., "example": ...}, ...].
+                Patterns must match the whole upper-cased code and may not
+                contain capturing groups. "example" is optional.
+
+        Raises:
+            ValueError: If a pattern is invalid or has capturing groups, or an
+                example does not resolve to its own carrier.
+        """
+        self.carriers = []
+        alternatives = []
+        for i, carrier in enumerate(carriers):
+            name, pattern = carrier["name"], carrier["pattern"].strip("^$")
+            try:
+                groups = re.compile(pattern).groups
+            except re.error as e:
+                raise ValueError(f"Invalid pattern for carrier '{name}': {e}") from e
+            if groups:
+                raise ValueError(f"Pattern for carrier '{name}' has capturing groups; use (?:...) instead.")
+            self.carriers.append((name, pattern))
+            alternatives.append(f"(?P<c{i}>{pattern})")
+        self._regex = re.compile("|".join(alternatives)) if alternatives else None
+        self._check_examples(carriers)
+
+    def _check_examples(self, carriers: list[dict]):
+        """Raises ValueError if an example is not matched by its pattern or is shadowed by an earlier one."""
+        for (name, pattern), carrier in zip(self.carriers, carriers):
+            example = carrier.get("example")
+            if example is None:
+                continue
+            if not re.fullmatch(pattern, example.upper()):
+                raise ValueError(f"Example '{example}' does not match the pattern of carrier '{name}'.")
+            resolved = self.match(example)
+            if resolved != name:
+                raise ValueError(
+                    f"Example '{example}' of carrier '{name}' resolves to '{resolved}'; "
+                    f"list more specific patterns before generic ones."
+                )
+
+    @classmethod
+    def from_file(cls, path: Path = CARRIERS_FILE) -> "CarrierRegistry":
+        """Loads the registry from a JSON file with a "carriers" list."""
+        with open(path, "r", encoding="utf-8") as f:
+            carriers = json.load(f)["carriers"]
+        logger.info(f"Loaded {len(carriers)} carrier patterns from {path}.")
+        return cls(carriers)
+
+    def match(self, tracking_number: str) -> str | None:
+        """Returns the carrier name for a tracking number, or None if no format matches."""
+        if not tracking_number or self._regex is None:
+            return None
+        match = self._regex.fullmatch(tracking_number.upper().strip())
+        if match is None:
+            return None
+        return self.carriers[int(match.lastgroup[1:])][0]
+
+    def __len__(self) -> int:
+        return len(self.carriers)
@@ -0,0 +1,361 @@
+import os
+import sys
+import time
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable
+
+import numpy as np
+from pyzbar import pyzbar
+from pylibdmtx.pylibdmtx import decode as DMReader
+
+logger = logging.getLogger(__name__)
+
+DATA_MATRIX_TIMEOUT_MS = 800
+# Leave one core for the camera grabber, TTS worker and MQTT callbacks
+DEFAULT_WORKERS = int(os.getenv("OCR_DECODER_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+# Frames waiting for decode before the oldest is dropped
+DEFAULT_QUEUE_FRAMES = int(os.getenv("OCR_DECODER_QUEUE_FRAMES", "2"))
+# "thread" decodes inside this interpreter, "process" in worker processes outside the GIL
+DEFAULT_BACKEND = os.getenv("OCR_DECODER_BACKEND", "thread")
+# Times the process pool is rebuilt after a worker crash before decoding moves to threads for good
+MAX_POOL_RESTARTS = 3
+
+Code = tuple[str, str]  # (data, symbology)
+
+
+def decode_qr(image: Any) -> list[Code]:
+    """QR codes and 1D barcodes found by zbar."""
+    return [(code.data.decode("utf-8"), code.type) for code in pyzbar.decode(image)]
+
+
+def decode_datamatrix(image: Any) -> list[Code]:
+    """DataMatrix codes found by libdmtx, bounded by DATA_MATRIX_TIMEOUT_MS."""
+    return [
+        (obj.data.decode("utf-8"), "DATAMATRIX")
+        for obj in DMReader(image, timeout=DATA_MATRIX_TIMEOUT_MS)
+        if obj.data
+    ]
+
+
+DECODERS: dict[str, Callable[[Any], list[Code]]] = {
+    "pyzbar": decode_qr,
+    "datamatrix": decode_datamatrix,
+}
+
+
+class DecoderPool:
+    """
+    Fixed set of long-lived decoder threads fed from a bounded job queue.
+
+    Every submitted frame becomes one job per decoder. When the queue already
+    holds `queue_frames` frames worth of jobs the oldest job is dropped, so a
+    slow DataMatrix decode can never make work pile up: at most `workers`
+    decodes run at once and the queue always holds the freshest frames.
+    """
+
+    def __init__(self, decoders: dict[str, Callable[[Any], list[Code]]] = None,
+                 workers: int = DEFAULT_WORKERS, queue_frames: int = DEFAULT_QUEUE_FRAMES):
+        self.decoders = decoders or DECODERS
+        self.workers = workers
+        self.max_jobs = queue_frames * len(self.decoders)
+
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._threads: list[threading.Thread] = []
+
+        self._stats_lock = threading.Lock()
+        self._stats = {name: {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0} for name in self.decoders}
+        self.dropped = 0
+
+    def start(self):
+        """Starts the worker threads. Idempotent."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"decoder-{i}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+        logger.info(f"Decoder pool started with {self.workers} workers for {', '.join(self.decoders)}.")
+
+    def stop(self, timeout: float = 2.0):
+        """Discards pending jobs and waits for the workers to exit."""
+        with self._cond:
+            self._running = False
+            self._discard_jobs()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, images: list[Any], on_codes: Callable[[list[Code]], None]):
+        """
+        Queues the images of one frame (full frame, code crops or tiles) for
+        every decoder; each job decodes all of them. `on_codes` is called from
+        a worker thread with the codes each decoder finds (only when it finds some).
+        """
+        frames = [self._wrap(image) for image in images]
+        with self._cond:
+            for name in self.decoders:
+                if len(self._jobs) >= self.max_jobs:
+                    self._release_all(self._jobs.popleft()[1])
+                    self.dropped += 1
+                self._jobs.append((name, frames, on_codes))
+            self._cond.notify_all()
+
+    def clear(self):
+        """Drops the jobs not yet picked up, e.g. when a scan is over."""
+        with self._cond:
+            self._discard_jobs()
+
+    def _discard_jobs(self):
+        while self._jobs:
+            self._release_all(self._jobs.popleft()[1])
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and not self._jobs:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                name, frames, on_codes = self._jobs.popleft()
+
+            start = time.monotonic()
+            codes = []
+            try:
+                for frame in frames:
+                    codes.extend(self._run(name, frame))
+            except Exception as e:
+                logger.warning(f"Decoder '{name}' failed: {e}")
+            finally:
+                self._release_all(frames)
+            self._record(name, time.monotonic() - start)
+
+            if codes:
+                try:
+                    on_codes(codes)
+                except Exception as e:
+                    logger.warning(f"Handling codes from '{name}' failed: {e}")
+
+    def _wrap(self, image: Any) -> Any:
+        """Turns a submitted image into what the jobs carry."""
+        return image
+
+    def _run(self, name: str, frame: Any) -> list[Code]:
+        return self.decoders[name](frame)
+
+    def _release(self, frame: Any):
+        """Called once per job of the frame when it is done or dropped."""
+
+    def _release_all(self, frames: list[Any]):
+        for frame in frames:
+            self._release(frame)
+
+    def _record(self, name: str, elapsed: float):
+        with self._stats_lock:
+            stats = self._stats[name]
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            stats["last"] = elapsed
+        if elapsed > 1.0:
+            logger.warning(f"Decoder '{name}' took too long: {elapsed:.2f}s")
+
+    def latency(self) -> dict:
+        """Per-decoder call count and mean/max/last latency in milliseconds."""
+        with self._stats_lock:
+            return {
+                name: {
+                    "count": s["count"],
+                    "mean_ms": round(s["total"] / s["count"] * 1000, 1) if s["count"] else None,
+                    "max_ms": round(s["max"] * 1000, 1),
+                    "last_ms": round(s["last"] * 1000, 1),
+                }
+                for name, s in self._stats.items()
+            }
+
+
+class _SharedFrame:
+    """
+    A frame copied once into a shared memory block that every decoder job of
+    that frame reads from. The block is unlinked when the last job releases it.
+    """
+
+    def __init__(self, image: np.ndarray, jobs: int):
+        image = np.ascontiguousarray(image)
+        self.shape = image.shape
+        self.dtype = image.dtype.str
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        np.ndarray(image.shape, dtype=image.dtype, buffer=self.shm.buf)[...] = image
+        self._refs = jobs
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach_shared(shm_name: str) -> shared_memory.SharedMemory:
+    """Maps a block created by the parent without taking ownership of it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=shm_name, track=False)
+    # Before 3.13 attaching registers the block with the resource tracker as if this
+    # process had created it. The parent unlinks it, so the entry would never be
+    # removed: leak warnings at shutdown and a tracker table growing by one per frame.
+    # Unregistering afterwards isn't safe either: when the workers share the parent's
+    # tracker it would drop the parent's own entry. So the registration is skipped.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=shm_name)
+    finally:
+        resource_tracker.register = register
+
+
+def _decode_shared(name: str, shm_name: str, shape: tuple, dtype: str) -> list[Code]:
+    """Runs in a worker process: decodes a frame straight from shared memory."""
+    shm = _attach_shared(shm_name)
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        try:
+            return DECODERS[name](image)
+        finally:
+            # The view must be gone before the block can be closed
+            del image
+    finally:
+        shm.close()
+
+
+def _init_worker():
+    """Loads the native decoder libraries once per worker process."""
+    blank = np.full((64, 64), 255, dtype=np.uint8)
+    for decoder in DECODERS.values():
+        decoder(blank)
+
+
+class ProcessDecoderPool(DecoderPool):
+    """
+    DecoderPool whose decodes run in worker processes, so CPU-heavy libdmtx
+    work doesn't compete with the camera loop, TTS and MQTT callbacks for the
+    GIL. Each frame is copied once into shared memory and workers map it
+    instead of receiving a pickled array. Queueing, drop-oldest backpressure
+    and latency stats are the same as the thread pool; the dispatcher threads
+    only wait on the processes.
+
+    Decoders are looked up by name in DECODERS inside the workers, so only
+    registered decoders can be used.
+
+    A native decoder crash (zbar/dmtx segfault) breaks the whole executor.
+    The frame is then decoded in the dispatcher thread and the executor is
+    rebuilt; after MAX_POOL_RESTARTS crashes the pool keeps decoding in
+    threads, like DecoderPool.
+    """
+
+    def __init__(self, decoders: dict[str, Callable[[Any], list[Code]]] = None,
+                 workers: int = DEFAULT_WORKERS, queue_frames: int = DEFAULT_QUEUE_FRAMES):
+        super().__init__(decoders, workers, queue_frames)
+        unknown = set(self.decoders) - set(DECODERS)
+        if unknown:
+            raise ValueError(f"Process decoding only supports registered decoders, got: {', '.join(unknown)}")
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.restarts = 0
+
+    def start(self):
+        with self._executor_lock:
+            if self._executor is None and self.restarts <= MAX_POOL_RESTARTS:
+                self._executor = self._create_executor()
+        super().start()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # fork, not spawn: spawned children would re-import main.py and with it
+        # every model. Workers only run the decoders and never log, so the
+        # locks of the parent's other threads can't deadlock them.
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+        )
+        # Fork all workers now, while the service is starting, not mid-scan
+        executor.submit(int).result()
+        return executor
+
+    def stop(self, timeout: float = 2.0):
+        super().stop(timeout)
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _wrap(self, image: Any) -> _SharedFrame:
+        return _SharedFrame(image, jobs=len(self.decoders))
+
+    def _run(self, name: str, frame: _SharedFrame) -> list[Code]:
+        executor = self._executor
+        if executor is not None:
+            try:
+                future = executor.submit(_decode_shared, name, frame.shm.name, frame.shape, frame.dtype)
+                return future.result()
+            except BrokenProcessPool:
+                self._replace_broken(executor)
+        return self._run_in_thread(name, frame)
+
+    def _run_in_thread(self, name: str, frame: _SharedFrame) -> list[Code]:
+        image = np.ndarray(frame.shape, dtype=frame.dtype, buffer=frame.shm.buf)
+        try:
+            return self.decoders[name](image)
+        finally:
+            del image
+
+    def _replace_broken(self, executor: ProcessPoolExecutor):
+        """Rebuilds the executor once per crash, however many dispatchers saw it break."""
+        with self._executor_lock:
+            if self._executor is not executor:
+                return
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.restarts += 1
+            if self.restarts > MAX_POOL_RESTARTS:
+                logger.error(f"Decoder processes crashed {self.restarts} times, decoding in threads from now on.")
+                self._executor = None
+                return
+            logger.error(f"A decoder process crashed, restarting the process pool ({self.restarts}/{MAX_POOL_RESTARTS}).")
+            try:
+                self._executor = self._create_executor()
+            except Exception as e:
+                logger.error(f"Could not restart the decoder processes, decoding in threads: {e}")
+                self._executor = None
+
+    def _release(self, frame: _SharedFrame):
+        frame.release()
+
+
+def create_decoder_pool(backend: str = DEFAULT_BACKEND, **options) -> DecoderPool:
+    """
+    Builds the decoder pool for the configured backend.
+
+    Raises:
+        ValueError: If the backend is neither "thread" nor "process".
+    """
+    if backend == "thread":
+        return DecoderPool(**options)
+    if backend == "process":
+        return ProcessDecoderPool(**options)
+    raise ValueError(f"Unknown decoder backend '{backend}'. Use 'thread' or 'process'.")
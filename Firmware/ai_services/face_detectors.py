@@ -0,0 +1,148 @@
+import logging
+from typing import Callable
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# name: FaceDetector subclass
+DETECTORS: dict[str, type["FaceDetector"]] = {}
+
+Box = tuple[int, int, int, int, float]  # x, y, w, h, score in full-frame coordinates
+
+
+def register_detector(name: str) -> Callable[[type["FaceDetector"]], type["FaceDetector"]]:
+    """Class decorator that makes a detector selectable by name."""
+    def decorator(cls):
+        DETECTORS[name] = cls
+        cls.name = name
+        return cls
+    return decorator
+
+
+def create_detector(name: str, **options) -> "FaceDetector":
+    """
+    Builds a registered detector.
+
+    Args:
+        name: Registered detector name (see DETECTORS).
+        options: Detector-specific settings (input width, thresholds, model path...).
+
+    Raises:
+        ValueError: If no detector is registered under that name.
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector '{name}'. Available: {', '.join(sorted(DETECTORS))}")
+    return DETECTORS[name](**options)
+
+
+class FaceDetector:
+    """
+    Cheap first-stage detector used to decide whether a frame contains a face
+    at all, before the expensive DeepFace detection/alignment runs on it.
+    Frames are downscaled to `input_width` before detection.
+    """
+    name = "base"
+
+    def __init__(self, input_width: int = 320, min_score: float = 0.0):
+        self.input_width = input_width
+        self.min_score = min_score
+
+    def detect(self, image: np.ndarray) -> list[Box]:
+        """Returns the faces found in a BGR frame, in full-frame coordinates."""
+        small, scale = self._downscale(image)
+        boxes = self._detect(small)
+        return [
+            (int(x / scale), int(y / scale), int(w / scale), int(h / scale), score)
+            for x, y, w, h, score in boxes
+            if score >= self.min_score
+        ]
+
+    def _detect(self, image: np.ndarray) -> list[Box]:
+        raise NotImplementedError
+
+    def _downscale(self, image: np.ndarray) -> tuple[np.ndarray, float]:
+        scale = self.input_width / image.shape[1]
+        if scale >= 1.0:
+            return image, 1.0
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
+
+
+@register_detector("none")
+class PassThroughDetector(FaceDetector):
+    """Disables the gate: every frame is reported as one full-frame candidate."""
+
+    def detect(self, image: np.ndarray) -> list[Box]:
+        height, width = image.shape[:2]
+        return [(0, 0, width, height, 1.0)]
+
+
+@register_detector("haar")
+class HaarDetector(FaceDetector):
+    """OpenCV Haar cascade. Fastest option, frontal faces only."""
+
+    def __init__(self, input_width: int = 320, min_score: float = 0.0,
+                 scale_factor: float = 1.1, min_neighbors: int = 4, min_size: int = 24):
+        super().__init__(input_width, min_score)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+        if self.cascade.empty():
+            raise RuntimeError("Could not load the Haar frontal face cascade.")
+
+    def _detect(self, image: np.ndarray) -> list[Box]:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        faces = self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(self.min_size, self.min_size),
+        )
+        return [(x, y, w, h, 1.0) for x, y, w, h in faces]
+
+
+@register_detector("yunet")
+class YuNetDetector(FaceDetector):
+    """OpenCV YuNet CNN (cv2.FaceDetectorYN). Needs the ONNX model file on disk."""
+
+    def __init__(self, input_width: int = 320, min_score: float = 0.0,
+                 model_path: str = "models/face_detection_yunet_2023mar.onnx",
+                 score_threshold: float = 0.7):
+        super().__init__(input_width, min_score)
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (input_width, input_width), score_threshold)
+
+    def _detect(self, image: np.ndarray) -> list[Box]:
+        height, width = image.shape[:2]
+        self.detector.setInputSize((width, height))
+        _, faces = self.detector.detect(image)
+        if faces is None:
+            return []
+        return [(int(f[0]), int(f[1]), int(f[2]), int(f[3]), float(f[-1])) for f in faces]
+
+
+@register_detector("ssd")
+class DeepFaceDetector(FaceDetector):
+    """Any DeepFace detector backend (SSD by default) run on the downscaled frame."""
+
+    def __init__(self, input_width: int = 320, min_score: float = 0.0, backend: str = "ssd"):
+        super().__init__(input_width, min_score)
+        self.backend = backend
+
+    def _detect(self, image: np.ndarray) -> list[Box]:
+        from deepface import DeepFace
+
+        try:
+            faces = DeepFace.extract_faces(
+                img_path=image, detector_backend=self.backend, enforce_detection=True, align=False
+            )
+        except ValueError:
+            return []
+        return [
+            (f["facial_area"]["x"], f["facial_area"]["y"], f["facial_area"]["w"],
+             f["facial_area"]["h"], float(f.get("confidence") or 0.0))
+            for f in faces
+        ]
@@ -0,0 +1,308 @@
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "embeddings_index.npz"
+IMAGE_GLOB = "image_*.jpg"
+
+
+class FaceIndex:
+    """
+    Keeps the embedding of every registered face image in one contiguous,
+    L2-normalized NumPy matrix, so a probe is matched against the whole
+    database with a single matrix-vector product instead of a folder walk
+    and a pandas scan per frame.
+
+    The index is persisted next to the face folders and reconciled with them
+    at startup: rows whose image is unchanged are reused, only new images are
+    embedded and rows of removed images are dropped.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        embed_fn: Callable[[str], np.ndarray | None],
+        model_name: str,
+    ):
+        """
+        Initializes an empty index. Call build() (or ensure_built()) to load/populate it.
+
+        Args:
+            db_path: Directory holding one sub-folder of images per user_id.
+            embed_fn: Function that receives an image path and returns its raw
+                embedding vector, or None if no face could be found.
+            model_name: Name of the embedding model. Persisted indexes built
+                with a different model are discarded.
+        """
+        self.db_path = Path(db_path)
+        self.index_file = self.db_path / INDEX_FILENAME
+        self.embed_fn = embed_fn
+        self.model_name = model_name
+
+        # Reentrant: add_user/remove_user hold it across the whole read-modify-replace
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._build_lock = threading.RLock()
+        self._built = False
+        self._embeddings = np.empty((0, 0), dtype=np.float32)
+        self._user_ids = np.empty((0,), dtype=str)
+        self._identities: list[str] = []
+        self._mtimes = np.empty((0,), dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self._identities)
+
+    @property
+    def is_built(self) -> bool:
+        """True once build() has completed; until then an empty index says nothing about who is registered."""
+        return self._built
+
+    @property
+    def embedding_dim(self) -> int:
+        """Length of the stored embeddings, 0 while the index is empty."""
+        return self._embeddings.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the embedding matrix."""
+        return self._embeddings.nbytes
+
+    # --- Building and persistence ---
+
+    def build(self):
+        """
+        Loads the persisted index and reconciles it with the images on disk.
+        Only images that are new or changed since the last run are embedded.
+        """
+        with self._build_lock:
+            self._build()
+            self._built = True
+
+    def ensure_built(self) -> bool:
+        """
+        Builds the index unless a build already completed, waiting for one
+        that is in progress. Returns False if the index could not be built.
+        """
+        if self._built:
+            return True
+        with self._build_lock:
+            if not self._built:
+                try:
+                    self.build()
+                except Exception:
+                    logger.error("Could not build the face index.", exc_info=True)
+        return self._built
+
+    def _build(self):
+        start_time = time.monotonic()
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        cached = self._load_persisted()
+
+        embeddings, user_ids, identities, mtimes = [], [], [], []
+        embedded_count = 0
+        for image_path in sorted(self.db_path.glob(f"*/{IMAGE_GLOB}")):
+            identity = str(image_path)
+            mtime = image_path.stat().st_mtime
+            cached_row = cached.get(identity)
+            if cached_row is not None and cached_row[1] == mtime:
+                vector = cached_row[0]
+            else:
+                vector = self._embed(identity)
+                embedded_count += 1
+                if vector is None:
+                    logger.warning(f"No face found in registered image {identity}. Skipping it.")
+                    continue
+            embeddings.append(vector)
+            user_ids.append(image_path.parent.name)
+            identities.append(identity)
+            mtimes.append(mtime)
+
+        self._replace(embeddings, user_ids, identities, mtimes)
+        if embedded_count or len(cached) != len(self):
+            self._save()
+        logger.info(
+            f"Face index ready with {len(self)} embeddings "
+            f"({embedded_count} computed) in {time.monotonic() - start_time:.2f}s."
+        )
+
+    def _load_persisted(self) -> dict[str, tuple[np.ndarray, float]]:
+        """Returns the persisted rows keyed by identity, or {} if unusable."""
+        if not self.index_file.exists():
+            return {}
+        try:
+            with np.load(self.index_file, allow_pickle=False) as data:
+                if str(data["model_name"]) != self.model_name:
+                    logger.info("Persisted face index was built with another model. Rebuilding.")
+                    return {}
+                return {
+                    str(identity): (vector, float(mtime))
+                    for identity, vector, mtime in zip(
+                        data["identities"], data["embeddings"], data["mtimes"]
+                    )
+                }
+        except (OSError, KeyError, ValueError) as e:
+            logger.error(f"Could not read face index at {self.index_file}: {e}")
+            return {}
+
+    def _save(self):
+        """Atomically writes the current index to disk."""
+        # Serialized, so concurrent saves neither share the temp file nor write an older snapshot last
+        with self._save_lock:
+            with self._lock:
+                embeddings, user_ids = self._embeddings, self._user_ids
+                identities, mtimes = list(self._identities), self._mtimes
+            tmp_file = self.index_file.with_suffix(".tmp")
+            try:
+                with open(tmp_file, "wb") as f:
+                    np.savez(
+                        f,
+                        model_name=np.array(self.model_name),
+                        embeddings=embeddings,
+                        user_ids=user_ids,
+                        identities=np.array(identities, dtype=str),
+                        mtimes=mtimes,
+                    )
+                os.replace(tmp_file, self.index_file)
+            except OSError as e:
+                logger.error(f"Could not save face index to {self.index_file}: {e}")
+
+    def _replace(self, embeddings, user_ids, identities, mtimes):
+        """Swaps in a new matrix. Readers always see a consistent snapshot."""
+        if embeddings:
+            matrix = np.ascontiguousarray(np.vstack(embeddings), dtype=np.float32)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            self._embeddings = matrix
+            self._user_ids = np.array(user_ids, dtype=str)
+            self._identities = list(identities)
+            self._mtimes = np.array(mtimes, dtype=np.float64)
+
+    def load_embeddings(self, user_ids: list[str], embeddings: np.ndarray):
+        """
+        Replaces the whole index in memory with embeddings that were already
+        computed, one row per entry of user_ids. Nothing is written to disk;
+        used to fill an index without images, e.g. by the benchmarks.
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(user_ids), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+        identities = [f"{user_id}#{i}" for i, user_id in enumerate(user_ids)]
+        self._replace(list(matrix), user_ids, identities, [0.0] * len(user_ids))
+
+    def _embed(self, img_path: str) -> np.ndarray | None:
+        vector = self.embed_fn(img_path)
+        if vector is None:
+            return None
+        return _normalize(vector)
+
+    # --- Incremental updates ---
+
+    def add_user(
+        self,
+        user_id: str,
+        image_paths: list[str | Path],
+        embeddings: list[np.ndarray | None] | None = None,
+    ) -> int:
+        """
+        Embeds only the given images of one user and appends them to the index,
+        replacing any rows the user already had. The rest of the index is reused.
+
+        Args:
+            user_id: ID of the user the images belong to.
+            image_paths: Paths of the user's registered images.
+            embeddings: Optional embeddings already computed for image_paths,
+                in the same order. Images without one are embedded here.
+
+        Returns:
+            The number of embeddings added.
+        """
+        if embeddings is None:
+            embeddings = [None] * len(image_paths)
+
+        new_rows = []
+        for image_path, vector in zip(image_paths, embeddings):
+            image_path = Path(image_path)
+            if vector is None:
+                vector = self._embed(str(image_path))
+            else:
+                vector = _normalize(vector)
+            if vector is None:
+                logger.warning(f"No face found in {image_path} for user {user_id}. Not indexed.")
+                continue
+            new_rows.append((vector, str(image_path), image_path.stat().st_mtime))
+
+        # One critical section, so a concurrent add/remove cannot replace the matrix in between
+        with self._lock:
+            keep = self._user_ids != user_id
+            embeddings = list(self._embeddings[keep])
+            user_ids = list(self._user_ids[keep])
+            identities = [i for i, k in zip(self._identities, keep) if k]
+            mtimes = list(self._mtimes[keep])
+
+            for vector, identity, mtime in new_rows:
+                embeddings.append(vector)
+                user_ids.append(user_id)
+                identities.append(identity)
+                mtimes.append(mtime)
+
+            self._replace(embeddings, user_ids, identities, mtimes)
+        self._save()
+        logger.info(f"Indexed {len(new_rows)} face embeddings for user {user_id}.")
+        return len(new_rows)
+
+    def remove_user(self, user_id: str) -> int:
+        """
+        Drops every row of the given user from the index.
+
+        Returns:
+            The number of embeddings removed.
+        """
+        with self._lock:
+            keep = self._user_ids != user_id
+            removed = int(len(keep) - np.count_nonzero(keep))
+            if not removed:
+                return 0
+            self._embeddings = np.ascontiguousarray(self._embeddings[keep])
+            self._user_ids = self._user_ids[keep]
+            self._identities = [i for i, k in zip(self._identities, keep) if k]
+            self._mtimes = self._mtimes[keep]
+
+        self._save()
+        logger.info(f"Removed {removed} face embeddings of user {user_id} from the index.")
+        return removed
+
+    # --- Matching ---
+
+    def match(self, embedding: np.ndarray) -> tuple[str | None, float | None]:
+        """
+        Finds the closest registered face to the given embedding.
+
+        Args:
+            embedding: Raw embedding of the probe face.
+
+        Returns:
+            A tuple (user_id, cosine_distance) of the best row, or (None, None)
+            if the index is empty.
+        """
+        with self._lock:
+            embeddings, user_ids = self._embeddings, self._user_ids
+        if embeddings.shape[0] == 0:
+            return None, None
+
+        distances = 1.0 - embeddings @ _normalize(embedding)
+        best = int(np.argmin(distances))
+        return str(user_ids[best]), float(distances[best])
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
@@ -1,96 +1,164 @@
 from deepface import DeepFace
+from dotenv import load_dotenv
 from pathlib import Path
+import numpy as np
+import os
 import cv2
 import time
 import logging
 
 from services.camera_manager import CameraManager
+from ai_services.face_index import FaceIndex
+from ai_services.frame_analysis import FrameAnalysis
+from ai_services.face_detectors import create_detector
+from ai_services.streaming_recognizer import StreamingRecognizer
 from phrases import VISITOR
 
+load_dotenv()
+
 logger = logging.getLogger(__name__)
 
 MODEL_NAME = "ArcFace" # FaceNet
-DETECTOR = "mtcnn"
+# DeepFace backend that detects and aligns the face that gets embedded
+DETECTOR = os.getenv("FACE_DETECTOR", "mtcnn")
+# Cheap first-stage detector ("haar", "yunet", "ssd" or "none") gating DETECTOR
+GATE_DETECTOR = os.getenv("FACE_GATE_DETECTOR", "haar")
+GATE_INPUT_WIDTH = int(os.getenv("FACE_GATE_INPUT_WIDTH", "320"))
+GATE_MIN_SCORE = float(os.getenv("FACE_GATE_MIN_SCORE", "0.0"))
 DARK_THRESHOLD = 50
 BRIGHT_THRESHOLD = 200
 ARCFACE_THRESHOLD = 0.68
+BURST_SIZE = 5  # Frames scored per best-shot selection
+DETECT_CANDIDATES = 2  # Sharpest well-exposed frames that get a face detection
 
 class FaceProcessing:
     def __init__(self, camera_manager: CameraManager, db_path: str):
         self.camera_manager = camera_manager
         self.db_path = db_path
+        self.face_gate = self._create_gate()
+        # The detector is part of the key: crops aligned by another detector embed differently
+        self.face_index = FaceIndex(db_path, self._embed_image, model_name=f"{MODEL_NAME}-{DETECTOR}")
+
+    def warm_up(self):
+        """
+        Builds the detection and embedding models with one dummy inference each.
+        Call once before the first recognition. The face index is loaded by
+        load_index(), so a failed dummy inference cannot leave it empty.
+        """
+        dummy = np.full((224, 224, 3), 127, dtype=np.uint8)
+        DeepFace.build_model(MODEL_NAME)
+        DeepFace.represent(img_path=dummy, model_name=MODEL_NAME, detector_backend="skip", enforce_detection=False)
+        DeepFace.extract_faces(img_path=dummy, detector_backend=DETECTOR, enforce_detection=False)
+        self.face_gate.detect(dummy)
+
+    def load_index(self):
+        """Loads the face index and embeds images registered since the last run."""
+        self.face_index.build()
+
+    def _create_gate(self):
+        try:
+            gate = create_detector(GATE_DETECTOR, input_width=GATE_INPUT_WIDTH, min_score=GATE_MIN_SCORE)
+        except Exception as e:
+            logger.error(f"Could not create face gate '{GATE_DETECTOR}': {e}. Gate disabled.")
+            gate = create_detector("none")
+        logger.info(f"Face detection: gate '{gate.name}', alignment '{DETECTOR}'.")
+        return gate
+
+    def analyze_image(self, img_path: str, use_gate: bool = True) -> FrameAnalysis:
+        """Decodes an image once; detection and embedding run lazily on first use."""
+        return FrameAnalysis.from_path(
+            img_path, detector_backend=DETECTOR, model_name=MODEL_NAME,
+            gate=self.face_gate if use_gate else None
+        )
+
+    def wrap_frame(self, frame: np.ndarray | None) -> FrameAnalysis:
+        """Wraps an in-memory BGR frame without touching the filesystem."""
+        return FrameAnalysis(frame, detector_backend=DETECTOR, model_name=MODEL_NAME, gate=self.face_gate)
+
+    def _as_analysis(self, frame: str | FrameAnalysis) -> FrameAnalysis:
+        return frame if isinstance(frame, FrameAnalysis) else self.analyze_image(frame)
 
     def register_face(self, camera_id: int, user_folder: Path, gpio, tts):
         user_folder.mkdir(exist_ok=True)
-        temp_image_paths = []
+        captures = []
 
         try:
-            tts.speak("The photo will be taken in 3, 2, 1")
-
-            # Capture image with LED off
-            path_led_off = self._capture_and_validate_image(
-                camera_id, user_folder, "led_off", led_status=False, gpio=gpio
-            )
-            if path_led_off:
-                temp_image_paths.append(path_led_off)
-
-            # Capture image with LED on
-            path_led_on = self._capture_and_validate_image(
-                camera_id, user_folder, "led_on", led_status=True, gpio=gpio
-            )
-            if path_led_on:
-                temp_image_paths.append(path_led_on)
+            with self.camera_manager.stream(camera_id):
+                tts.speak("The photo will be taken in 3, 2, 1")
+
+                # Capture image with LED off
+                capture_led_off = self._capture_and_validate_image(
+                    camera_id, user_folder, "led_off", led_status=False, gpio=gpio
+                )
+                if capture_led_off:
+                    captures.append(capture_led_off)
+
+                # Capture image with LED on
+                capture_led_on = self._capture_and_validate_image(
+                    camera_id, user_folder, "led_on", led_status=True, gpio=gpio
+                )
+                if capture_led_on:
+                    captures.append(capture_led_on)
 
         finally:
             gpio.set_camera_led(False)
 
-        if not temp_image_paths:
+        if not captures:
             tts.speak_async("Sorry, I could not take a good quality photo. Please try again.")
             return False
 
-        for i, temp_path_str in enumerate(temp_image_paths):
-            temp_path = Path(temp_path_str)
+        final_paths = []
+        for i, capture in enumerate(captures):
+            temp_path = Path(capture.source)
             final_path = user_folder / f"image_{i}.jpg"
         
             try:
                 # Rename led_off.jpg -> image_0.jpg, led_on.jpg -> image_1.jpg, etc.
                 temp_path.rename(final_path)
+                final_paths.append(final_path)
                 print(f"Saved final image: {final_path.name}")
             except OSError as e:
                 print(f"Error renaming {temp_path.name} to {final_path.name}: {e}")
                 # If renaming fails, you might want to handle this error
                 return False
 
+        # Index the new images now, reusing the detections made while validating them
+        self.face_index.add_user(
+            user_folder.name, final_paths,
+            embeddings=[capture.embedding() for capture in captures]
+        )
         tts.speak_async("Registration photos taken successfully.")
         return True
 
-    def _capture_and_validate_image(self, camera_id, folder, name, led_status, gpio, max_attempts=3):
+    def _capture_and_validate_image(self, camera_id, folder, name, led_status, gpio, max_attempts=3) -> FrameAnalysis | None:
         gpio.set_camera_led(led_status)
         if led_status:
             time.sleep(0.5) # Give LED time to brighten
 
         temp_path = str(folder / f"{name}.jpg")
         for _ in range(max_attempts):
-            self.camera_manager.take_picture(camera_id, temp_path)
-            # Check quality AND if there's a face
-            if self.check_img_quality(temp_path) and self.is_there_face(temp_path):
+            frames = self.camera_manager.grab_burst(camera_id, BURST_SIZE)
+            # Check quality AND if there's a face on the best frame of the burst
+            analysis = self.select_best_shot(frames)
+            if analysis and self.check_img_quality(analysis) and self.is_there_face(analysis):
+                # Only frames that passed are written to disk
+                cv2.imwrite(temp_path, analysis.image)
+                analysis.source = temp_path
                 print(f"✅ Valid photo taken: {name}.jpg")
-                return temp_path
+                return analysis
             time.sleep(0.5)
 
         print(f"❌ Failed to take a valid photo for: {name}.jpg")
         return None
 
-    def check_img_quality(self, img_path: str) -> bool:
-        img = cv2.imread(img_path)
-        if img is None:
+    def check_img_quality(self, frame: str | FrameAnalysis) -> bool:
+        analysis = self._as_analysis(frame)
+        if not analysis.is_valid:
             print("Img is none")
             return False
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
         # Check brightness
-        mean_intensity = gray.mean()
+        mean_intensity = analysis.brightness
         print(f"mean_intensity: {mean_intensity}")
         is_good_brightness = (mean_intensity >= DARK_THRESHOLD) and (mean_intensity <= BRIGHT_THRESHOLD)
         if not is_good_brightness:
@@ -98,55 +166,128 @@ class FaceProcessing:
 
         return True
 
-    def is_there_face(self, img_path: str) -> bool:
-        try:
-            extracted_faces = DeepFace.extract_faces(
-                img_path=img_path,
-                detector_backend=DETECTOR,
-                enforce_detection=True # Set to True to raise error if no face
-            )
-            # If extract_faces doesn't throw an error with enforce_detection=True, a face was found.
+    def is_there_face(self, frame: str | FrameAnalysis) -> bool:
+        if self._as_analysis(frame).has_face:
             print("Face detected!")
             return True
-        except ValueError:
-            print("No face detected!")
-            return False
+        print("No face detected!")
+        return False
+
+    def _is_good_brightness(self, analysis: FrameAnalysis) -> bool:
+        return analysis.is_valid and DARK_THRESHOLD <= analysis.brightness <= BRIGHT_THRESHOLD
+
+    def select_best_shot(self, frames: list[np.ndarray]) -> FrameAnalysis | None:
+        """
+        Picks the frame of a burst most worth embedding. Frames are ranked by the
+        cheap checks first (brightness, Laplacian sharpness, face gate); only the
+        sharpest DETECT_CANDIDATES well-exposed frames that pass the gate get a
+        face detection, and the winner is the one with the best face
+        size/confidence/pose times sharpness.
+
+        Returns:
+            The selected FrameAnalysis (with its detection cached), the sharpest
+            well-exposed frame (without a face) if none passes the gate, the
+            sharpest frame if none is well exposed, or None if the burst is empty.
+        """
+        analyses = [self.wrap_frame(frame) for frame in frames if frame is not None]
+        if not analyses:
+            return None
+
+        by_sharpness = sorted(analyses, key=lambda a: a.sharpness, reverse=True)
+        exposed = [a for a in by_sharpness if self._is_good_brightness(a)]
+        if not exposed:
+            # Nothing usable, return one frame so the caller reports BAD_QUALITY
+            return by_sharpness[0]
+        # The cheap gate runs before the expensive detection. Frames it rejects are
+        # never detected (FrameAnalysis skips them), so there is no fallback to them.
+        candidates = [a for a in exposed[:DETECT_CANDIDATES * 2] if a.passes_gate][:DETECT_CANDIDATES]
+        if not candidates:
+            # No face in the burst: the caller reports NO_FACE without running the detector
+            return exposed[0]
+
+        top_sharpness = candidates[0].sharpness or 1.0
+        best = max(
+            candidates,
+            key=lambda a: (a.face_score * (a.sharpness / top_sharpness), a.sharpness),
+        )
+        logger.debug(
+            f"Best shot: sharpness {best.sharpness:.1f}, face score {best.face_score:.2f} "
+            f"({len(analyses)} frames, {len(candidates)} detected)"
+        )
+        return best
+
+    def _embed_image(self, img_path: str) -> np.ndarray | None:
+        """Returns the embedding of the main face in the image, or None."""
+        # Registered images were already validated, so they skip the gate
+        return self.analyze_image(img_path, use_gate=False).embedding()
+
+    def check_face_in_db(self, frame: str | FrameAnalysis) -> tuple[bool, str | None, float | None, bool | None]:
+        if not self.face_index.ensure_built():
+            # Without the index nobody can be recognized; a "no match" would re-register known visitors
+            return False, None, None, None
+        embedding = self._as_analysis(frame).embedding()
+        if embedding is None:
+            # No face was detected in the frame
+            return False, None, None, None
 
-    def check_face_in_db(self, img_path: str) -> tuple[bool, str | None, float | None]:
-        try:
-            dfs = DeepFace.find(
-                img_path=img_path,
-                db_path=self.db_path,
-                detector_backend=DETECTOR,
-                model_name=MODEL_NAME,
-                enforce_detection=True
-            )
-            if not dfs or dfs[0].empty:
-                print("Face detected, but no potential matches found in the database.")
-                return False, None, None, True
-
-            results_df = dfs[0]
-            best_match_row = results_df.loc[results_df["distance"].idxmin()]
-            best_distance = best_match_row["distance"]
-
-            if best_distance <= ARCFACE_THRESHOLD:
-                identity_path = best_match_row["identity"]
-                user_id = Path(identity_path).parent.name
-                print(f"Match Found for user_id: '{user_id}' with distance {best_distance:.4f}")
-                return True, str(user_id), float(best_distance), True
-            else:
-                print(f"No valid match. Best distance was {best_distance:.4f} (Threshold: {ARCFACE_THRESHOLD})")
-                return False, None, float(best_distance), True
+        user_id, best_distance = self.face_index.match(embedding)
+        if user_id is None:
+            print("Face detected, but no potential matches found in the database.")
+            return False, None, None, True
 
-        except ValueError:
-            # This error is raised by find() if no face is detected in img_path
-            return False, None, None, None
+        if best_distance <= ARCFACE_THRESHOLD:
+            print(f"Match Found for user_id: '{user_id}' with distance {best_distance:.4f}")
+            return True, user_id, best_distance, True
+        else:
+            print(f"No valid match. Best distance was {best_distance:.4f} (Threshold: {ARCFACE_THRESHOLD})")
+            return False, None, best_distance, True
 
     def analyze_person(self, img_path: str) -> tuple[str, str | None]:
-        if not self.check_img_quality(img_path):
+        return self._classify(self.analyze_image(img_path))
+
+    def analyze_frame(self, frame: np.ndarray | None) -> tuple[str, str | None]:
+        """Same as analyze_person, for a frame coming straight from the camera."""
+        return self._classify(self.wrap_frame(frame))
+
+    def analyze_burst(self, frames: list[np.ndarray]) -> tuple[str, str | None]:
+        """Classifies only the best shot of a burst, so a single embedding is computed."""
+        best = self.select_best_shot(frames)
+        if best is None:
+            return "BAD_QUALITY", None
+        return self._classify(best)
+
+    def observe_burst(self, frames: list[np.ndarray]) -> tuple[str, str | None, float | None]:
+        """
+        Like analyze_burst, but returns the raw nearest match instead of applying
+        the threshold, so a StreamingRecognizer can vote over several bursts.
+
+        Returns:
+            ("FACE", user_id, distance) with the nearest user (both None if the
+            database is empty), ("NO_INDEX", None, None) if the face index
+            could not be built, or ("BAD_QUALITY" | "NO_FACE", None, None).
+        """
+        if not self.face_index.ensure_built():
+            return "NO_INDEX", None, None
+        best = self.select_best_shot(frames)
+        if best is None or not self.check_img_quality(best):
+            return "BAD_QUALITY", None, None
+        embedding = best.embedding()
+        if embedding is None:
+            return "NO_FACE", None, None
+        user_id, distance = self.face_index.match(embedding)
+        return "FACE", user_id, distance
+
+    def create_recognizer(self) -> StreamingRecognizer:
+        """A fresh voting window using the same threshold as single-frame matching."""
+        return StreamingRecognizer(threshold=ARCFACE_THRESHOLD)
+
+    def _classify(self, analysis: FrameAnalysis) -> tuple[str, str | None]:
+        if not self.face_index.ensure_built():
+            return "NO_INDEX", None
+        if not self.check_img_quality(analysis):
              return "BAD_QUALITY", None
              
-        is_match, user_id, distance, is_face = self.check_face_in_db(img_path=img_path)
+        is_match, user_id, distance, is_face = self.check_face_in_db(analysis)
 
         if is_match:
             return "KNOWN_PERSON", user_id
@@ -189,6 +330,8 @@ def main():
     # --- Initialize services and mocks ---
     camera_manager = CameraManager()
     face_processor = FaceProcessing(camera_manager=camera_manager, db_path=str(DB_PATH))
+    face_processor.warm_up()
+    face_processor.load_index()
     mock_gpio = MockGPIO()
     mock_tts = MockTTS()
 
@@ -219,20 +362,19 @@ def main():
 
         elif choice == '2':
             print("--- Starting analysis ---")
-            temp_image_path = "temp_analysis_photo.jpg"
             
             print("Taking a photo for analysis in 3 seconds...")
             time.sleep(3)
             
-            if camera_manager.take_picture(CAMERA_ID, temp_image_path):
-                print(f"Photo taken and saved to {temp_image_path}. Analyzing...")
-                status, user_id = face_processor.analyze_person(temp_image_path)
+            frame = camera_manager.grab_frame(CAMERA_ID)
+            if frame is not None:
+                print("Photo taken. Analyzing...")
+                status, user_id = face_processor.analyze_frame(frame)
                 print("\n--- Analysis Result ---")
                 print(f"Status: {status}")
                 if user_id:
                     print(f"User ID: {user_id}")
                 print("-----------------------")
-                # Path(temp_image_path).unlink(missing_ok=True) # Clean up
             else:
                 print("Failed to take a photo for analysis.")
                 
@@ -0,0 +1,199 @@
+import logging
+
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+from ai_services.face_detectors import FaceDetector
+
+logger = logging.getLogger(__name__)
+
+SHARPNESS_WIDTH = 320  # Frames are downscaled to this width before the Laplacian
+FACE_AREA_TARGET = 0.05  # Face covering 5% of the frame already scores full size
+FRONTAL_EYE_SPAN = 0.35  # Eye distance / face width of a frontal face
+
+
+class FrameAnalysis:
+    """
+    Holds everything derived from one camera frame: the decoded image, its
+    grayscale version, the detected faces and the embedding of the main face.
+    Each step runs at most once and is cached, so the quality check, the face
+    presence check and the recognition all read from the same detection.
+    """
+
+    def __init__(self, image: np.ndarray | None, detector_backend: str, model_name: str,
+                 source: str | None = None, gate: FaceDetector | None = None):
+        """
+        Args:
+            image: The decoded BGR frame, or None if it could not be read.
+            detector_backend: DeepFace detector used to find and align faces.
+            model_name: DeepFace model used to embed the main face.
+            source: Optional path the frame was read from, for logging and storage.
+            gate: Optional cheap detector; the DeepFace detection only runs on
+                frames where it finds a face.
+        """
+        self.image = image
+        self.detector_backend = detector_backend
+        self.model_name = model_name
+        self.source = source
+        self.gate = gate
+
+        self._gate_boxes = None
+        self._gray = None
+        self._sharpness = None
+        self._faces = None
+        self._embedding = None
+        self._embedded = False
+
+    @classmethod
+    def from_path(cls, img_path: str, detector_backend: str, model_name: str,
+                  gate: FaceDetector | None = None) -> "FrameAnalysis":
+        """Decodes an image file once and wraps it."""
+        image = cv2.imread(str(img_path))
+        if image is None:
+            logger.warning(f"Could not decode image at {img_path}.")
+        return cls(image, detector_backend, model_name, source=str(img_path), gate=gate)
+
+    @property
+    def is_valid(self) -> bool:
+        return self.image is not None
+
+    @property
+    def gray(self) -> np.ndarray | None:
+        if self._gray is None and self.image is not None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def brightness(self) -> float | None:
+        """Mean grayscale intensity of the frame."""
+        gray = self.gray
+        return float(gray.mean()) if gray is not None else None
+
+    @property
+    def sharpness(self) -> float | None:
+        """Variance of the Laplacian on a downscaled copy; higher means sharper."""
+        if self._sharpness is None and self.gray is not None:
+            gray = self.gray
+            scale = SHARPNESS_WIDTH / gray.shape[1]
+            if scale < 1.0:
+                gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            self._sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        return self._sharpness
+
+    @property
+    def gate_boxes(self) -> list:
+        """Faces found by the cheap gate detector, as (x, y, w, h, score) tuples."""
+        if self._gate_boxes is None:
+            if self.image is None:
+                self._gate_boxes = []
+            elif self.gate is None:
+                height, width = self.image.shape[:2]
+                self._gate_boxes = [(0, 0, width, height, 1.0)]
+            else:
+                self._gate_boxes = self.gate.detect(self.image)
+        return self._gate_boxes
+
+    @property
+    def passes_gate(self) -> bool:
+        return bool(self.gate_boxes)
+
+    @property
+    def faces(self) -> list[dict]:
+        """
+        Faces found by the detector, largest first. Each entry is the DeepFace
+        extract_faces dict with the aligned crop ('face'), the bounding box
+        ('facial_area') and the detector 'confidence'.
+        """
+        if self._faces is None:
+            self._faces = self._detect()
+        return self._faces
+
+    @property
+    def main_face(self) -> dict | None:
+        faces = self.faces
+        return faces[0] if faces else None
+
+    @property
+    def bounding_box(self) -> tuple[int, int, int, int] | None:
+        """(x, y, w, h) of the main face."""
+        face = self.main_face
+        if face is None:
+            return None
+        area = face["facial_area"]
+        return area["x"], area["y"], area["w"], area["h"]
+
+    @property
+    def has_face(self) -> bool:
+        return self.main_face is not None
+
+    @property
+    def face_score(self) -> float:
+        """
+        How usable the main face is for recognition, in [0, 1]: its share of
+        the frame, the detector confidence and how level/frontal the eyes are.
+        """
+        face = self.main_face
+        if face is None:
+            return 0.0
+        area = face["facial_area"]
+        frame_h, frame_w = self.image.shape[:2]
+        size = min(1.0, (area["w"] * area["h"]) / (frame_w * frame_h) / FACE_AREA_TARGET)
+        confidence = float(face.get("confidence") or 0.0)
+
+        pose = 1.0
+        left_eye, right_eye = area.get("left_eye"), area.get("right_eye")
+        if left_eye and right_eye:
+            dx = abs(left_eye[0] - right_eye[0])
+            dy = abs(left_eye[1] - right_eye[1])
+            # Roll from the eye line, yaw from how much of the face width the eyes span
+            roll = 1.0 - min(1.0, dy / dx) if dx else 0.0
+            yaw = min(1.0, (dx / area["w"]) / FRONTAL_EYE_SPAN) if area["w"] else 0.0
+            pose = roll * yaw
+        return size * confidence * pose
+
+    def _detect(self) -> list[dict]:
+        if self.image is None or not self.passes_gate:
+            return []
+        try:
+            faces = DeepFace.extract_faces(
+                img_path=self.image,
+                detector_backend=self.detector_backend,
+                enforce_detection=True,
+                align=True,
+            )
+        except ValueError:
+            # Raised by extract_faces when no face is detected
+            return []
+        return sorted(
+            faces,
+            key=lambda f: f["facial_area"]["w"] * f["facial_area"]["h"],
+            reverse=True,
+        )
+
+    def embedding(self) -> np.ndarray | None:
+        """
+        Embeds the already aligned main face crop, skipping a second detection.
+        Returns None if the frame has no face.
+        """
+        if not self._embedded:
+            self._embedded = True
+            face = self.main_face
+            if face is not None:
+                representations = DeepFace.represent(
+                    img_path=_face_to_bgr(face["face"]),
+                    model_name=self.model_name,
+                    detector_backend="skip",
+                    enforce_detection=False,
+                )
+                if representations:
+                    self._embedding = np.asarray(representations[0]["embedding"], dtype=np.float32)
+        return self._embedding
+
+
+def _face_to_bgr(face: np.ndarray) -> np.ndarray:
+    """Converts a DeepFace face crop (RGB, normalized to [0, 1]) back to a BGR uint8 image."""
+    if face.dtype != np.uint8:
+        scale = 255.0 if face.max() <= 1.0 else 1.0
+        face = np.clip(face * scale, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(face[:, :, ::-1])
@@ -1,18 +1,31 @@
 import cv2
+import numpy as np
 import time
-import re
 import logging
 import threading
 import queue
+import functools
 from typing import List, Tuple, Callable, Dict, Any
 
-# Third-party libraries
-from pyzbar import pyzbar
-from pylibdmtx.pylibdmtx import decode as DMReader
+from ai_services.decoder_pool import create_decoder_pool, decode_qr, decode_datamatrix
+from ai_services.preprocessing_ladder import PreprocessingLadder
+from ai_services.carrier_registry import CarrierRegistry
+from services.camera_manager import CameraManager
 
 logger = logging.getLogger(__name__)
 
-DATA_MATRIX_TIMEOUT_MS = 800
+LOCALIZE_WIDTH = 640  # Frames are downscaled to this width for code localization
+MAX_CODE_CANDIDATES = 4  # Largest candidate regions handed to the decoders
+MIN_CODE_AREA = 0.002  # Candidate area bounds, as a fraction of the ROI
+MAX_CODE_AREA = 0.6
+CODE_PADDING = 0.15  # Quiet zone added around each candidate, as a fraction of its size
+TILE_OVERLAP = 0.2  # Overlap of the 2x2 tiles used when localization finds nothing
+# The whole ROI is decoded too, downscaled to at most this width: a large code straddling the
+# tile seams is cut in every tile, and a large code stays readable after downscaling
+FULL_ROI_WIDTH = 960
+# Frames decoded from localized crops without any code before one is decoded from the tiles,
+# so a wrong blob (text, packaging print) can't hide a code the localizer missed
+LOCALIZED_MISSES_BEFORE_TILES = 2
 
 
 class OCRProcessing:
@@ -23,47 +36,40 @@ class OCRProcessing:
     find_validated_code method.
     """
 
-    def __init__(self):
-        """Initializes the OCR processing service."""
+    def __init__(self, camera_manager: CameraManager):
+        """
+        Initializes the OCR processing service.
+
+        Args:
+            camera_manager: Shared CameraManager whose streams provide the frames.
+        """
         self.start_time = None
-        self.cap = None  # Video capture object, initialized later
+        self.camera_manager = camera_manager
+        # Long-lived decoder threads shared by every scan
+        self.decoder_pool = create_decoder_pool()
+        self.decoder_pool.start()
+        # Remembers the cheapest preprocessing that works for each camera
+        self.ladder = PreprocessingLadder()
+        # Tracking-number formats, see config/carriers.json
+        self.carriers = CarrierRegistry.from_file()
         logger.info("OCRProcessing service initialized.")
 
+    def warm_up(self):
+        """Loads the native decoder libraries with one dummy decode each."""
+        blank = np.full((64, 64), 255, dtype=np.uint8)
+        decode_qr(blank)
+        decode_datamatrix(blank)
+
+    def close(self):
+        """Stops the decoder pool."""
+        self.decoder_pool.stop()
+
     def _valid_pattern(self, tracking_number: str) -> bool:
         """
         Validates if a tracking number matches any known carrier patterns.
         This is a quick local check to avoid unnecessary calls to external services.
         """
-        if not tracking_number:
-            return False
-
-        code = tracking_number.upper().strip()
-
-        # A list of regex patterns for different carriers.
-        # This makes it easier to add new patterns in the future.
-        patterns = [
-            r"^[A-Z]{2}\d{9}[A-Z]{2}$",  # Correios/Direct Log
-            r"^SFX\d{14}BR$",  # Shopee
-            r"^BR\d{12}[A-Z]$",  # Shopee
-            r"^BR\d{13}$",  # Shopee
-            r"^AM\d{9}SQ$",  # Amazon
-            r"^AM\d{10}SE$",  # Amazon
-            r"^TBR\d{9}$",  # Amazon
-            r"^LP\d{14}$",  # AliExpress
-        ]
-
-        return any(re.fullmatch(pattern, code) for pattern in patterns)
-
-    def _treat_image(self, image: Any, target_width: int = 1280) -> Any:
-        """
-        Preprocess the image for OCR by converting to grayscale with Gaussian blur.
-        """
-        gray_frame = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray_frame, (5, 5), 0)
-        binary_frame = cv2.adaptiveThreshold(
-            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 5
-        )
-        return binary_frame
+        return self.carriers.match(tracking_number) is not None
 
     def _get_center_roi(self, frame: Any, scale: float = 0.5) -> Any:
         """
@@ -83,6 +89,67 @@ class OCRProcessing:
 
         return roi
 
+    def _localize_codes(self, gray: Any) -> List[Tuple[int, int, int, int]]:
+        """
+        Finds regions likely to hold a barcode, QR or DataMatrix code: areas of
+        dense, strong gradients that survive a morphological close. Runs on a
+        downscaled copy and returns padded (x, y, w, h) boxes in `gray`
+        coordinates, largest first.
+        """
+        height, width = gray.shape[:2]
+        scale = min(1.0, LOCALIZE_WIDTH / width)
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+        grad_x = cv2.Sobel(small, cv2.CV_32F, 1, 0, ksize=-1)
+        grad_y = cv2.Sobel(small, cv2.CV_32F, 0, 1, ksize=-1)
+        gradient = cv2.convertScaleAbs(cv2.magnitude(grad_x, grad_y))
+        gradient = cv2.blur(gradient, (9, 9))
+        _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        # Merge bars/modules into solid blobs, then drop thin text strokes
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15)))
+        mask = cv2.erode(mask, None, iterations=3)
+        mask = cv2.dilate(mask, None, iterations=3)
+
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        small_area = small.shape[0] * small.shape[1]
+        boxes = []
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+            x, y, w, h = cv2.boundingRect(contour)
+            # Filter before counting, so oversized blobs (whole label, box edge) don't use up the budget
+            if not MIN_CODE_AREA <= (w * h) / small_area <= MAX_CODE_AREA:
+                continue
+            if len(boxes) == MAX_CODE_CANDIDATES:
+                break
+            pad_x, pad_y = int(w * CODE_PADDING), int(h * CODE_PADDING)
+            x0, y0 = max(0, int((x - pad_x) / scale)), max(0, int((y - pad_y) / scale))
+            x1, y1 = min(width, int((x + w + pad_x) / scale)), min(height, int((y + h + pad_y) / scale))
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+    def _code_candidates(
+        self, roi: Any, preprocess: Callable[[Any], Any], localize: bool = True
+    ) -> Tuple[List[Any], bool]:
+        """
+        Preprocessed crops to decode for one frame: the localized code regions,
+        or the whole ROI plus its overlapping tiles when localization finds
+        none or `localize` is False. `preprocess` is the current stage of the
+        preprocessing ladder. Returns the crops and whether they were localized.
+        """
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        boxes = self._localize_codes(gray) if localize else []
+        if boxes:
+            return [preprocess(gray[y : y + h, x : x + w]) for x, y, w, h in boxes], True
+
+        processed = preprocess(gray)
+        height, width = processed.shape[:2]
+        tile_size = (int(width / (2 - TILE_OVERLAP)) + 1, int(height / (2 - TILE_OVERLAP)) + 1)
+        tiles = self._create_overlapping_tiles(processed, tile_size, TILE_OVERLAP)
+        scale = FULL_ROI_WIDTH / width
+        whole = cv2.resize(processed, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else processed
+        # Skip the edge slivers, already contained in the neighbouring tiles
+        return [whole] + [t for t in tiles if t.shape[1] * 2 >= tile_size[0] and t.shape[0] * 2 >= tile_size[1]], False
+
     def _create_overlapping_tiles(
         self, image: Any, tile_size_wh: Tuple[int, int], overlap_percent: float
     ) -> List[Any]:
@@ -119,104 +186,76 @@ class OCRProcessing:
         Continuously captures frames from the specified camera and processes them
         for QR and DataMatrix codes.
         """
+        stream = None
         try:
-            self.cap = cv2.VideoCapture(camera_id)
-            if not self.cap.isOpened():
-                logger.error(f"Cannot open camera with ID {camera_id}.")
+            try:
+                stream = self.camera_manager.open_stream(camera_id, width=1280, height=720)
+            except RuntimeError:
                 return
 
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
             processed_codes = set()
             lock = threading.Lock()
-
-            def detection_worker(detector_func, images: List[Any], thread_name: str):
-                """A generic worker to run a detector function."""
-                try:
-                    start_time = time.time()
-                    # Execute the provided detector function (for QR or DataMatrix)
-                    for img in images:
-                        if stop_event.is_set():
-                            return
-                        detected_codes = detector_func(img)
-                        if not detected_codes:
-                            continue
-                        for code_data, code_type in detected_codes:
-                            code = str(code_data).strip()
-                            if not code:
-                                continue
-                            # Check pattern and if it's new before queueing
-                            with lock:
-                                if code not in processed_codes:
-                                    # Add to cache even if pattern is invalid to avoid re-checking
-                                    processed_codes.add(code)
-                                    if self._valid_pattern(code):
-                                        logger.info(
-                                            f"Found valid pattern {code_type} code: {code}. Adding to queue for verification."
-                                        )
-                                        code_queue.put(code)
-
-                except Exception as e:
-                    logger.warning(f"A detection worker failed: {e}")
-                finally:
-                    total_time = time.time() - start_time
-                    if total_time > 1.0:  # If processing takes too long, log a warning
-                        logger.warning(
-                            f"Detection worker '{thread_name}' took too long: {total_time:.2f}s"
-                        )
-
-            while not stop_event.is_set() and self.cap and self.cap.isOpened():
-                ret, frame = self.cap.read()
-                if not ret:
-                    time.sleep(0.1)
+            scan = self.ladder.start_scan(camera_id)
+            # Localized frames submitted since the decoders last found a code
+            localized_misses = 0
+
+            def on_codes(stage, detected_codes):
+                """Called by the decoder pool with the codes found in one of our frames."""
+                nonlocal localized_misses
+                if stop_event.is_set():
+                    return
+                scan.succeeded(stage)
+                localized_misses = 0
+                for code_data, code_type in detected_codes:
+                    code = str(code_data).strip()
+                    if not code:
+                        continue
+                    # Check pattern and if it's new before queueing
+                    with lock:
+                        if code not in processed_codes:
+                            # Add to cache even if pattern is invalid to avoid re-checking
+                            processed_codes.add(code)
+                            carrier = self.carriers.match(code)
+                            if carrier:
+                                logger.info(
+                                    f"Found valid {carrier} pattern {code_type} code: {code}. Adding to queue for verification."
+                                )
+                                code_queue.put(code)
+
+            last_seq = 0
+            while not stop_event.is_set():
+                entry = stream.wait_for_frame(after_seq=last_seq, timeout=0.5)
+                if entry is None:
+                    if not stream.is_running:
+                        logger.error(f"Camera {camera_id} stream stopped unexpectedly.")
+                        break
                     continue
+                last_seq, _, frame = entry
 
                 if not self.start_time:
                     self.start_time = time.time()
 
                 scale = 0.6 if fast_mode else 1.0
                 recorded_frame = self._get_center_roi(frame, scale=scale)
-                processed_frame = self._treat_image(recorded_frame)
-
-                # Define the specific functions for the detectors
-                def pyzbar_detector(f):
-                    return [
-                        (code.data.decode("utf-8"), code.type)
-                        for code in pyzbar.decode(f)
-                    ]
-
-                def dm_detector(f):
-                    return [
-                        (obj.data.decode("utf-8"), "DATAMATRIX")
-                        for obj in DMReader(f, timeout=DATA_MATRIX_TIMEOUT_MS)
-                        if obj.data
-                    ]
-
-                # Create and start parallel threads for the current frame
-                pyzbar_thread = threading.Thread(
-                    target=detection_worker,
-                    args=(pyzbar_detector, [processed_frame], "pyzbar_thread"),
-                    daemon=True,
-                )
-                dm_thread = threading.Thread(
-                    target=detection_worker,
-                    args=(dm_detector, [processed_frame], "dm_thread"),
-                    daemon=True,
-                )
-
-                # Start the threads
-                pyzbar_thread.start()
-                dm_thread.start()
+                stage, preprocess = scan.next_stage()
+                # While localized crops find nothing, every few frames decode the whole ROI instead
+                use_tiles = localized_misses >= LOCALIZED_MISSES_BEFORE_TILES
+                candidates, localized = self._code_candidates(recorded_frame, preprocess, localize=not use_tiles)
+                localized_misses = localized_misses + 1 if localized else 0
 
-                # cv2.imshow("Camera", processed_frame)
-                # if cv2.waitKey(1) & 0xFF == ord("q"):
-                #     stop_event.set()
-                #     break
+                # Hand the crops to the decoder pool; if the decoders are behind,
+                # the oldest queued frame is dropped instead of piling up threads
+                self.decoder_pool.submit(candidates, functools.partial(on_codes, stage))
 
                 # Brief sleep to yield CPU and prevent hammering the camera
                 time.sleep(0.2)
         except Exception as e:
             logger.error(f"An error occurred during OCR processing: {e}", exc_info=True)
+        finally:
+            # Frames of this scan still queued are no longer needed
+            self.decoder_pool.clear()
+            if stream is not None:
+                self.camera_manager.release_stream(camera_id)
 
     def _code_checker_task(
         self,
@@ -343,9 +382,6 @@ class OCRProcessing:
             # (success or timeout), the background threads are properly stopped.
             logger.info("Cleaning up resources and stopping threads...")
             stop_event.set()
-            if self.cap:
-                self.cap.release()
-                self.cap = None
             # cv2.destroyAllWindows()
 
             processor.join(
@@ -360,5 +396,9 @@ class OCRProcessing:
                 logger.info(
                     f"Total processing time: {time.time() - self.start_time:.2f} seconds"
                 )
+            logger.info(
+                f"Decoder latency: {self.decoder_pool.latency()}, "
+                f"frames dropped so far: {self.decoder_pool.dropped}"
+            )
 
         return {"status": "timeout"}
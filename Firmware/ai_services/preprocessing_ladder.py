@@ -0,0 +1,105 @@
+import logging
+import threading
+from typing import Any, Callable
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+REDUCED_WIDTH = 640  # Widest image the cheap "gray" stage decodes
+UPSCALE_FACTOR = 2.0
+FRAMES_PER_STAGE = 3  # Frames without a decode before escalating to the next stage
+
+
+def _reduce(gray: Any) -> Any:
+    scale = REDUCED_WIDTH / gray.shape[1]
+    if scale >= 1.0:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def _clahe(gray: Any) -> Any:
+    return cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+
+
+def _adaptive_threshold(gray: Any) -> Any:
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    return cv2.adaptiveThreshold(
+        blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 5
+    )
+
+
+def _upscale_threshold(gray: Any) -> Any:
+    upscaled = cv2.resize(gray, None, fx=UPSCALE_FACTOR, fy=UPSCALE_FACTOR, interpolation=cv2.INTER_CUBIC)
+    return _adaptive_threshold(_clahe(upscaled))
+
+
+# Cheapest first. Each stage takes a grayscale crop and returns the image to decode.
+STAGES: list[tuple[str, Callable[[Any], Any]]] = [
+    ("gray", _reduce),
+    ("clahe", _clahe),
+    ("threshold", _adaptive_threshold),
+    ("upscale", _upscale_threshold),
+]
+
+
+class PreprocessingLadder:
+    """
+    Picks the preprocessing stage for each scanned frame. A scan starts at the
+    stage that last decoded a code on that camera and only climbs to the
+    next, heavier stage after FRAMES_PER_STAGE frames without any decode,
+    wrapping back to the cheapest one after the last. When a stage decodes
+    something the ladder stays there and remembers it for the camera, so the
+    usual scan pays for a single stage.
+
+    Decodes finish asynchronously, so results are reported back with
+    `succeeded(stage)` from the decoder callback.
+    """
+
+    def __init__(self, frames_per_stage: int = FRAMES_PER_STAGE):
+        self.frames_per_stage = frames_per_stage
+        self._preferred: dict[int, int] = {}  # camera_id: stage index
+        self._lock = threading.Lock()
+
+    def start_scan(self, camera_id: int) -> "LadderScan":
+        with self._lock:
+            stage = self._preferred.get(camera_id, 0)
+        return LadderScan(self, camera_id, stage)
+
+    def _remember(self, camera_id: int, stage: int):
+        with self._lock:
+            if self._preferred.get(camera_id) != stage:
+                logger.info(f"Camera {camera_id}: '{STAGES[stage][0]}' preprocessing now preferred.")
+            self._preferred[camera_id] = stage
+
+    def preferred_stage(self, camera_id: int) -> str:
+        with self._lock:
+            return STAGES[self._preferred.get(camera_id, 0)][0]
+
+
+class LadderScan:
+    """Ladder position for one scan of one camera."""
+
+    def __init__(self, ladder: PreprocessingLadder, camera_id: int, stage: int):
+        self.ladder = ladder
+        self.camera_id = camera_id
+        self.stage = stage
+        self._frames_at_stage = 0
+        self._lock = threading.Lock()
+
+    def next_stage(self) -> tuple[int, Callable[[Any], Any]]:
+        """Stage index and function to preprocess the next frame with."""
+        with self._lock:
+            if self._frames_at_stage >= self.ladder.frames_per_stage:
+                self.stage = (self.stage + 1) % len(STAGES)
+                self._frames_at_stage = 0
+                logger.debug(f"Camera {self.camera_id}: escalating to '{STAGES[self.stage][0]}' preprocessing.")
+            self._frames_at_stage += 1
+            return self.stage, STAGES[self.stage][1]
+
+    def succeeded(self, stage: int):
+        """A frame preprocessed with `stage` produced at least one code."""
+        with self._lock:
+            self.stage = stage
+            self._frames_at_stage = 0
+        self.ladder._remember(self.camera_id, stage)
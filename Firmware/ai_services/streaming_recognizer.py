@@ -0,0 +1,112 @@
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SIZE = 5  # Face observations after which a decision is forced
+MIN_VOTES = 2  # Agreeing observations needed for a regular decision
+CONFIDENT_MATCH_DISTANCE = 0.45  # A single frame this close decides KNOWN_PERSON on its own
+CONFIDENT_REJECT_DISTANCE = 0.85  # Frames this far from everyone count as confident UNKNOWN_PERSON votes
+
+
+class StreamingRecognizer:
+    """
+    Accumulates per-frame recognition results over a short window and decides
+    by vote instead of trusting the first frame, so a single bad embedding
+    cannot start a new-visitor registration. Exits early as soon as the
+    evidence is strong enough, and reports how many frames it needed.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        window_size: int = WINDOW_SIZE,
+        min_votes: int = MIN_VOTES,
+        confident_match: float = CONFIDENT_MATCH_DISTANCE,
+        confident_reject: float = CONFIDENT_REJECT_DISTANCE,
+    ):
+        """
+        Args:
+            threshold: Cosine distance at or below which a frame votes for its nearest user.
+            window_size: Maximum number of face observations before deciding.
+            min_votes: Observations that must agree before an early decision.
+            confident_match: Distance below which one frame is enough to accept.
+            confident_reject: Distance above which a frame is a confident unknown vote.
+        """
+        self.threshold = threshold
+        self.window_size = window_size
+        self.min_votes = min_votes
+        self.confident_match = confident_match
+        self.confident_reject = confident_reject
+
+        self._distances = defaultdict(list)  # user_id: [distance, ...] of frames voting for it
+        self._unknown_votes = 0
+        self._confident_unknown_votes = 0
+        self.frames_used = 0
+
+    def add(self, user_id: str | None, distance: float | None) -> tuple[str, str | None] | None:
+        """
+        Adds the nearest match of one frame that contained a face.
+
+        Args:
+            user_id: Nearest registered user, or None if the database is empty.
+            distance: Cosine distance to that user, or None if the database is empty.
+
+        Returns:
+            ("KNOWN_PERSON", user_id) or ("UNKNOWN_PERSON", None) once confident,
+            otherwise None to ask for another frame.
+        """
+        self.frames_used += 1
+        if user_id is not None and distance is not None and distance <= self.threshold:
+            self._distances[user_id].append(distance)
+            if distance <= self.confident_match:
+                return self._decided("KNOWN_PERSON", user_id)
+        else:
+            self._unknown_votes += 1
+            if distance is None or distance >= self.confident_reject:
+                self._confident_unknown_votes += 1
+
+        leader, leader_votes = self._leader()
+        if leader_votes >= self.min_votes and leader_votes > self._unknown_votes:
+            return self._decided("KNOWN_PERSON", leader)
+        if self._confident_unknown_votes >= self.min_votes and not self._distances:
+            return self._decided("UNKNOWN_PERSON", None)
+        if self.frames_used >= self.window_size:
+            return self.decide()
+        return None
+
+    def decide(self) -> tuple[str, str | None]:
+        """
+        Forces a decision with the observations gathered so far (e.g. on timeout):
+        majority vote between the leading user and "unknown", ties broken by the
+        leader's mean distance. Returns ("NO_FACE", None) if nothing was observed.
+        """
+        if self.frames_used == 0:
+            return self._decided("NO_FACE", None)
+        leader, leader_votes = self._leader()
+        if leader is not None and (
+            leader_votes > self._unknown_votes
+            or (leader_votes == self._unknown_votes and self.mean_distance(leader) <= self.threshold)
+        ):
+            return self._decided("KNOWN_PERSON", leader)
+        return self._decided("UNKNOWN_PERSON", None)
+
+    def mean_distance(self, user_id: str) -> float | None:
+        distances = self._distances.get(user_id)
+        return sum(distances) / len(distances) if distances else None
+
+    def _leader(self) -> tuple[str | None, int]:
+        """The user with most votes; ties go to the smaller mean distance."""
+        if not self._distances:
+            return None, 0
+        leader = min(self._distances, key=lambda u: (-len(self._distances[u]), self.mean_distance(u)))
+        return leader, len(self._distances[leader])
+
+    def _decided(self, status: str, user_id: str | None) -> tuple[str, str | None]:
+        mean = self.mean_distance(user_id) if user_id else None
+        logger.info(
+            f"Recognition decided {status}{f' ({user_id}, mean distance {mean:.4f})' if user_id else ''} "
+            f"after {self.frames_used} frames: {dict((u, len(d)) for u, d in self._distances.items())} "
+            f"known votes, {self._unknown_votes} unknown votes."
+        )
+        return status, user_id
@@ -0,0 +1,96 @@
+"""
+Microbenchmark of tracking-number validation.
+
+Compares the previous per-call approach (build a list of pattern strings and
+re.fullmatch each one) with the compiled CarrierRegistry on a mix of valid
+codes, near misses and the random strings the decoders pick up from labels.
+
+Usage (from the Firmware directory):
+    python -m benchmarks.carrier_benchmark --codes 5000 --repeats 20
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from ai_services.carrier_registry import CarrierRegistry
+
+VALID_SAMPLES = [
+    "QB123456789BR", "SFX12345678901234BR", "BR123456789012X", "BR1234567890123",
+    "AM123456789SQ", "AM1234567890SE", "TBR123456789", "LP12345678901234",
+]
+
+
+def legacy_valid_pattern(tracking_number: str) -> bool:
+    """The original OCRProcessing._valid_pattern, kept for comparison."""
+    if not tracking_number:
+        return False
+
+    code = tracking_number.upper().strip()
+    patterns = [
+        r"^[A-Z]{2}\d{9}[A-Z]{2}$",
+        r"^SFX\d{14}BR$",
+        r"^BR\d{12}[A-Z]$",
+        r"^BR\d{13}$",
+        r"^AM\d{9}SQ$",
+        r"^AM\d{10}SE$",
+        r"^TBR\d{9}$",
+        r"^LP\d{14}$",
+    ]
+    return any(re.fullmatch(pattern, code) for pattern in patterns)
+
+
+def make_codes(count: int, seed: int) -> list[str]:
+    """One third valid codes, one third valid codes with one character changed, one third noise."""
+    rng = random.Random(seed)
+    codes = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            codes.append(rng.choice(VALID_SAMPLES))
+        elif kind == 1:
+            code = list(rng.choice(VALID_SAMPLES))
+            code[rng.randrange(len(code))] = rng.choice(string.ascii_uppercase + string.digits)
+            codes.append("".join(code))
+        else:
+            length = rng.randint(6, 40)
+            codes.append("".join(rng.choice(string.ascii_letters + string.digits + "-/:.") for _ in range(length)))
+    return codes
+
+
+def time_per_code(validate, codes: list[str], repeats: int) -> float:
+    """Best-of-`repeats` seconds per validated code."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for code in codes:
+            validate(code)
+        best = min(best, time.perf_counter() - start)
+    return best / len(codes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tracking-number validation.")
+    parser.add_argument("--codes", type=int, default=5000, help="Codes validated per repeat.")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    registry = CarrierRegistry.from_file()
+    codes = make_codes(args.codes, args.seed)
+
+    mismatches = [c for c in codes if legacy_valid_pattern(c) != (registry.match(c) is not None)]
+    if mismatches:
+        raise SystemExit(f"Registry disagrees with the legacy patterns on: {mismatches[:10]}")
+
+    legacy = time_per_code(legacy_valid_pattern, codes, args.repeats)
+    compiled = time_per_code(registry.match, codes, args.repeats)
+
+    print(f"\n=== Tracking-number validation ({len(registry)} patterns, {len(codes)} codes) ===")
+    print(f"legacy list of re.fullmatch: {legacy * 1e6:8.2f} us/code")
+    print(f"compiled CarrierRegistry:    {compiled * 1e6:8.2f} us/code  ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Offline accuracy/latency benchmark for the face recognition pipeline.
+
+Takes a directory of labeled face images (one sub-folder per identity),
+enrolls the first images of each identity into a fresh FaceIndex and runs the
+rest as probes through the same pipeline the doorbell uses (decode, gate +
+detect, embed, match). Reports per-stage latency, throughput, memory and the
+FAR/FRR trade-off over a range of ARCFACE_THRESHOLD values.
+
+Usage (from the Firmware directory):
+    python -m benchmarks.face_benchmark path/to/faces --synthesize 4 --json report.json
+"""
+import argparse
+import json
+import logging
+import random
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from ai_services.face_index import FaceIndex
+from ai_services.face_processing import FaceProcessing, ARCFACE_THRESHOLD, DETECTOR, GATE_DETECTOR, MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+DEFAULT_THRESHOLDS = [round(t, 2) for t in np.arange(0.30, 0.91, 0.05)]
+STAGES = ("decode", "detect", "embed", "match")
+
+
+def load_dataset(root: Path) -> dict[str, list[Path]]:
+    """Returns {identity: [image paths]} for every sub-folder of root with images."""
+    dataset = {}
+    for identity_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        images = sorted(p for p in identity_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        if images:
+            dataset[identity_dir.name] = images
+    return dataset
+
+
+def synthesize_variants(image_path: Path, out_dir: Path, count: int, rng: random.Random) -> list[Path]:
+    """
+    Writes `count` augmented copies of an image (exposure, gamma, blur, small
+    rotation, sensor noise, mirror) to simulate different doorbell captures.
+    """
+    image = cv2.imread(str(image_path))
+    if image is None:
+        return []
+    out_dir.mkdir(parents=True, exist_ok=True)
+    height, width = image.shape[:2]
+    variants = []
+    for i in range(count):
+        variant = image.astype(np.float32)
+        variant = variant * rng.uniform(0.6, 1.3) + rng.uniform(-25, 25)
+        variant = 255.0 * (np.clip(variant, 0, 255) / 255.0) ** rng.uniform(0.7, 1.4)
+        variant = np.clip(variant + np.random.default_rng(rng.randrange(2**32)).normal(0, rng.uniform(0, 8), variant.shape), 0, 255)
+        variant = variant.astype(np.uint8)
+        kernel = rng.choice([1, 3, 5])
+        if kernel > 1:
+            variant = cv2.GaussianBlur(variant, (kernel, kernel), 0)
+        rotation = cv2.getRotationMatrix2D((width / 2, height / 2), rng.uniform(-10, 10), 1.0)
+        variant = cv2.warpAffine(variant, rotation, (width, height), borderMode=cv2.BORDER_REFLECT)
+        if rng.random() < 0.5:
+            variant = cv2.flip(variant, 1)
+        variant_path = out_dir / f"{image_path.stem}_syn{i}.jpg"
+        cv2.imwrite(str(variant_path), variant)
+        variants.append(variant_path)
+    return variants
+
+
+def split_dataset(dataset, enroll_per_id, impostor_fraction, synthesize, work_dir, rng):
+    """
+    Splits identities into enrolled ones (first enroll_per_id images enrolled,
+    the rest used as genuine probes) and held-out impostors (all images are
+    impostor probes). Synthetic variants of the enrollment images are added as
+    genuine probes when `synthesize` > 0.
+    """
+    identities = list(dataset)
+    rng.shuffle(identities)
+    impostor_count = int(round(len(identities) * impostor_fraction))
+    impostors = set(identities[:impostor_count])
+
+    enrollment, genuine, impostor = {}, [], []
+    for identity, images in dataset.items():
+        if identity in impostors:
+            impostor.extend((identity, p) for p in images)
+            continue
+        enrollment[identity] = images[:enroll_per_id]
+        genuine.extend((identity, p) for p in images[enroll_per_id:])
+        for image_path in enrollment[identity]:
+            variants = synthesize_variants(image_path, work_dir / "synthetic" / identity, synthesize, rng)
+            genuine.extend((identity, p) for p in variants)
+    return enrollment, genuine, impostor
+
+
+def run_probe(face_proc: FaceProcessing, image_path: Path) -> dict:
+    """Runs one probe through every stage, timing each one separately."""
+    timings = {}
+    start = time.perf_counter()
+    analysis = face_proc.analyze_image(str(image_path))
+    timings["decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    has_face = analysis.has_face
+    timings["detect"] = time.perf_counter() - start
+
+    user_id, distance = None, None
+    if has_face:
+        start = time.perf_counter()
+        embedding = analysis.embedding()
+        timings["embed"] = time.perf_counter() - start
+
+        if embedding is not None:
+            start = time.perf_counter()
+            user_id, distance = face_proc.face_index.match(embedding)
+            timings["match"] = time.perf_counter() - start
+    return {"timings": timings, "has_face": has_face, "user_id": user_id, "distance": distance}
+
+
+def error_rates(genuine_results, impostor_results, thresholds) -> list[dict]:
+    """
+    FAR: share of impostor probes accepted as any enrolled identity.
+    FRR: share of genuine probes not accepted as their own identity (no face counts as a reject).
+    Wrong identity rate: share of genuine probes accepted as another enrolled identity.
+    """
+    rows = []
+    for threshold in thresholds:
+        false_rejects = sum(
+            1 for identity, r in genuine_results
+            if r["distance"] is None or r["distance"] > threshold or r["user_id"] != identity
+        )
+        wrong_accepts = sum(
+            1 for identity, r in genuine_results
+            if r["distance"] is not None and r["distance"] <= threshold and r["user_id"] != identity
+        )
+        impostor_accepts = sum(
+            1 for _, r in impostor_results if r["distance"] is not None and r["distance"] <= threshold
+        )
+        rows.append({
+            "threshold": threshold,
+            "far": impostor_accepts / len(impostor_results) if impostor_results else 0.0,
+            "frr": false_rejects / len(genuine_results) if genuine_results else 0.0,
+            "wrong_identity_rate": wrong_accepts / len(genuine_results) if genuine_results else 0.0,
+            "impostor_accepts": impostor_accepts,
+            "wrong_identity_accepts": wrong_accepts,
+            "false_rejects": false_rejects,
+        })
+    return rows
+
+
+def match_scaling(dim: int, sizes: list[int], repeats: int = 200) -> dict:
+    """Times FaceIndex.match against indexes filled with random unit vectors."""
+    results = {}
+    rng = np.random.default_rng(0)
+    probe = rng.standard_normal(dim).astype(np.float32)
+    for size in sizes:
+        index = FaceIndex(tempfile.gettempdir(), embed_fn=lambda _: None, model_name=MODEL_NAME)
+        index.load_embeddings([f"pad-{i}" for i in range(size)], rng.standard_normal((size, dim)))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            index.match(probe)
+        results[size] = (time.perf_counter() - start) / repeats
+    return results
+
+
+def summarize(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+    }
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_benchmark(args) -> dict:
+    rng = random.Random(args.seed)
+    dataset = load_dataset(Path(args.dataset))
+    if not dataset:
+        raise SystemExit(f"No labeled images found under {args.dataset}")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="neobell_face_bench_"))
+    try:
+        enrollment, genuine, impostor = split_dataset(
+            dataset, args.enroll_per_id, args.impostor_fraction, args.synthesize, work_dir, rng
+        )
+        face_proc = FaceProcessing(camera_manager=None, db_path=str(work_dir / "db"))
+
+        rss_start = max_rss_mb()
+        start = time.perf_counter()
+        face_proc.warm_up()
+        face_proc.load_index()
+        warm_up_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for identity, images in enrollment.items():
+            face_proc.face_index.add_user(identity, images)
+        enroll_time = time.perf_counter() - start
+
+        stage_samples = {stage: [] for stage in STAGES}
+        genuine_results, impostor_results = [], []
+        no_face = 0
+        start = time.perf_counter()
+        for results, probes in ((genuine_results, genuine), (impostor_results, impostor)):
+            for identity, image_path in probes:
+                result = run_probe(face_proc, image_path)
+                for stage, seconds in result["timings"].items():
+                    stage_samples[stage].append(seconds)
+                no_face += not result["has_face"]
+                results.append((identity, result))
+        probe_time = time.perf_counter() - start
+        probe_count = len(genuine_results) + len(impostor_results)
+
+        thresholds = sorted(set(args.thresholds + [ARCFACE_THRESHOLD]))
+        embedding_dim = face_proc.face_index.embedding_dim or 512
+        return {
+            "config": {
+                "model": MODEL_NAME, "detector": DETECTOR, "gate": GATE_DETECTOR,
+                "identities": len(dataset), "enrolled_identities": len(enrollment),
+                "enrolled_images": len(face_proc.face_index),
+                "genuine_probes": len(genuine_results), "impostor_probes": len(impostor_results),
+            },
+            "warm_up_s": warm_up_time,
+            "enroll_s": enroll_time,
+            "stages": {stage: summarize(samples) for stage, samples in stage_samples.items()},
+            "throughput_probes_per_s": probe_count / probe_time if probe_time else 0.0,
+            "no_face_probes": no_face,
+            "memory": {
+                "max_rss_mb": max_rss_mb(),
+                "rss_growth_mb": max_rss_mb() - rss_start,
+                "index_kb": face_proc.face_index.nbytes / 1024,
+            },
+            "match_scaling_ms": {
+                size: seconds * 1000
+                for size, seconds in match_scaling(embedding_dim, args.index_sizes).items()
+            },
+            "error_rates": error_rates(genuine_results, impostor_results, thresholds),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_report(report: dict):
+    config = report["config"]
+    print("\n=== Face recognition benchmark ===")
+    print(f"Model {config['model']}, detector {config['detector']}, gate {config['gate']}")
+    print(
+        f"{config['enrolled_identities']} enrolled identities ({config['enrolled_images']} images), "
+        f"{config['genuine_probes']} genuine / {config['impostor_probes']} impostor probes"
+    )
+    print(f"Warm-up {report['warm_up_s']:.2f}s, enrollment {report['enroll_s']:.2f}s")
+
+    print("\nStage      count   mean ms    p50 ms    p95 ms")
+    for stage, stats in report["stages"].items():
+        if stats["count"]:
+            print(f"{stage:<9}{stats['count']:>6}{stats['mean_ms']:>10.1f}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}")
+    print(f"\nThroughput: {report['throughput_probes_per_s']:.2f} probes/s ({report['no_face_probes']} without a face)")
+
+    memory = report["memory"]
+    print(f"Memory: max RSS {memory['max_rss_mb']:.0f} MB (+{memory['rss_growth_mb']:.0f} MB), index {memory['index_kb']:.1f} KB")
+
+    print("\nIndex size   match ms")
+    for size, ms in report["match_scaling_ms"].items():
+        print(f"{size:>10}{ms:>11.3f}")
+
+    print("\nThreshold     FAR      FRR  Wrong ID")
+    for row in report["error_rates"]:
+        marker = "  <- ARCFACE_THRESHOLD" if row["threshold"] == ARCFACE_THRESHOLD else ""
+        print(f"{row['threshold']:>9.2f}{row['far']:>8.3f}{row['frr']:>9.3f}{row['wrong_identity_rate']:>10.3f}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NeoBell face recognition accuracy and latency.")
+    parser.add_argument("dataset", help="Directory with one sub-folder of face images per identity.")
+    parser.add_argument("--enroll-per-id", type=int, default=1, help="Images per identity enrolled in the index.")
+    parser.add_argument("--impostor-fraction", type=float, default=0.2, help="Share of identities held out as impostors.")
+    parser.add_argument("--synthesize", type=int, default=0, help="Augmented genuine probes generated per enrollment image.")
+    parser.add_argument("--thresholds", type=lambda v: [float(t) for t in v.split(",")], default=DEFAULT_THRESHOLDS,
+                        help="Comma-separated cosine distance thresholds for the FAR/FRR table.")
+    parser.add_argument("--index-sizes", type=lambda v: [int(n) for n in v.split(",")], default=[100, 1000, 5000],
+                        help="Padded index sizes used to time matching.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Optional path to also write the report as JSON.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+    report = run_benchmark(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
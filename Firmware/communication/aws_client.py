@@ -2,25 +2,35 @@ import time
 import json
 import uuid
 import os
+import random
 import threading
-import requests
 import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from datetime import datetime, timezone
 from awscrt.mqtt import QoS
 from awsiot import mqtt_connection_builder
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
+from pathlib import Path
+
+from communication.log_shipper import LogShipper
+from communication.outbox import Outbox, PermanentFailure
+from communication.s3_uploader import S3Uploader
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+RECONNECT_BASE_DELAY_SEC = 5.0  # Delay before retrying a failed first connection, doubled on each failure
+RECONNECT_MAX_DELAY_SEC = 5 * 60
+
 class AwsIotClient:
     """
     A client to handle all communications with AWS IoT Core and S3,
     encapsulating connection, publishing, and response handling.
     """
-    def __init__(self, client_id, endpoint, port, cert_path, key_path, ca_path):
+    def __init__(self, client_id, endpoint, port, cert_path, key_path, ca_path, log_spool_path=None,
+                 outbox_path=None):
         self.sbc_id = client_id
         self.endpoint = endpoint
         self.port = int(port)
@@ -29,12 +39,40 @@ class AwsIotClient:
         self.ca_path = ca_path
         
         self.mqtt_connection = None
-        self.response_events = {}
-        self.received_payloads = {}
+        self.is_connected = False
+        self._connect_lock = threading.Lock()
+        self._reconnect_thread = None
+        self._stop_reconnect = threading.Event()
+        # request_id: (response_topic, Future), one entry per in-flight _publish_and_wait
+        self.pending_requests = {}
+        self._pending_lock = threading.Lock()
+        # event key: [callback(payload)], for pushes from the backend and connection events
+        self.listeners = {}
         
         # Dynamically build topic maps based on the SBC_ID
         self._build_topic_maps()
 
+        # submit_log entries are batched and shipped in the background
+        self.log_shipper = LogShipper(
+            self._publish_log_batch,
+            spool_path=Path(log_spool_path) if log_spool_path else Path.cwd() / "data" / "log_spool.json",
+        )
+        self.add_listener('connection_resumed', lambda _: self.log_shipper.request_flush())
+
+        self.uploader = S3Uploader()
+
+        # Uploads, registrations and status updates survive being offline (and reboots)
+        self.outbox = Outbox(
+            Path(outbox_path) if outbox_path else Path.cwd() / "data" / "outbox.sqlite3",
+            handlers={
+                'visitor_registration': self._deliver_visitor_registration,
+                'video_message': self._deliver_video_message,
+                'package_status_update': self._deliver_package_status,
+            },
+            on_dead={'video_message': self._discard_video_message},
+        )
+        self.add_listener('connection_resumed', lambda _: self.outbox.wake(reset_backoff=True))
+
     def _build_topic_maps(self):
         """Builds the topic strings using the instance's sbc_id."""
         base_path = f"neobell/sbc/{self.sbc_id}"
@@ -46,6 +84,7 @@ class AwsIotClient:
             'package_status_update': f"{base_path}/packages/status-update/request",
             'log_submission': f"{base_path}/logs/submit",
             'nfc_verify': f"{base_path}/nfc/verify-tag/request",
+            'pending_deliveries': f"{base_path}/packages/pending/request",
         }
         self.response_topics = {
             'visitor_registration': f"{base_path}/registrations/upload-url-response",
@@ -54,47 +93,98 @@ class AwsIotClient:
             'package_check': f"{base_path}/packages/response",
             'package_status_update': f"{base_path}/packages/status-update/response",
             'nfc_verify': f"{base_path}/nfc/verify-tag/response",
+            'pending_deliveries': f"{base_path}/packages/pending/response",
+        }
+        # Unsolicited messages from the backend, dispatched to listeners
+        self.notification_topics = {
+            'pending_deliveries_changed': f"{base_path}/packages/pending/changed",
         }
         
     # --- Connection Management ---
 
     def connect(self):
-        """Establishes the MQTT connection to AWS IoT Core."""
-        if self.mqtt_connection:
+        """
+        Starts the log shipper and outbox workers and establishes the MQTT
+        connection to AWS IoT Core. The workers run even when the device
+        boots offline, since they hold work on disk until it can be
+        delivered. If the connection fails, it is retried in the background
+        with exponential backoff; 'connection_resumed' listeners are notified
+        once it succeeds.
+        """
+        self.log_shipper.start()
+        self.outbox.start()
+        if self._open_connection():
             return True
-        
-        logger.info(f"Attempting to connect to {self.endpoint} with ClientID: {self.sbc_id}")
-        try:
-            self.mqtt_connection = mqtt_connection_builder.mtls_from_path(
-                endpoint=self.endpoint,
-                port=self.port,
-                cert_filepath=self.cert_path,
-                pri_key_filepath=self.key_path,
-                ca_filepath=self.ca_path,
-                on_connection_interrupted=self._on_connection_interrupted,
-                on_connection_resumed=self._on_connection_resumed,
-                client_id=self.sbc_id,
-                clean_session=True,
-                keep_alive_secs=30
-            )
-            connect_future = self.mqtt_connection.connect()
-            connect_future.result(timeout=10.0)
-            logger.info("Successfully connected to AWS IoT Core!")
-            self._subscribe_to_all_response_topics()
-            return True
-        except Exception as e:
-            logger.error(f"Failed to connect to AWS IoT Core: {e}")
-            self.mqtt_connection = None
-            return False
+        self._start_reconnect_loop()
+        return False
+
+    def _open_connection(self):
+        """Builds the connection and subscribes to the response topics. Returns True on success."""
+        with self._connect_lock:
+            if self.mqtt_connection:
+                return True
+
+            logger.info(f"Attempting to connect to {self.endpoint} with ClientID: {self.sbc_id}")
+            try:
+                self.mqtt_connection = mqtt_connection_builder.mtls_from_path(
+                    endpoint=self.endpoint,
+                    port=self.port,
+                    cert_filepath=self.cert_path,
+                    pri_key_filepath=self.key_path,
+                    ca_filepath=self.ca_path,
+                    on_connection_interrupted=self._on_connection_interrupted,
+                    on_connection_resumed=self._on_connection_resumed,
+                    client_id=self.sbc_id,
+                    clean_session=True,
+                    keep_alive_secs=30
+                )
+                connect_future = self.mqtt_connection.connect()
+                connect_future.result(timeout=10.0)
+                logger.info("Successfully connected to AWS IoT Core!")
+                self.is_connected = True
+                self._subscribe_to_all_response_topics()
+                return True
+            except Exception as e:
+                logger.error(f"Failed to connect to AWS IoT Core: {e}")
+                self.mqtt_connection = None
+                self.is_connected = False
+                return False
+
+    def _start_reconnect_loop(self):
+        if self._reconnect_thread is None or not self._reconnect_thread.is_alive():
+            self._stop_reconnect.clear()
+            self._reconnect_thread = threading.Thread(target=self._reconnect_loop, name="aws-reconnect", daemon=True)
+            self._reconnect_thread.start()
+
+    def _reconnect_loop(self):
+        """Retries the first connection until it succeeds or disconnect() is called."""
+        delay = RECONNECT_BASE_DELAY_SEC
+        while True:
+            wait = delay * random.uniform(0.8, 1.2)
+            logger.info(f"Retrying connection to AWS IoT Core in {wait:.0f}s.")
+            if self._stop_reconnect.wait(wait):
+                return
+            if self._open_connection():
+                self._notify_listeners('connection_resumed', {"return_code": None})
+                return
+            delay = min(RECONNECT_MAX_DELAY_SEC, delay * 2)
 
     def disconnect(self):
         """Disconnects from AWS IoT Core."""
+        self._stop_reconnect.set()
+        if self._reconnect_thread is not None:
+            self._reconnect_thread.join(timeout=15.0)
+        # Last attempt to ship buffered logs; the rest is spooled to disk
+        self.log_shipper.stop()
+        self.outbox.stop()
+        self.uploader.close()
         if self.mqtt_connection:
             logger.info("Disconnecting from AWS IoT Core...")
             disconnect_future = self.mqtt_connection.disconnect()
             disconnect_future.result(timeout=5.0)
             logger.info("Disconnected.")
             self.mqtt_connection = None
+            self.is_connected = False
 
     def __enter__(self):
         """Context manager entry: connects the client."""
@@ -110,24 +200,58 @@ class AwsIotClient:
 
     def _on_connection_interrupted(self, connection, error, **kwargs):
         logger.warning(f"Connection interrupted. Error: {error}")
+        self.is_connected = False
 
     def _on_connection_resumed(self, connection, return_code, session_present, **kwargs):
         logger.info(f"Connection resumed. Return Code: {return_code}, Session Present: {session_present}")
+        self.is_connected = True
         if return_code == connection.RESUME_RECONNECT_SUCCESS and not session_present:
             logger.info("Session not present. Resubscribing to all topics...")
             self._subscribe_to_all_response_topics()
+        self._notify_listeners('connection_resumed', {"return_code": return_code})
+
+    def add_listener(self, event_key, callback):
+        """
+        Registers callback(payload) for a notification topic key or 'connection_resumed'.
+        Callbacks run on the MQTT (or reconnect) thread, so they must not block or call _publish_and_wait.
+        """
+        self.listeners.setdefault(event_key, []).append(callback)
+
+    def _notify_listeners(self, event_key, payload):
+        for callback in self.listeners.get(event_key, []):
+            try:
+                callback(payload)
+            except Exception:
+                logger.error(f"Listener for '{event_key}' failed.", exc_info=True)
 
     def _on_message_received(self, topic, payload, **kwargs):
         logger.info(f"Message received on topic '{topic}'")
         try:
             decoded_payload = json.loads(payload.decode('utf-8'))
-            self.received_payloads[topic] = decoded_payload
         except json.JSONDecodeError:
             logger.error(f"Failed to decode JSON from topic {topic}. Payload: {payload.decode('utf-8')}")
-            self.received_payloads[topic] = {"error": "JSONDecodeError"}
-        
-        if topic in self.response_events:
-            self.response_events[topic].set()
+            decoded_payload = {"error": "JSONDecodeError"}
+
+        if topic in self.response_topics.values():
+            self._resolve_pending_request(topic, decoded_payload)
+
+        for event_key, notification_topic in self.notification_topics.items():
+            if topic == notification_topic:
+                self._notify_listeners(event_key, decoded_payload)
+
+    def _resolve_pending_request(self, topic, payload):
+        """Completes the in-flight request whose request_id the response echoes."""
+        request_id = payload.get("request_id") if isinstance(payload, dict) else None
+        with self._pending_lock:
+            entry = self.pending_requests.pop(request_id, None)
+            if entry is None and request_id is None:
+                # Backends that don't echo request_id yet: answer the oldest request on this topic
+                oldest = next((rid for rid, (t, _) in self.pending_requests.items() if t == topic), None)
+                entry = self.pending_requests.pop(oldest, None)
+        if entry is None:
+            logger.warning(f"Dropping response on '{topic}' with no pending request (request_id: {request_id}).")
+            return
+        entry[1].set_result(payload)
 
     def _subscribe_to_topic(self, topic, qos=QoS.AT_LEAST_ONCE):
         logger.info(f"Subscribing to topic: {topic}")
@@ -136,14 +260,21 @@ class AwsIotClient:
         )
         subscribe_result = subscribe_future.result(timeout=5.0)
         logger.info(f"Subscribed to '{topic}' with QoS {subscribe_result['qos']}")
-        self.response_events[topic] = threading.Event()
 
     def _subscribe_to_all_response_topics(self):
         for topic in self.response_topics.values():
             self._subscribe_to_topic(topic)
+        for topic in self.notification_topics.values():
+            self._subscribe_to_topic(topic)
 
     def _publish_and_wait(self, action_key, payload_dict, timeout=15.0):
-        """Publishes a message and waits for a response on the corresponding topic."""
+        """
+        Publishes a message and waits for its response on the corresponding topic.
+
+        Each request carries a fresh request_id that the backend echoes back,
+        so any number of requests can be in flight on the same topic, each
+        with its own timeout.
+        """
         request_topic = self.topic_map.get(action_key)
         response_topic = self.response_topics.get(action_key)
         
@@ -151,74 +282,150 @@ class AwsIotClient:
             logger.error(f"Invalid action key: {action_key}")
             return None
 
-        # Clear previous event and payload for this response topic
-        self.response_events[response_topic].clear()
-        self.received_payloads.pop(response_topic, None)
+        request_id = uuid.uuid4().hex
+        future = Future()
+        with self._pending_lock:
+            self.pending_requests[request_id] = (response_topic, future)
 
-        logger.info(f"Publishing to '{request_topic}' for action '{action_key}'")
         try:
-            self.mqtt_connection.publish(
-                topic=request_topic, payload=json.dumps(payload_dict), qos=QoS.AT_LEAST_ONCE
-            )
-        except Exception as e:
-            logger.error(f"Failed to publish to '{request_topic}': {e}")
-            return None
+            logger.info(f"Publishing to '{request_topic}' for action '{action_key}' (request_id: {request_id})")
+            try:
+                self.mqtt_connection.publish(
+                    topic=request_topic,
+                    payload=json.dumps({**payload_dict, "request_id": request_id}),
+                    qos=QoS.AT_LEAST_ONCE,
+                )
+            except Exception as e:
+                logger.error(f"Failed to publish to '{request_topic}': {e}")
+                return None
 
-        logger.info(f"Waiting for response on '{response_topic}' for {timeout}s...")
-        if self.response_events[response_topic].wait(timeout=timeout):
+            logger.info(f"Waiting for response on '{response_topic}' for {timeout}s...")
+            try:
+                response = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                logger.warning(f"Timeout waiting for response for '{action_key}' (request_id: {request_id}).")
+                return None
             logger.info(f"Response received for '{action_key}'.")
-            return self.received_payloads.get(response_topic)
-        else:
-            logger.warning(f"Timeout waiting for response for '{action_key}'.")
-            return None
+            return response
+        finally:
+            with self._pending_lock:
+                self.pending_requests.pop(request_id, None)
 
     def _upload_to_s3(self, presigned_url, file_path, metadata, content_type):
-        """Uploads a file to S3 using a pre-signed URL."""
-        try:
-            logger.info(f"Uploading '{file_path}' to S3.")
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-            
-            headers = {'Content-Type': content_type}
-            if metadata:
-                headers.update(metadata)
-
-            response = requests.put(presigned_url, data=file_data, headers=headers)
-            response.raise_for_status()
-            logger.info("S3 upload successful.")
-            return True
-        except requests.exceptions.RequestException as e:
-            logger.error(f"S3 upload failed: {e.response.text if e.response else e}")
-            return False
+        """Uploads a file to S3 using a pre-signed URL, streaming it from disk."""
+        headers = {'Content-Type': content_type}
+        if metadata:
+            headers.update(metadata)
+        return self.uploader.put_file(presigned_url, file_path, headers)
 
     # --- Public API Methods (High-Level Business Logic) ---
 
     def register_visitor(self, image_path, visitor_name, user_id, permission_level):
-        """Requests a URL to register a new visitor and uploads their image."""
+        """
+        Queues the registration of a new visitor in the outbox and returns
+        their user_id. The URL request and image upload happen in the background.
+        """
         logger.info(f"Registering new visitor '{visitor_name}' with permission '{permission_level}'.")
+        self.outbox.enqueue(
+            'visitor_registration', image_path=str(image_path), visitor_name=visitor_name,
+            user_id=user_id, permission_level=permission_level,
+        )
+        return user_id
+
+    def send_video_message(self, video_path, visitor_face_tag_id, duration_sec):
+        """
+        Queues a video message in the outbox. Returns True once it is stored
+        on disk; the upload happens in the background, retried until it succeeds.
+        Returns False if the job could not be stored.
+        """
+        logger.info(f"Sending video message for visitor '{visitor_face_tag_id}'.")
+        job_id = self.outbox.enqueue(
+            'video_message', video_path=str(video_path), visitor_face_tag_id=visitor_face_tag_id,
+            duration_sec=duration_sec,
+        )
+        return job_id is not None
+
+    def update_package_status(self, tracking_number, new_status):
+        """Queues a package status update in the outbox. Returns False if the job could not be stored."""
+        logger.info(f"Updating package status for order '{tracking_number}' to '{new_status}'.")
+        job_id = self.outbox.enqueue('package_status_update', tracking_number=tracking_number, new_status=new_status)
+        return job_id is not None
+
+    def outbox_status(self):
+        """Depth and age of the queued cloud operations, see Outbox.status()."""
+        return self.outbox.status()
+
+    # --- Outbox handlers: run on the outbox thread, return True once delivered, raise PermanentFailure if never ---
+
+    def _deliver_visitor_registration(self, image_path, visitor_name, user_id, permission_level):
+        """Requests a URL to register a new visitor and uploads their image."""
+        if not self.is_connected:
+            return False
+        if not os.path.exists(image_path):
+            raise PermanentFailure(f"Visitor image '{image_path}' no longer exists.")
         payload = {
             "face_tag_id": user_id,
             "visitor_name": visitor_name,
             "permission_level": permission_level
         }
         response = self._publish_and_wait('visitor_registration', payload)
-        
+        if response and "error" in response:
+            # The backend only answers with an error for requests it will never accept
+            raise PermanentFailure(f"Backend refused registration of '{user_id}': {response['error']}")
+
         if response and "presigned_url" in response:
             if self._upload_to_s3(response["presigned_url"], image_path, response.get("required_metadata_headers"), 'image/jpeg'):
-                return user_id
+                return True
         logger.error("Failed to complete visitor registration.")
-        return None
+        return False
 
-    def send_video_message(self, video_path, visitor_face_tag_id, duration_sec):
+    def _deliver_video_message(self, video_path, visitor_face_tag_id, duration_sec):
         """Requests a URL to send a video message and uploads the video."""
-        logger.info(f"Sending video message for visitor '{visitor_face_tag_id}'.")
-        payload = {"visitor_face_tag_id": visitor_face_tag_id, "duration_sec": str(duration_sec)}
+        if not self.is_connected:
+            return False
+        if not os.path.exists(video_path):
+            raise PermanentFailure(f"Video message '{video_path}' no longer exists.")
+        payload = {
+            "visitor_face_tag_id": visitor_face_tag_id,
+            "duration_sec": str(duration_sec),
+            "size_bytes": os.path.getsize(video_path),
+        }
+        # An interrupted multipart upload is resumed: the backend re-signs URLs for the same upload
+        previous = self.uploader.load_session(video_path)
+        if previous:
+            payload.update(upload_id=previous["upload_id"], object_key=previous["object_key"])
         response = self._publish_and_wait('video_message', payload)
+        if response and "error" in response:
+            # e.g. the visitor has no permission to leave messages: retrying cannot help
+            raise PermanentFailure(f"Backend refused video message '{video_path}': {response['error']}")
 
-        if response and "presigned_url" in response:
-            return self._upload_to_s3(response["presigned_url"], video_path, response.get("required_metadata_headers"), 'video/mp4')
-        logger.error("Failed to get pre-signed URL for video message.")
-        return False
+        if response and "upload_id" in response:
+            uploaded = self.uploader.upload_multipart(video_path, response)
+        elif response and "presigned_url" in response:
+            uploaded = self._upload_to_s3(response["presigned_url"], video_path, response.get("required_metadata_headers"), 'video/mp4')
+        else:
+            logger.error("Failed to get pre-signed URL for video message.")
+            return False
+
+        if uploaded:
+            # Each recording has its own file; once uploaded it is no longer needed on the device
+            os.remove(video_path)
+        return uploaded
+
+    def _discard_video_message(self, video_path, **_):
+        """Removes the recording of a dropped video message job, so it does not fill the storage."""
+        if os.path.exists(video_path):
+            os.remove(video_path)
+            logger.warning(f"Removed undeliverable video message '{video_path}'.")
+        self.uploader.discard_session(video_path)
+
+    def _deliver_package_status(self, tracking_number, new_status):
+        """Publishes a package status update and waits for the backend to confirm it."""
+        if not self.is_connected:
+            return False
+        payload = {"tracking_number": tracking_number, "new_status": new_status}
+        response = self._publish_and_wait('package_status_update', payload)
+        return response is not None
 
     def check_permissions(self, face_tag_id):
         """Checks the permission level for a given face tag ID."""
@@ -231,11 +438,10 @@ class AwsIotClient:
         payload = {"identifier_type": identifier_type, "identifier_value": identifier_value}
         return self._publish_and_wait('package_check', payload)
     
-    def update_package_status(self, tracking_number, new_status):
-        """Updates the status of a package."""
-        logger.info(f"Updating package status for order '{tracking_number}' to '{new_status}'.")
-        payload = {"tracking_number": tracking_number, "new_status": new_status}
-        return self._publish_and_wait('package_status_update', payload)
+    def request_pending_deliveries(self):
+        """Requests the pending expected deliveries of every user linked to this device."""
+        logger.info("Requesting pending deliveries snapshot.")
+        return self._publish_and_wait('pending_deliveries', {})
 
     def verify_nfc_tag(self, nfc_id):
         """Verifies an NFC tag against the backend."""
@@ -243,20 +449,30 @@ class AwsIotClient:
         return self._publish_and_wait('nfc_verify', {"nfc_id_scanned": nfc_id})
 
     def submit_log(self, event_type, summary, details):
-        """Submits a device log entry to AWS. Does not wait for a response."""
+        """
+        Queues a device log entry for AWS. Does not wait: entries are shipped
+        in batches by the log shipper, and spooled to disk while offline.
+        """
         logger.info(f"Submitting log: {summary}")
-        payload = {
+        self.log_shipper.enqueue({
             "log_timestamp": datetime.now(ZoneInfo("America/Sao_Paulo")).isoformat(),
             "event_type": event_type,
             "summary": summary,
             "event_details": details
-        }
+        })
+        return True
+
+    def _publish_log_batch(self, entries, timeout=5.0):
+        """Publishes a batch of log entries and waits for the broker to acknowledge it."""
+        if not self.mqtt_connection or not self.is_connected:
+            return False
         request_topic = self.topic_map.get('log_submission')
         try:
-            self.mqtt_connection.publish(
-                topic=request_topic, payload=json.dumps(payload), qos=QoS.AT_LEAST_ONCE
+            publish_future, _ = self.mqtt_connection.publish(
+                topic=request_topic, payload=json.dumps({"logs": entries}), qos=QoS.AT_LEAST_ONCE
             )
+            publish_future.result(timeout=timeout)
             return True
         except Exception as e:
-            logger.error(f"Failed to publish log: {e}")
+            logger.error(f"Failed to publish log batch of {len(entries)} entries: {e}")
             return False
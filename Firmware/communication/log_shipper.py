@@ -0,0 +1,145 @@
+import os
+import json
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 20  # Log entries per MQTT message (well under the 128 KB IoT payload limit)
+FLUSH_INTERVAL_SEC = 10.0  # Longest time an entry waits in the buffer while online
+MAX_BUFFERED = 1000  # Oldest entries are dropped beyond this while offline
+
+
+class LogShipper:
+    """
+    Buffers device log entries and ships them in batches from a background
+    thread, so a burst of submit_log calls becomes one MQTT message (and one
+    Lambda invocation) instead of one each.
+
+    A batch is sent when MAX_BATCH_SIZE entries are waiting or every
+    FLUSH_INTERVAL_SEC. If publishing fails (offline), entries stay buffered
+    and the buffer is spooled to disk, so they survive a reboot and are sent
+    once the connection is back.
+    """
+
+    def __init__(self, publish_batch: Callable[[list[dict]], bool], spool_path: Path,
+                 max_batch: int = MAX_BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL_SEC,
+                 max_buffered: int = MAX_BUFFERED):
+        """
+        Args:
+            publish_batch: Sends a list of entries; returns True once the broker accepted them.
+            spool_path: JSON file the unsent entries are persisted to.
+            max_batch: Entries per batch, and the buffer size that triggers an early flush.
+            flush_interval: Seconds between periodic flushes.
+            max_buffered: Upper bound on buffered entries.
+        """
+        self.publish_batch = publish_batch
+        self.spool_path = spool_path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+
+        self._buffer = deque(maxlen=max_buffered)
+        self._lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._spooled = False
+        self._load_spool()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="log-shipper", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the thread after a last flush attempt; whatever is left is spooled."""
+        self._stop_event.set()
+        self._flush_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._save_spool()
+
+    def enqueue(self, entry: dict):
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                logger.warning("Log buffer full, dropping the oldest entry.")
+            self._buffer.append(entry)
+            pending = len(self._buffer)
+        if pending >= self.max_batch:
+            self._flush_event.set()
+
+    def request_flush(self):
+        """Asks the thread to flush now, e.g. when the connection resumes."""
+        self._flush_event.set()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._flush_event.wait(timeout=self.flush_interval)
+            self._flush_event.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self) -> bool:
+        """Sends every buffered entry in batches. Returns False if a batch could not be sent."""
+        while True:
+            with self._lock:
+                batch = [self._buffer[i] for i in range(min(self.max_batch, len(self._buffer)))]
+            if not batch:
+                if self._spooled:
+                    self._save_spool()
+                return True
+
+            try:
+                sent = self.publish_batch(batch)
+            except Exception as e:
+                logger.error(f"Failed to publish log batch: {e}")
+                sent = False
+            if not sent:
+                self._save_spool()
+                return False
+
+            with self._lock:
+                # Overflow drops from the left, so some of the batch may already be gone
+                for entry in batch:
+                    if self._buffer and self._buffer[0] is entry:
+                        self._buffer.popleft()
+            logger.debug(f"Shipped a batch of logs, {self.pending} still buffered.")
+
+    def _load_spool(self):
+        if not self.spool_path.exists():
+            return
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            self._buffer.extend(entries)
+            self._spooled = True
+            logger.info(f"Loaded {len(entries)} unsent log entries from {self.spool_path}.")
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Could not read log spool at {self.spool_path}: {e}")
+
+    def _save_spool(self):
+        """Writes the unsent entries to disk, or removes the spool once everything is sent."""
+        with self._lock:
+            entries = list(self._buffer)
+        try:
+            if not entries:
+                self.spool_path.unlink(missing_ok=True)
+                self._spooled = False
+                return
+            self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.spool_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.spool_path)
+            self._spooled = True
+        except IOError as e:
+            logger.error(f"Could not write log spool to {self.spool_path}: {e}")
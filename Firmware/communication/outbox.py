@@ -0,0 +1,241 @@
+import json
+import time
+import random
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+BASE_RETRY_DELAY_SEC = 5.0  # Delay after the first failed attempt, doubled on each one after
+MAX_RETRY_DELAY_SEC = 15 * 60
+MAX_ATTEMPTS = 100  # About a day of retries at MAX_RETRY_DELAY_SEC, then the job is dead-lettered
+IDLE_POLL_SEC = 30.0  # How often the worker looks at the queue when nothing wakes it up
+STATUS_LOG_INTERVAL_SEC = 5 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT
+)
+"""
+
+# Jobs that failed permanently or ran out of attempts, kept for inspection
+_DEAD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL,
+    last_error TEXT
+)
+"""
+
+
+class PermanentFailure(Exception):
+    """Raised by a handler when retrying the job cannot succeed, e.g. the backend refused it."""
+
+
+class Outbox:
+    """
+    A durable queue of cloud operations (video uploads, visitor registrations,
+    package status updates) backed by SQLite, so a request made while the
+    network is down is delivered later instead of being lost.
+
+    Jobs are committed to disk before enqueue() returns and are only deleted
+    once their handler reports success. A background worker runs due jobs in
+    creation order; a failed job is retried with exponential backoff (with
+    jitter) up to MAX_RETRY_DELAY_SEC apart, and every job becomes due again
+    when wake(reset_backoff=True) is called, e.g. when the connection resumes.
+
+    A job whose handler raises PermanentFailure, or that fails max_attempts
+    times, is moved to the dead_jobs table and its on_dead callback runs, so
+    it stops being retried and can release what it holds on the device.
+    """
+
+    def __init__(self, db_path: Path, handlers: dict[str, Callable[..., bool]],
+                 on_dead: dict[str, Callable[..., None]] | None = None,
+                 base_delay: float = BASE_RETRY_DELAY_SEC, max_delay: float = MAX_RETRY_DELAY_SEC,
+                 max_attempts: int = MAX_ATTEMPTS):
+        """
+        Args:
+            db_path: SQLite database file.
+            handlers: Job kind -> callable taking the job's args as keyword
+                arguments and returning True once the job is delivered. It
+                raises PermanentFailure when the job can never be delivered.
+            on_dead: Job kind -> callable taking the job's args as keyword
+                arguments, run once the job is dead-lettered.
+            base_delay: Seconds before the first retry.
+            max_delay: Upper bound for the retry delay.
+            max_attempts: Failed attempts after which a job is dead-lettered.
+        """
+        self.db_path = db_path
+        self.handlers = handlers
+        self.on_dead = on_dead or {}
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(_SCHEMA)
+        self._db.execute(_DEAD_SCHEMA)
+
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_status_log = 0.0
+
+        status = self.status()
+        if status["depth"]:
+            logger.info(f"Outbox has {status['depth']} pending jobs from a previous run: {status['by_kind']}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+            self._thread.start()
+            self._wake_event.set()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def enqueue(self, kind: str, **args) -> int | None:
+        """Persists a job and wakes the worker. Returns the job id, or None if it could not be stored."""
+        if kind not in self.handlers:
+            raise ValueError(f"No outbox handler for job kind '{kind}'.")
+        now = time.time()
+        try:
+            with self._lock:
+                cursor = self._db.execute(
+                    "INSERT INTO jobs (kind, args, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                    (kind, json.dumps(args), now, now),
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Could not store outbox job ({kind}): {e}")
+            return None
+        logger.info(f"Queued outbox job {cursor.lastrowid} ({kind}).")
+        self._wake_event.set()
+        return cursor.lastrowid
+
+    def wake(self, reset_backoff: bool = False):
+        """Asks the worker to drain now. With reset_backoff, jobs waiting for a retry are due too."""
+        if reset_backoff:
+            with self._lock:
+                self._db.execute("UPDATE jobs SET next_attempt_at = ?", (time.time(),))
+        self._wake_event.set()
+
+    def status(self) -> dict:
+        """Queue depth, age of the oldest job in seconds, depth per kind and dead-lettered jobs."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, COUNT(*), MIN(created_at) FROM jobs GROUP BY kind"
+            ).fetchall()
+            (dead,) = self._db.execute("SELECT COUNT(*) FROM dead_jobs").fetchone()
+        oldest = min((created for _, _, created in rows), default=None)
+        return {
+            "depth": sum(count for _, count, _ in rows),
+            "oldest_age_sec": time.time() - oldest if oldest is not None else None,
+            "by_kind": {kind: count for kind, count, _ in rows},
+            "dead": dead,
+        }
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake_event.wait(timeout=self._seconds_until_next_job())
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self.drain()
+            except Exception:
+                logger.error("Outbox drain failed.", exc_info=True)
+            self._log_status()
+
+    def drain(self):
+        """Runs every due job once, oldest first. Stops early when asked to stop."""
+        with self._lock:
+            due = self._db.execute(
+                "SELECT id, kind, args, attempts FROM jobs WHERE next_attempt_at <= ? ORDER BY id",
+                (time.time(),),
+            ).fetchall()
+
+        for job_id, kind, args, attempts in due:
+            if self._stop_event.is_set():
+                return
+            dead = False
+            try:
+                delivered = bool(self.handlers[kind](**json.loads(args)))
+                error = None if delivered else "handler returned False"
+            except PermanentFailure as e:
+                delivered, dead, error = False, True, str(e)
+            except Exception as e:
+                logger.error(f"Outbox job {job_id} ({kind}) raised.", exc_info=True)
+                delivered, error = False, str(e)
+            dead = dead or (not delivered and attempts + 1 >= self.max_attempts)
+
+            with self._lock:
+                if delivered:
+                    self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                elif dead:
+                    self._db.execute(
+                        "INSERT INTO dead_jobs (id, kind, args, created_at, attempts, failed_at, last_error) "
+                        "SELECT id, kind, args, created_at, ?, ?, ? FROM jobs WHERE id = ?",
+                        (attempts + 1, time.time(), error, job_id),
+                    )
+                    self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                else:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempts) * random.uniform(0.8, 1.2)
+                    self._db.execute(
+                        "UPDATE jobs SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                        (attempts + 1, time.time() + delay, error, job_id),
+                    )
+            if delivered:
+                logger.info(f"Outbox job {job_id} ({kind}) delivered after {attempts + 1} attempt(s).")
+            elif dead:
+                logger.error(f"Outbox job {job_id} ({kind}) dropped after {attempts + 1} attempt(s): {error}")
+                self._run_on_dead(job_id, kind, args)
+            else:
+                logger.warning(f"Outbox job {job_id} ({kind}) failed (attempt {attempts + 1}), retrying in {delay:.0f}s.")
+
+    def _run_on_dead(self, job_id: int, kind: str, args: str):
+        callback = self.on_dead.get(kind)
+        if callback is None:
+            return
+        try:
+            callback(**json.loads(args))
+        except Exception:
+            logger.error(f"Cleanup of dead outbox job {job_id} ({kind}) failed.", exc_info=True)
+
+    def _seconds_until_next_job(self) -> float:
+        with self._lock:
+            (next_at,) = self._db.execute("SELECT MIN(next_attempt_at) FROM jobs").fetchone()
+        if next_at is None:
+            return IDLE_POLL_SEC
+        return min(IDLE_POLL_SEC, max(0.0, next_at - time.time()))
+
+    def _log_status(self):
+        if time.time() - self._last_status_log < STATUS_LOG_INTERVAL_SEC:
+            return
+        status = self.status()
+        if status["depth"]:
+            logger.info(
+                f"Outbox: {status['depth']} pending jobs, oldest {status['oldest_age_sec']:.0f}s old, "
+                f"{status['by_kind']}"
+            )
+            self._last_status_log = time.time()
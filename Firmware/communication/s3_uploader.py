@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import random
+import logging
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT_SEC = 5.0
+READ_TIMEOUT_SEC = 60.0  # Per socket read while waiting for S3 to answer a PUT
+MAX_ATTEMPTS = 4  # Per single PUT or per part, before the caller's outbox retries later
+BASE_BACKOFF_SEC = 1.0
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class _FileSlice:
+    """
+    A read-only window [offset, offset + length) of an open file, so requests
+    streams a part straight from disk in small blocks instead of loading it.
+    """
+
+    def __init__(self, f, offset: int, length: int):
+        self._f = f
+        self._offset = offset
+        self._remaining = length
+        self._length = length
+        f.seek(offset)
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b""
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def __len__(self) -> int:
+        # requests uses this for Content-Length
+        return self._length
+
+
+class S3Uploader:
+    """
+    Uploads files to S3 through pre-signed URLs over a pooled requests.Session.
+
+    Bodies are streamed from the file, so memory use does not grow with the
+    file size. Every request has connect/read timeouts and transient failures
+    (connection errors, 5xx, throttling) are retried with exponential backoff.
+
+    Large files use a multipart upload whose URLs are issued by the backend.
+    The ETag of each finished part is recorded in a sidecar file next to the
+    upload (<file>.upload.json), so an interrupted upload, even across a
+    reboot, continues from the first missing part instead of byte zero.
+    """
+
+    def __init__(self, pool_size: int = 4):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = (CONNECT_TIMEOUT_SEC, READ_TIMEOUT_SEC)
+
+    def close(self):
+        self.session.close()
+
+    def put_file(self, presigned_url, file_path, headers=None) -> bool:
+        """Uploads a whole file with a single pre-signed PUT."""
+        size = os.path.getsize(file_path)
+        logger.info(f"Uploading '{file_path}' ({size} bytes) to S3.")
+        with open(file_path, "rb") as f:
+            response = self._send("PUT", presigned_url, headers=headers,
+                                  body=lambda: _FileSlice(f, 0, size))
+        if response is None:
+            return False
+        logger.info("S3 upload successful.")
+        return True
+
+    # --- Multipart ---
+
+    @staticmethod
+    def sidecar_path(file_path) -> Path:
+        return Path(f"{file_path}.upload.json")
+
+    def load_session(self, file_path) -> dict | None:
+        """Returns the saved multipart session of a file, if an earlier upload was interrupted."""
+        sidecar = self.sidecar_path(file_path)
+        if not sidecar.exists():
+            return None
+        try:
+            with open(sidecar, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Could not read upload sidecar {sidecar}: {e}")
+            return None
+
+    def discard_session(self, file_path):
+        self.sidecar_path(file_path).unlink(missing_ok=True)
+
+    def upload_multipart(self, file_path, upload: dict) -> bool:
+        """
+        Uploads the parts that are still missing, then completes the upload.
+
+        Args:
+            file_path: File to upload.
+            upload: Backend response with "upload_id", "object_key", "part_size",
+                "part_urls" (one per part, in order) and "complete_url".
+
+        Returns:
+            True once S3 has assembled the object. On False the sidecar is kept
+            (unless the upload no longer exists) so the next call resumes.
+        """
+        size = os.path.getsize(file_path)
+        part_size = int(upload["part_size"])
+        part_urls = upload["part_urls"]
+
+        session = self.load_session(file_path) or {}
+        if session.get("upload_id") != upload["upload_id"] or session.get("part_size") != part_size:
+            session = {"upload_id": upload["upload_id"], "object_key": upload["object_key"],
+                       "part_size": part_size, "size": size, "etags": {}}
+        etags = session["etags"]
+        if etags:
+            logger.info(f"Resuming upload of '{file_path}': {len(etags)}/{len(part_urls)} parts already sent.")
+
+        with open(file_path, "rb") as f:
+            for number, url in enumerate(part_urls, start=1):
+                if str(number) in etags:
+                    continue
+                offset = (number - 1) * part_size
+                length = min(part_size, size - offset)
+                response = self._send("PUT", url, body=lambda: _FileSlice(f, offset, length))
+                if response is None:
+                    return False
+                etags[str(number)] = response.headers["ETag"]
+                self._save_session(file_path, session)
+
+        parts = "".join(
+            f"<Part><PartNumber>{n}</PartNumber><ETag>{escape(etags[str(n)])}</ETag></Part>"
+            for n in range(1, len(part_urls) + 1)
+        )
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode()
+        response = self._send("POST", upload["complete_url"], headers={"Content-Type": "application/xml"},
+                              body=lambda: body)
+        # CompleteMultipartUpload can fail with a 200 and an <Error> body
+        if response is None or b"<Error>" in response.content:
+            if response is not None and b"NoSuchUpload" in response.content:
+                self.discard_session(file_path)
+            logger.error(f"Failed to complete multipart upload of '{file_path}'.")
+            return False
+
+        self.discard_session(file_path)
+        logger.info(f"S3 multipart upload of '{file_path}' successful ({len(part_urls)} parts).")
+        return True
+
+    def _save_session(self, file_path, session):
+        sidecar = self.sidecar_path(file_path)
+        tmp_path = sidecar.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(session, f)
+            os.replace(tmp_path, sidecar)
+        except IOError as e:
+            logger.error(f"Could not save upload sidecar {sidecar}: {e}")
+
+    def _send(self, method, url, body, headers=None) -> requests.Response | None:
+        """
+        Sends a request, retrying transient failures. `body` is called for a
+        fresh body on every attempt, since a streamed one is consumed by a failed try.
+        """
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                response = self.session.request(method, url, data=body(), headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return response
+                error = f"HTTP {response.status_code}"
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = str(e)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"S3 {method} failed: {e.response.text if e.response is not None else e}")
+                return None
+
+            if attempt == MAX_ATTEMPTS:
+                logger.error(f"S3 {method} failed after {attempt} attempts: {error}")
+                return None
+            delay = BASE_BACKOFF_SEC * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+            logger.warning(f"S3 {method} failed ({error}), retrying in {delay:.1f}s.")
+            time.sleep(delay)
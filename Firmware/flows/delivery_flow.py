@@ -25,6 +25,7 @@ class DeliveryFlow:
         self.servo = services.get("servo_service")
         self.camera_manager = services.get("camera_manager")
         self.interaction_manager = services.get("interaction_manager")
+        self.delivery_cache = services.get("delivery_cache")  # Local snapshot of pending deliveries
         logger.info("Delivery Flow handler initialized.")
 
     def start_delivery_flow(self):
@@ -76,6 +77,12 @@ class DeliveryFlow:
         self.tts.speak_async(DELIVERY["start"])
 
         def aws_checker_callback(code):
+            cached = self.delivery_cache.lookup(code) if self.delivery_cache else None
+            if cached:
+                # Accept from the local snapshot right away; the cloud only confirms
+                logger.info(f"Code '{code}' found in the expected deliveries cache.")
+                Thread(target=self._confirm_cached_package, args=(code,), daemon=True).start()
+                return {"package_found": True, "details": {**cached, "status": "pending"}, "source": "cache"}
             return self.aws.request_package_info("tracking_number", code)
 
         def on_timeout():
@@ -116,6 +123,25 @@ class DeliveryFlow:
         self.gpio.set_camera_led(False)
         return None
 
+    def _confirm_cached_package(self, code: str):
+        """
+        Confirms with the backend a package accepted from the cache. A stale
+        entry is logged and the snapshot refreshed; a missing answer (offline)
+        keeps the cached decision.
+        """
+        response = self.aws.request_package_info("tracking_number", code)
+        if not response:
+            logger.warning(f"Could not confirm cached package '{code}' with the backend.")
+            return
+        if not response.get("package_found") or response.get("details", {}).get("status") != "pending":
+            logger.warning(f"Backend no longer expects cached package '{code}'. Response: {response}")
+            self.aws.submit_log(
+                event_type="package_cache_mismatch",
+                summary="Package accepted from a stale cache entry",
+                details={"tracking_number": code},
+            )
+            self.delivery_cache.request_refresh()
+
     def _scan_internal_package(self, original_valid_codes: str) -> bool:
         """
         Scans the package inside the compartment and checks if the code matches the original.
@@ -191,7 +217,10 @@ class DeliveryFlow:
         self.aws.submit_log(
             event_type="package_detected", summary="Package delivered", details={}
         )
-        self.aws.update_package_status(validated_code, "delivered") 
+        if not self.aws.update_package_status(validated_code, "delivered"):
+            logger.error(f"Could not queue the 'delivered' status update for {validated_code}.")
+        if self.delivery_cache:
+            self.delivery_cache.remove(validated_code)
 
         logger.info("Finalizing delivery...")
 
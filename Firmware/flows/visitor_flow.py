@@ -8,6 +8,7 @@ from phrases import VISITOR
 logger = logging.getLogger(__name__)
 
 CAMERA_ID = 2
+BURST_SIZE = 5  # Frames per recognition attempt, only the best one is embedded
 
 class VisitorFlow:
     """
@@ -74,6 +75,11 @@ class VisitorFlow:
                 self._handle_new_visitor_registration()
                 break 
 
+            elif status == "NO_INDEX":
+                logger.error("Face index is not available. Not recognizing or registering visitors.")
+                self.tts.speak(VISITOR["system_error"])
+                break
+
             # --- NO_FACE Retry Logic with New Phrases ---
             elif status == "NO_FACE":
                 logger.warning(f"Could not recognize anyone on attempt {attempt + 1}.")
@@ -95,35 +101,52 @@ class VisitorFlow:
 
     def _handle_recognition(self, timeout_seconds: int = 7) -> tuple[str, str | None]:
         """
-        Analyzes the camera feed frame-by-frame for a set duration.
+        Analyzes the camera feed burst-by-burst for a set duration.
 
-        It controls the loop and calls the simplified analyze_person
-        method from the FaceProcessing class for each frame.
+        Each burst contributes one vote (its nearest match) to a
+        StreamingRecognizer, which decides as soon as the votes agree, or
+        immediately on a very close match, so one bad embedding can't trigger
+        a registration on its own.
         """
         self.tts.speak(VISITOR["face_recognition"])
         start_time = time.time()
-        temp_image_path = "data/temp_live_frame.jpg"
-
-        while time.time() - start_time < timeout_seconds:
-            # 1. Take a single picture
-            if not self.camera_manager.take_picture(CAMERA_ID, temp_image_path):
-                time.sleep(0.5)
-                continue # Try again if picture fails
-
-            # 2. Analyze that single picture using your new reliable method
-            status, user_id = self.face_proc.analyze_person(temp_image_path)
-
-            # 3. Act on the result
-            if status in ["KNOWN_PERSON", "UNKNOWN_PERSON"]:
-                # If we get a clear result (known or unknown), we're done.
-                return status, user_id
-            
-            # If result is "NO_FACE" or "BAD_QUALITY", the loop continues to try again.
-            time.sleep(0.5) # Small delay before next attempt
+        recognizer = self.face_proc.create_recognizer()
+
+        # Keep the camera streaming for the whole loop so warm-up is paid only once
+        with self.camera_manager.stream(CAMERA_ID):
+            while time.time() - start_time < timeout_seconds:
+                # 1. Grab a short burst of frames, kept in memory
+                frames = self.camera_manager.grab_burst(CAMERA_ID, BURST_SIZE)
+                if not frames:
+                    time.sleep(0.5)
+                    continue # Try again if picture fails
+
+                # 2. Match only the best shot of the burst
+                status, user_id, distance = self.face_proc.observe_burst(frames)
+                if status == "NO_INDEX":
+                    # Matching against an empty index would call every visitor unknown
+                    return status, None
+
+                # 3. Vote; "NO_FACE" or "BAD_QUALITY" bursts don't count
+                if status == "FACE":
+                    decision = recognizer.add(user_id, distance)
+                    if decision is not None:
+                        self._log_recognition(decision, recognizer, start_time)
+                        return decision
+
+        # Timed out: decide with the votes we have, "NO_FACE" if there are none
+        decision = recognizer.decide()
+        if decision[0] == "NO_FACE":
+            logger.info("Recognition timeout. No clear face was identified.")
+        else:
+            self._log_recognition(decision, recognizer, start_time)
+        return decision
 
-        # If the loop finishes without a clear result
-        logger.info("Recognition timeout. No clear face was identified.")
-        return "NO_FACE", None
+    def _log_recognition(self, decision: tuple[str, str | None], recognizer, start_time: float):
+        logger.info(
+            f"Recognition result {decision[0]} after {recognizer.frames_used} "
+            f"face frames in {time.time() - start_time:.2f}s."
+        )
 
     def _handle_known_visitor(self, name: str, user_id: str):
         """
@@ -294,7 +317,8 @@ class VisitorFlow:
         - Logs all relevant events
         """
         self.tts.speak(VISITOR["recording"])
-        final_video_path = f"data/visitor_message_{user_id}.mp4"
+        # Unique per recording: a queued upload must not be overwritten by the next message
+        final_video_path = f"data/visitor_message_{user_id}_{time.strftime('%Y%m%d_%H%M%S')}.mp4"
         try:
             # Step 1: Record video with audio
             self.gpio.set_camera_led(True)
@@ -306,7 +330,7 @@ class VisitorFlow:
             self.gpio.set_camera_led(False)
             self.tts.speak(VISITOR["done"])
 
-            # Step 2: Send video to AWS
+            # Step 2: Queue the video for upload (delivered in the background, even if offline now)
             success = self.aws.send_video_message(final_video_path, user_id, 10)
 
             # Step 3: Provide feedback to user
@@ -16,6 +16,8 @@ from services.servo_service import ServoService
 from services.rfid_service import RfidListenerService
 from services.interaction_manager import InteractionManager
 from services.camera_manager import CameraManager
+from services.model_warmup import ModelWarmup
+from services.delivery_cache import ExpectedDeliveriesCache
 from ai_services.face_processing import FaceProcessing
 from ai_services.ocr_processing import OCRProcessing
 from communication.aws_client import AwsIotClient
@@ -96,12 +98,15 @@ class Orchestrator:
         self.ocr_service = None
         self.servo_service = None
         self.rfid_listener = None
+        self.delivery_cache = None
+        self.warmup = None
 
     def __enter__(self):
         """Context manager entry: initializes and connects all services."""
         logger.info("Entering runtime context. Initializing services...")
         self._init_services()
         self.aws_client.connect()
+        self.delivery_cache.start()
         self.rfid_listener.start()
         self._init_flow_handlers(self.aws_client)
         return self  
@@ -112,6 +117,12 @@ class Orchestrator:
 
         if self.rfid_listener:
             self.rfid_listener.stop()
+        if self.delivery_cache:
+            self.delivery_cache.stop()
+        if self.ocr_service:
+            self.ocr_service.close()
+        if self.camera_manager:
+            self.camera_manager.close()
         if self.aws_client:
             self.aws_client.disconnect()
         if self.gpio_manager:
@@ -152,12 +163,17 @@ class Orchestrator:
             self.key_path,
             self.ca_path,
         )
-        self.user_manager = UserManager(db_path=user_db_file)
+        self.delivery_cache = ExpectedDeliveriesCache(
+            self.aws_client, cache_path=Path.cwd() / "data" / "expected_deliveries.json"
+        )
         self.gapi_service = GAPI(debug_mode=True)
         self.tts_service = TTSService()
         self.camera_manager = CameraManager()
         self.face_processor = FaceProcessing(self.camera_manager, db_path=str(face_db_path))
-        self.ocr_service = OCRProcessing()
+        self.user_manager = UserManager(
+            db_path=user_db_file, face_index=self.face_processor.face_index
+        )
+        self.ocr_service = OCRProcessing(self.camera_manager)
         self.servo_service = ServoService(pwm_chip=1, pwm_channel=0)
 
         stt_device_id = find_stt_device_id(MICROPHONE_NAME)
@@ -192,6 +208,16 @@ class Orchestrator:
             tts_service=self.tts_service, stt_service=self.stt_service
         )
 
+        # Heavy models load concurrently in the background; the main loop checks readiness
+        self.warmup = ModelWarmup()
+        self.warmup.add("face_processing", self.face_processor.warm_up)
+        # Separate step: a failed model warm-up must not leave the index empty
+        self.warmup.add("face_index", self.face_processor.load_index)
+        self.warmup.add("ocr", self.ocr_service.warm_up)
+        if self.stt_service:
+            self.warmup.add("stt", self.stt_service.warm_up)
+        self.warmup.start()
+
     def _init_flow_handlers(self, aws_client):
         """Initializes the specific flow handlers, injecting dependencies."""
         logger.info("Initializing flow handlers (Visitor, Delivery)...")
@@ -207,6 +233,7 @@ class Orchestrator:
             "camera_manager": self.camera_manager,
             "servo_service": self.servo_service,
             "interaction_manager": self.interaction_manager,
+            "delivery_cache": self.delivery_cache,
         }
 
         self.visitor_handler = VisitorFlow(**common_services)
@@ -218,10 +245,16 @@ class Orchestrator:
         and dispatching to the correct flow handler.
         """
         logger.info("System ready.")
+        outbox = self.aws_client.outbox_status()
         self.aws_client.submit_log(
             event_type="device_status_change",
             summary="Boot Notification",
-            details={"Status": "System ready"},
+            details={
+                "Status": "System ready",
+                "OutboxDepth": outbox["depth"],
+                "OutboxOldestAgeSec": round(outbox["oldest_age_sec"] or 0),
+                "OutboxDeadJobs": outbox["dead"],
+            },
         )
 
         while True:
@@ -234,6 +267,10 @@ class Orchestrator:
                     time.sleep(0.1)
 
                 logger.info("Button pressed! Starting main conversation flow.")
+                if not self.warmup.is_ready:
+                    logger.info(f"Models still warming up: {self.warmup.report()}")
+                    self.tts_service.speak(MAIN_LOOP["warming_up"])
+                    self.warmup.wait_until_ready()
                 self.aws_client.submit_log(
                     event_type="doorbell_pressed",
                     summary="Doorbell pressed",
@@ -256,6 +293,7 @@ class Orchestrator:
                             MAIN_LOOP["greeting"],
                             max_listen_duration=7,
                             max_attempts=1,
+                            keywords=VISITOR_INTENT + DELIVERY_INTENT,
                         )
                     else:
                         # Retry: just prompt for delivery/message
@@ -263,6 +301,7 @@ class Orchestrator:
                             MAIN_LOOP["unclear_intent"],
                             max_listen_duration=7,
                             max_attempts=1,
+                            keywords=VISITOR_INTENT + DELIVERY_INTENT,
                         )
                     if not text:
                         attempt += 1
@@ -4,6 +4,7 @@ MAIN_LOOP = {
     "greeting": "Hi, I'm NeoBell. Do you want to deliver a package or to leave a message?",
     "unclear_intent": "Sorry, I didn't get that. Please say 'delivery' or 'message'.",
     "error": "Something went wrong. Let's start over.",
+    "warming_up": "I'm still starting up. Please wait a moment.",
 }
 
 VISITOR = {
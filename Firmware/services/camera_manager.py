@@ -3,94 +3,224 @@ import threading
 import time
 import logging
 import subprocess
+from collections import deque
+from contextlib import contextmanager
 import sounddevice as sd
 
 VIDEO_FPS = 20.0
 MICROPHONE_NAME = "USB PnP Sound Device"
+FRAME_BUFFER_SIZE = 4  # Newest frames kept per camera
+WARMUP_FRAMES = 10  # Frames discarded after opening, while exposure settles
+FRAME_TIMEOUT_SEC = 3.0
 logger = logging.getLogger(__name__)
 
+
+class CameraStream:
+    """
+    Owns one opened camera and a grabber thread that keeps reading from it,
+    storing the newest frames in a small ring buffer with their timestamps.
+    Frames are published read-only, so consumers can share them without copies.
+    """
+    def __init__(self, camera_id: int, cap: cv2.VideoCapture, buffer_size: int = FRAME_BUFFER_SIZE):
+        self.camera_id = camera_id
+        self.cap = cap
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self._frames = deque(maxlen=buffer_size)  # (seq, timestamp, frame)
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._grab_loop, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stops the grabber thread and releases the device."""
+        self._stop_event.set()
+        self._thread.join(timeout=2)
+        if self._thread.is_alive():
+            logger.warning(f"Grabber thread of camera {self.camera_id} did not stop in time.")
+        self.cap.release()
+        with self._condition:
+            self._condition.notify_all()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stop_event.is_set()
+
+    def _grab_loop(self):
+        warmup_left = WARMUP_FRAMES
+        while not self._stop_event.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                logger.warning(f"Failed to read a frame from camera {self.camera_id}.")
+                time.sleep(0.05)
+                continue
+            if warmup_left > 0:
+                warmup_left -= 1
+                continue
+
+            frame.flags.writeable = False
+            with self._condition:
+                self._seq += 1
+                self._frames.append((self._seq, time.monotonic(), frame))
+                self._condition.notify_all()
+        logger.info(f"Grabber thread of camera {self.camera_id} finished.")
+
+    def latest(self):
+        """Returns the newest (seq, timestamp, frame) tuple, or None if nothing was read yet."""
+        with self._condition:
+            return self._frames[-1] if self._frames else None
+
+    def snapshot(self) -> list:
+        """Returns the buffered (seq, timestamp, frame) tuples, oldest first."""
+        with self._condition:
+            return list(self._frames)
+
+    def wait_for_frame(self, after_seq: int = 0, after_time: float | None = None, timeout: float = FRAME_TIMEOUT_SEC):
+        """
+        Blocks until a frame newer than after_seq (and captured after after_time,
+        a time.monotonic() value) is available.
+
+        Returns:
+            The newest matching (seq, timestamp, frame) tuple, or None on timeout.
+        """
+        def is_fresh(entry):
+            return entry[0] > after_seq and (after_time is None or entry[1] > after_time)
+
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not (self._frames and is_fresh(self._frames[-1])):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.is_running:
+                    return None
+                self._condition.wait(remaining)
+            return self._frames[-1]
+
+
 class CameraManager:
     def __init__(self):
         self.stop_recording_event = threading.Event()
         self.recording_thread = None
-        self.cams = {}  # camera_id: VideoCapture
-        self.cam_refcounts = {}  # camera_id: refcount
+        self.streams = {}  # camera_id: CameraStream
+        self.stream_refcounts = {}  # camera_id: refcount
         self.lock = threading.Lock()  
 
-    def open_camera(self, camera_id: int, width: int = 1920, height: int = 1080):
-        """Opens and returns a cv2.VideoCapture object for the given camera ID. Increments refcount."""
+    def open_stream(self, camera_id: int, width: int = 1920, height: int = 1080) -> CameraStream:
+        """
+        Returns the running CameraStream for the given camera ID, opening the device
+        and starting its grabber thread if needed. Increments refcount.
+        If the stream is already running, its current resolution is kept.
+        """
         with self.lock:
-            if camera_id in self.cams:
-                self.cam_refcounts[camera_id] += 1
-                return self.cams[camera_id]
+            if camera_id in self.streams:
+                self.stream_refcounts[camera_id] += 1
+                return self.streams[camera_id]
             cam = cv2.VideoCapture(camera_id)
             if not cam.isOpened():
                 logger.error(f"Cannot open camera with ID {camera_id}.")
                 raise RuntimeError(f"Camera {camera_id} could not be opened.")
             cam.set(cv2.CAP_PROP_FRAME_WIDTH, width)
             cam.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-            self.cams[camera_id] = cam
-            self.cam_refcounts[camera_id] = 1
-            logger.info(f"Camera resource allocated")
-            return cam
-
-    def release_camera(self, camera_id: int):
-        """Decrements refcount and releases the camera object if no one else is using it."""
+            stream = CameraStream(camera_id, cam)
+            stream.start()
+            self.streams[camera_id] = stream
+            self.stream_refcounts[camera_id] = 1
+            logger.info(f"Camera {camera_id} stream started at {stream.width}x{stream.height}")
+            return stream
+
+    def release_stream(self, camera_id: int):
+        """Decrements refcount and stops the stream if no one else is using it."""
         with self.lock:
-            if camera_id not in self.cams:
+            if camera_id not in self.streams:
                 return
-            self.cam_refcounts[camera_id] -= 1
-            if self.cam_refcounts[camera_id] <= 0:
-                logger.info(f"Camera resource released")
-                self.cams[camera_id].release()
-                del self.cams[camera_id]
-                del self.cam_refcounts[camera_id]
-
-    def take_picture(self, camera_id: int, filename: str):
-        """Captures a single high-resolution picture and saves it to a file."""
-        cam = None # Initialize to None
+            self.stream_refcounts[camera_id] -= 1
+            if self.stream_refcounts[camera_id] > 0:
+                return
+            stream = self.streams.pop(camera_id)
+            del self.stream_refcounts[camera_id]
+        stream.stop()
+        logger.info(f"Camera {camera_id} stream released")
+
+    @contextmanager
+    def stream(self, camera_id: int, width: int = 1920, height: int = 1080):
+        """Keeps the camera stream open for the duration of the with-block."""
+        stream = self.open_stream(camera_id, width, height)
         try:
-            cam = self.open_camera(camera_id)
+            yield stream
+        finally:
+            self.release_stream(camera_id)
 
-            for i in range(10):
-                result, _ = cam.read()
-                if not result:
-                    logger.warning(f"Failed to read a warmup frame (attempt {i + 1}).")
+    def close(self):
+        """Stops every running stream, regardless of refcounts."""
+        with self.lock:
+            streams = list(self.streams.values())
+            self.streams.clear()
+            self.stream_refcounts.clear()
+        for stream in streams:
+            stream.stop()
+
+    def grab_frame(self, camera_id: int):
+        """
+        Returns a read-only BGR ndarray captured after this call, or None.
+        Uses the running stream if there is one, so no warm-up is paid.
+        """
+        requested_at = time.monotonic()
+        with self.stream(camera_id) as stream:
+            entry = stream.wait_for_frame(after_time=requested_at)
+        if entry is None:
+            logger.error("Failed to capture an image from the camera.")
+            return None
+        return entry[2]
+
+    def grab_burst(self, camera_id: int, count: int, timeout: float = FRAME_TIMEOUT_SEC) -> list:
+        """
+        Returns up to `count` consecutive read-only frames captured after this call.
+        Fewer frames are returned if the camera stalls for longer than `timeout`.
+        """
+        requested_at = time.monotonic()
+        frames = []
+        with self.stream(camera_id) as stream:
+            last_seq = 0
+            while len(frames) < count:
+                entry = stream.wait_for_frame(after_seq=last_seq, after_time=requested_at, timeout=timeout)
+                if entry is None:
+                    logger.warning(f"Camera {camera_id} stalled after {len(frames)}/{count} burst frames.")
                     break
+                last_seq, _, frame = entry
+                frames.append(frame)
+        return frames
 
-            logger.info("Capturing final image...")
-            result, image = cam.read()
-            if not result:
-                logger.error("Failed to capture the final image from the camera.")
-                return False
+    def take_picture(self, camera_id: int, filename: str):
+        """Captures a single high-resolution picture and saves it to a file."""
+        image = self.grab_frame(camera_id)
+        if image is None:
+            return False
 
-            cv2.imwrite(filename, image)
-            logger.info("Image successfully saved")
-            return True
-        finally:
-            if cam is not None:
-                self.release_camera(camera_id)
+        cv2.imwrite(filename, image)
+        logger.info("Image successfully saved")
+        return True
 
     def _record_video_thread(self, camera_id: int, output_file: str):
         """Thread worker for recording video frames. It runs until the stop event is set."""
         logger.info("Background video recording thread started.")
-        cap = self.open_camera(camera_id)
-
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        stream = self.open_stream(camera_id)
 
         fourcc = cv2.VideoWriter_fourcc(*"mp4v")
         video_writer = cv2.VideoWriter(
-            output_file, fourcc, VIDEO_FPS, (frame_width, frame_height)
+            output_file, fourcc, VIDEO_FPS, (stream.width, stream.height)
         )
 
         frame_delay = 1.0 / VIDEO_FPS
+        last_seq = 0
         try:
             while not self.stop_recording_event.is_set():
                 loop_start_time = time.monotonic()
-                ret, frame = cap.read()
-                if not ret:
+                entry = stream.wait_for_frame(after_seq=last_seq)
+                if entry is None:
                     break
+                last_seq, _, frame = entry
                 if video_writer:
                     video_writer.write(frame)
 
@@ -99,7 +229,7 @@ class CameraManager:
                 if sleep_time > 0:
                     time.sleep(sleep_time)
         finally:
-            self.release_camera(camera_id)
+            self.release_stream(camera_id)
             video_writer.release()
             logger.info("Background video recording thread finished.")
 
@@ -143,6 +273,11 @@ class CameraManager:
         """
         logger.info(f"Iniciando gravação por {duration} segundos...")
 
+        if camera_id in self.streams:
+            # FFmpeg opens the V4L2 device itself and cannot share it with the grabber thread
+            logger.error(f"Câmera {camera_id} está em uso por um stream. Abortando gravação.")
+            return False
+
         try:
             audio_device = self._get_ffmpeg_alsa_device_name(MICROPHONE_NAME)
             if not audio_device:
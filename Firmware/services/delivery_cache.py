@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL_SEC = 15 * 60  # Periodic pull, in addition to pushes and reconnects
+MAX_CACHE_AGE_SEC = 24 * 60 * 60  # Older snapshots are not trusted to accept packages
+
+
+class ExpectedDeliveriesCache:
+    """
+    A local snapshot of the pending ExpectedDeliveries tracking numbers of the
+    users linked to this device, so a scanned code can be accepted without an
+    MQTT round trip and while the connection is briefly down.
+
+    The snapshot is pulled at boot, every REFRESH_INTERVAL_SEC, when the
+    backend announces a change and when the MQTT connection resumes. It is
+    persisted to disk so a reboot while offline still has the last one.
+    """
+
+    def __init__(self, aws_client, cache_path: Path, refresh_interval: float = REFRESH_INTERVAL_SEC,
+                 max_age: float = MAX_CACHE_AGE_SEC):
+        """
+        Args:
+            aws_client: AwsIotClient used to pull snapshots and receive change notifications.
+            cache_path: JSON file the snapshot is persisted to.
+            refresh_interval: Seconds between periodic pulls.
+            max_age: Seconds after which the snapshot is ignored by lookups.
+        """
+        self.aws_client = aws_client
+        self.cache_path = cache_path
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._deliveries: dict[str, dict] = {}  # TRACKING_NUMBER: {"order_id", "user_id", ...}
+        self._synced_at = 0.0
+        self._load()
+
+        self._refresh_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run_sync_loop, name="delivery-cache", daemon=True)
+
+        self.aws_client.add_listener("pending_deliveries_changed", lambda _: self.request_refresh())
+        self.aws_client.add_listener("connection_resumed", lambda _: self.request_refresh())
+        logger.info(f"ExpectedDeliveriesCache initialized with {len(self._deliveries)} cached deliveries.")
+
+    def start(self):
+        """Starts the background sync thread, which pulls a snapshot right away."""
+        if not self._thread.is_alive():
+            self._refresh_event.set()
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._refresh_event.set()
+        self._thread.join(timeout=2)
+
+    def request_refresh(self):
+        """Asks the sync thread to pull a new snapshot. Safe to call from MQTT callbacks."""
+        self._refresh_event.set()
+
+    def _run_sync_loop(self):
+        while not self._stop_event.is_set():
+            self._refresh_event.wait(timeout=self.refresh_interval)
+            if self._stop_event.is_set():
+                break
+            self._refresh_event.clear()
+            try:
+                self.refresh()
+            except Exception:
+                logger.error("Failed to refresh the expected deliveries cache.", exc_info=True)
+
+    def refresh(self) -> bool:
+        """Pulls the pending deliveries from the backend. Returns False if it did not answer."""
+        response = self.aws_client.request_pending_deliveries()
+        if not response or "deliveries" not in response:
+            logger.warning(f"Could not refresh expected deliveries, keeping {len(self._deliveries)} cached.")
+            return False
+
+        deliveries = {
+            d["tracking_number"].upper().strip(): d
+            for d in response["deliveries"]
+            if d.get("tracking_number")
+        }
+        with self._lock:
+            self._deliveries = deliveries
+            self._synced_at = time.time()
+        self._save()
+        logger.info(f"Expected deliveries cache refreshed: {len(deliveries)} pending.")
+        return True
+
+    def lookup(self, tracking_number: str) -> dict | None:
+        """
+        Returns the cached pending delivery for a tracking number, or None if it
+        is unknown or the snapshot is older than max_age.
+        """
+        if not tracking_number:
+            return None
+        with self._lock:
+            if time.time() - self._synced_at > self.max_age:
+                return None
+            return self._deliveries.get(tracking_number.upper().strip())
+
+    def remove(self, tracking_number: str):
+        """Drops a delivery from the snapshot, e.g. once it has been received."""
+        with self._lock:
+            removed = self._deliveries.pop(tracking_number.upper().strip(), None)
+        if removed:
+            self._save()
+
+    @property
+    def age(self) -> float | None:
+        """Seconds since the last successful sync, None if never synced."""
+        return time.time() - self._synced_at if self._synced_at else None
+
+    def _load(self):
+        if not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._deliveries = data.get("deliveries", {})
+            self._synced_at = data.get("synced_at", 0.0)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Could not read expected deliveries cache at {self.cache_path}: {e}")
+
+    def _save(self):
+        with self._lock:
+            data = {"synced_at": self._synced_at, "deliveries": dict(self._deliveries)}
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=4)
+            os.replace(tmp_path, self.cache_path)
+        except IOError as e:
+            logger.error(f"Could not save expected deliveries cache to {self.cache_path}: {e}")
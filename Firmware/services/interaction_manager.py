@@ -1,3 +1,4 @@
+import os
 import logging
 import re
 
@@ -8,6 +9,11 @@ logger = logging.getLogger(__name__)
 # Keyword Definitions for Interpretation
 AFFIRMATIVE_WORDS = {"yes", "yeah", "yep", "sure", "correct", "right", "affirmative"}
 NEGATIVE_WORDS = {"no", "nope", "negative", "wrong", "incorrect"}
+YES_NO_KEYWORDS = sorted(AFFIRMATIVE_WORDS | NEGATIVE_WORDS)
+
+# Listen while the question is being spoken, so visitors who know the prompts can answer over them.
+# Off by default: without echo cancellation it has to be tuned on the device first.
+BARGE_IN_ENABLED = os.getenv("STT_BARGE_IN", "false").lower() == "true"
 
 
 class InteractionManager:
@@ -17,28 +23,37 @@ class InteractionManager:
         override: bool = True,
         max_listen_duration: int = 5,
         max_attempts: int = 3,
+        keywords: list[str] | None = None,
     ) -> str | None:
         """
         Asks a generic question via TTS and returns the user's transcribed response (STT).
         Repeats up to max_attempts if no response is detected.
+        With keywords (a closed-set question), the answer is first matched against
+        them by the fast keyword recognizer, falling back to full transcription.
         Returns the formatted (lowercase, stripped) response or None if not understood.
         """
         if not question:
             logger.error("ask_question called with an empty question.")
             return None
 
-        self.tts.speak(question, override)
+        prompt_done = self._speak_prompt(question, override)
         for attempt in range(max_attempts):
             logger.info(
                 f"Waiting for user response for {max_listen_duration} seconds..."
             )
-            transcribed_text = self.stt.transcribe_audio(
-                duration_seconds=max_listen_duration
-            )
+            barge_in = {"prompt_done": prompt_done, "on_barge_in": self.tts.stop} if prompt_done else {}
+            if keywords:
+                transcribed_text = self.stt.transcribe_keywords(
+                    keywords, duration_seconds=max_listen_duration, **barge_in
+                )
+            else:
+                transcribed_text = self.stt.transcribe_audio(
+                    duration_seconds=max_listen_duration, **barge_in
+                )
             if not transcribed_text:
                 logger.warning("No text was transcribed from the user's response.")
                 if attempt < max_attempts -1:
-                    self.tts.speak(YESNO["not_understood"])
+                    prompt_done = self._speak_prompt(YESNO["not_understood"])
                 continue
             processed_response = transcribed_text.lower().strip()
             logger.info(f"User response transcribed as: '{processed_response}'")
@@ -55,18 +70,31 @@ class InteractionManager:
     TTS and STT services to be injected upon initialization.
     """
 
-    def __init__(self, tts_service, stt_service):
+    def __init__(self, tts_service, stt_service, barge_in: bool = BARGE_IN_ENABLED):
         """
         Initializes the InteractionManager with necessary services.
 
         Args:
             tts_service (TTSService): An initialized instance of the TTS service.
             stt_service (STTService): An initialized instance of the STT service.
+            barge_in (bool): Listen while prompts are spoken and stop them when the user talks.
         """
         self.tts = tts_service
         self.stt = stt_service
+        self.barge_in = barge_in
         logger.info("InteractionManager initialized.")
 
+    def _speak_prompt(self, text: str, override: bool = True):
+        """
+        Speaks a prompt before listening. With barge-in, returns as soon as
+        playback starts, with the event that marks its end, so listening can
+        begin during the prompt; otherwise blocks until it is spoken and returns None.
+        """
+        if self.barge_in:
+            return self.tts.start_speaking(text, override)
+        self.tts.speak(text, override)
+        return None
+
     def ask_yes_no(
         self, question: str, override: bool = True, listen_duration_seconds: int = 5
     ) -> bool | None:
@@ -83,6 +111,7 @@ class InteractionManager:
                 override=override,
                 max_listen_duration=listen_duration_seconds,
                 max_attempts=2,
+                keywords=YES_NO_KEYWORDS,
             )
             if not response:
                 break
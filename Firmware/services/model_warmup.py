@@ -0,0 +1,88 @@
+import time
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWarmup:
+    """
+    Loads the heavy models of several services concurrently in background
+    threads, so boot isn't serialized and the first visitor doesn't pay for
+    lazy model construction. Exposes a readiness state for the main loop and
+    the startup time of each component.
+    """
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self):
+        self._tasks: dict[str, Callable[[], None]] = {}
+        self._status: dict[str, str] = {}
+        self._timings: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._ready_event = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._start_time = None
+
+    def add(self, name: str, warm_up_fn: Callable[[], None]):
+        """Registers a component. warm_up_fn should load its models and run one dummy inference."""
+        self._tasks[name] = warm_up_fn
+        self._status[name] = self.PENDING
+
+    def start(self):
+        """Starts every registered warm-up in its own daemon thread and returns immediately."""
+        self._start_time = time.monotonic()
+        logger.info(f"Warming up {len(self._tasks)} components: {', '.join(self._tasks)}")
+        for name, warm_up_fn in self._tasks.items():
+            thread = threading.Thread(
+                target=self._run_task, args=(name, warm_up_fn), name=f"warmup-{name}", daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+        if not self._tasks:
+            self._ready_event.set()
+
+    def _run_task(self, name: str, warm_up_fn: Callable[[], None]):
+        task_start = time.monotonic()
+        try:
+            warm_up_fn()
+            status = self.READY
+        except Exception:
+            logger.error(f"Warm-up of '{name}' failed.", exc_info=True)
+            status = self.FAILED
+        elapsed = time.monotonic() - task_start
+
+        with self._lock:
+            self._status[name] = status
+            self._timings[name] = elapsed
+            done = self.PENDING not in self._status.values()
+        logger.info(f"Warm-up of '{name}' {status} in {elapsed:.2f}s.")
+
+        if done:
+            logger.info(
+                f"All components warmed up in {time.monotonic() - self._start_time:.2f}s: "
+                + ", ".join(f"{n}={t:.2f}s" for n, t in self._timings.items())
+            )
+            self._ready_event.set()
+
+    @property
+    def is_ready(self) -> bool:
+        """True once every warm-up has finished, successfully or not."""
+        return self._ready_event.is_set()
+
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        """Blocks until every warm-up has finished. Returns False on timeout."""
+        return self._ready_event.wait(timeout)
+
+    def is_component_ready(self, name: str) -> bool:
+        return self._status.get(name) == self.READY
+
+    def report(self) -> dict:
+        """Status and startup time (seconds, None if still pending) of each component."""
+        with self._lock:
+            return {
+                name: {"status": status, "seconds": round(self._timings[name], 2) if name in self._timings else None}
+                for name, status in self._status.items()
+            }
@@ -1,67 +1,383 @@
+import os
+import json
+import time
+import queue
 import logging
-import datetime
+import threading
+from collections import deque
+import numpy as np
 import whisper
 import speech_recognition as sr  
+import vosk
+
+from services.vad import BargeInDetector, VoiceActivityDetector
 
-logging.getLogger("speech_recognition").setLevel(logging.DEBUG)
 logger = logging.getLogger(__name__)
+vosk.SetLogLevel(-1)
+
+MODEL_SAMPLE_RATE = whisper.audio.SAMPLE_RATE  # 16 kHz, o que o Whisper consome
+# Taxas tentadas na captura, da menor para a maior: capturar acima de 16 kHz só gera amostras descartadas
+CAPTURE_RATES = (16000, 32000, 44100, 48000, 96000)
+
+END_OF_SPEECH_SECONDS = 0.5  # Silêncio (após o hangover do VAD) que encerra a resposta
+
+CHUNK_SECONDS = 0.02  # Duração de cada leitura do microfone (um quadro do VAD)
+PRE_ROLL_SECONDS = 0.3  # Áudio anterior ao início da fala, para não cortar a primeira sílaba
+# Pausa (após o hangover do VAD, ~0.6s no total) que fecha um trecho e o envia ao Whisper durante a fala.
+# Cada trecho é uma chamada ao Whisper com janela de 30s: trechos curtos multiplicam o trabalho do
+# encoder e cortam frases, então só frases longas são adiantadas.
+SEGMENT_PAUSE = 0.35
+MIN_SEGMENT_SECONDS = 3.0  # Trechos menores esperam a próxima pausa
+# Modelo Vosk pequeno usado nas perguntas de vocabulário fechado (sim/não, intenção)
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-en-us-0.15")
+KEYWORD_CONFIDENCE = float(os.getenv("STT_KEYWORD_CONFIDENCE", "0.8"))  # Abaixo disso, usa o Whisper
+TAPS_PER_PHASE = 24  # Tamanho do filtro de reamostragem, por fase polifásica
+RESAMPLE_BLOCK = 8192  # Amostras de saída calculadas por vez (limita a memória da indexação)
+
+
+class PolyphaseResampler:
+    """
+    Reamostragem racional (up L, down M) com um FIR passa-baixa em forma
+    polifásica: cada amostra de saída usa só os coeficientes da sua fase, e
+    o cálculo é vetorizado com NumPy por blocos. Sem scipy.
+    """
+
+    def __init__(self, input_rate: int, output_rate: int, taps_per_phase: int = TAPS_PER_PHASE):
+        g = np.gcd(input_rate, output_rate)
+        self.up, self.down = output_rate // g, input_rate // g
+        self.input_rate, self.output_rate = input_rate, output_rate
+        if self.up == self.down:
+            return
+
+        # Sinc janelado projetado na taxa intermediária (input_rate * up)
+        num_taps = taps_per_phase * self.up
+        cutoff = 0.9 / max(self.up, self.down)  # Relativa à Nyquist da taxa intermediária
+        n = np.arange(num_taps) - (num_taps - 1) / 2
+        taps = cutoff * np.sinc(cutoff * n) * np.hamming(num_taps) * self.up
+        # phases[p, j] = taps[p + j * up]: coeficientes da fase p
+        self.phases = taps.reshape(taps_per_phase, self.up).T.astype(np.float32)
+        self.taps_per_phase = taps_per_phase
+        self.delay = (num_taps - 1) // 2  # Atraso de grupo, compensado para alinhar a saída
+
+    def __call__(self, samples: np.ndarray) -> np.ndarray:
+        if self.up == self.down:
+            return samples.astype(np.float32, copy=False)
+
+        num_out = len(samples) * self.up // self.down
+        padded = np.concatenate([np.zeros(self.taps_per_phase, dtype=np.float32), samples,
+                                 np.zeros(self.taps_per_phase, dtype=np.float32)])
+        j = np.arange(self.taps_per_phase)
+        out = np.empty(num_out, dtype=np.float32)
+        for start in range(0, num_out, RESAMPLE_BLOCK):
+            t = np.arange(start, min(start + RESAMPLE_BLOCK, num_out)) * self.down + self.delay
+            phase, base = t % self.up, t // self.up
+            # y[n] = sum_j h[phase + j*up] * x[base - j]
+            window = padded[base[:, None] - j[None, :] + self.taps_per_phase]
+            out[start:start + len(t)] = np.einsum("nj,nj->n", window, self.phases[phase])
+        return out
+
+
+class AudioFrontend:
+    """
+    Captura de áudio para o STT: abre o microfone na menor taxa suportada de
+    CAPTURE_RATES (16 kHz quando o dispositivo permite) e converte o PCM
+    int16 capturado no que o Whisper consome, float32 a 16 kHz, com uma
+    única reamostragem polifásica quando a taxa negociada é outra.
+    """
+
+    def __init__(self, device_id: int | None = None, candidate_rates=CAPTURE_RATES):
+        self.device_id = device_id
+        self.sample_rate = self._negotiate_rate(candidate_rates)
+        self.chunk_size = int(self.sample_rate * CHUNK_SECONDS)
+        self.resampler = PolyphaseResampler(self.sample_rate, MODEL_SAMPLE_RATE)
+        logger.info(
+            f"Captura de áudio a {self.sample_rate} Hz "
+            f"({'sem reamostragem' if self.sample_rate == MODEL_SAMPLE_RATE else f'reamostrado para {MODEL_SAMPLE_RATE} Hz'})"
+        )
 
-SAMPLE_RATE = 48000
-# SAMPLE_RATE = 96000
+    def _negotiate_rate(self, candidate_rates) -> int:
+        """Retorna a menor taxa aceita pelo dispositivo, ou a taxa padrão dele."""
+        pyaudio = sr.Microphone.get_pyaudio()
+        audio = pyaudio.PyAudio()
+        try:
+            device = (audio.get_device_info_by_index(self.device_id) if self.device_id is not None
+                      else audio.get_default_input_device_info())
+            for rate in sorted(candidate_rates):
+                try:
+                    if audio.is_format_supported(rate, input_device=device["index"], input_channels=1,
+                                                 input_format=pyaudio.paInt16):
+                        return rate
+                except ValueError:
+                    continue
+            return int(device["defaultSampleRate"])
+        finally:
+            audio.terminate()
+
+    def open(self) -> sr.Microphone:
+        """Microfone na taxa negociada; usar com `with`, lendo blocos de chunk_size."""
+        return sr.Microphone(device_index=self.device_id, sample_rate=self.sample_rate, chunk_size=self.chunk_size)
+
+    def to_model_input(self, chunks: list[np.ndarray]) -> np.ndarray:
+        """Converte blocos PCM int16 em float32 mono a 16 kHz, em [-1, 1]."""
+        samples = np.concatenate(chunks).astype(np.float32) / 32768.0
+        return self.resampler(samples)
+
+
+class StreamingTranscription:
+    """
+    Transcreve trechos de fala em uma thread própria enquanto a captura
+    continua. Quando o visitante termina de falar só falta decodificar o
+    último trecho, em vez da frase inteira. Cada trecho recebe o texto já
+    transcrito como initial_prompt, para manter o contexto entre eles.
+    """
+
+    def __init__(self, model, language: str = "en"):
+        self.model = model
+        self.language = language
+        self._segments = queue.Queue()
+        self._texts = []
+        self.inference_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="stt-stream", daemon=True)
+        self._thread.start()
+
+    def feed(self, samples: np.ndarray):
+        """Enfileira um trecho float32 a 16 kHz para transcrição."""
+        self._segments.put(samples)
+
+    def finish(self) -> str:
+        """Espera os trechos pendentes e retorna o texto completo."""
+        self._segments.put(None)
+        self._thread.join()
+        return " ".join(self._texts).strip()
 
-PAUSE_THRESHOLD = 1.2
-SILENCE_THRESHOLD = 100  
+    def _run(self):
+        while (samples := self._segments.get()) is not None:
+            try:
+                start = time.perf_counter()
+                result = self.model.transcribe(
+                    samples, language=self.language, initial_prompt=" ".join(self._texts) or None
+                )
+                self.inference_seconds += time.perf_counter() - start
+                text = result["text"].strip()
+                if text:
+                    self._texts.append(text)
+            except Exception as e:
+                logger.error(f"Erro ao transcrever trecho com Whisper: {e}")
 
 
 class STTService:
-    def __init__(self, model_name: str = "base", device_id: int | None = None):
+    def __init__(self, model_name: str = "base", device_id: int | None = None,
+                 end_of_speech_seconds: float = END_OF_SPEECH_SECONDS):
         """
-        Inicializa o serviço de Speech-to-Text usando speech_recognition + Whisper.
+        Inicializa o serviço de Speech-to-Text: captura com AudioFrontend,
+        detecção de fala com VoiceActivityDetector e transcrição com Whisper.
         """
         self.model_name = model_name
         self.device_id = device_id
-        self.recorder = sr.Recognizer()
-        self.recorder.energy_threshold = (
-            SILENCE_THRESHOLD  
-        )
-        self.recorder.pause_threshold = PAUSE_THRESHOLD
-        self.recorder.dynamic_energy_threshold = False
-        self.audio_model = whisper.load_model(
-            model_name
-        )  
+        self.end_of_speech_seconds = end_of_speech_seconds
+        self.frontend = AudioFrontend(device_id)
+        # Um único detector: o nível de ruído aprendido vale para as próximas respostas
+        self.vad = VoiceActivityDetector(self.frontend.sample_rate)
+        # O modelo é carregado em warm_up() (ou na primeira transcrição) para não bloquear o boot
+        self.audio_model = None
+        self.keyword_model = None
+        self._model_lock = threading.Lock()
+        self._resample_seconds = 0.0  # Tempo de reamostragem da última escuta, para o log
         logger.info(
             f"STTService inicializado com modelo '{model_name}' e dispositivo ID '{device_id}'"
         )
 
-    def transcribe_audio(self, duration_seconds: int = 15) -> str | None:
+    def _load_model(self):
+        """Carrega o modelo Whisper uma única vez, mesmo com chamadas concorrentes."""
+        with self._model_lock:
+            if self.audio_model is None:
+                self.audio_model = whisper.load_model(self.model_name)
+        return self.audio_model
+
+    def _load_keyword_model(self):
+        """Carrega o modelo Vosk uma única vez. Sem ele, as palavras-chave caem no Whisper."""
+        with self._model_lock:
+            if self.keyword_model is None and os.path.isdir(VOSK_MODEL_PATH):
+                self.keyword_model = vosk.Model(VOSK_MODEL_PATH)
+        return self.keyword_model
+
+    def warm_up(self):
+        """Carrega os modelos Whisper e Vosk e executa uma inferência de teste com 1s de silêncio."""
+        model = self._load_model()
+        model.transcribe(np.zeros(MODEL_SAMPLE_RATE, dtype=np.float32), language="en")
+        if self._load_keyword_model() is None:
+            logger.warning(f"Modelo Vosk não encontrado em '{VOSK_MODEL_PATH}'; palavras-chave usarão o Whisper.")
+
+    def transcribe_audio(self, duration_seconds: int = 15, prompt_done: threading.Event | None = None,
+                         on_barge_in=None) -> str | None:
         """
-        Grava o áudio do microfone usando speech_recognition, detecta silêncio automaticamente e retorna a transcrição usando Whisper.
-        Salva o áudio capturado em um arquivo .wav.
+        Grava o áudio do microfone, detecta o fim da fala pelo silêncio e
+        retorna a transcrição do Whisper. O áudio fica em memória: cada trecho
+        é convertido para float32 a 16 kHz e entregue direto ao modelo, que
+        começa a transcrever enquanto o visitante ainda está falando.
+
+        Com prompt_done (o evento de fim da pergunta em reprodução), o
+        microfone já escuta durante a pergunta; se o visitante falar por cima
+        dela, on_barge_in é chamado (para interromper o TTS) e a fala é usada.
         """
-        output_filename = "audio_neobell.wav"
+        stream = StreamingTranscription(self._load_model())
+        self._resample_seconds = 0.0
+        capture_start = time.perf_counter()
         try:
-            with sr.Microphone(device_index=self.device_id, sample_rate=SAMPLE_RATE, chunk_size=512) as source:
-                logger.info("Ajustando para o ruído ambiente...")
-                logger.info(f"Gravando... (máx {duration_seconds}s ou até silêncio)")
-                audio = self.recorder.listen(
-                    source, timeout=duration_seconds, phrase_time_limit=duration_seconds
-                )
-            with open(output_filename, "wb") as f:
-                f.write(audio.get_wav_data(convert_rate=SAMPLE_RATE))
-            logger.info(f"Áudio gravado com sucesso em '{output_filename}'")
+            logger.info(f"Gravando... (máx {duration_seconds}s ou até silêncio)")
+            spoke = self._listen(duration_seconds, stream.feed, prompt_done, on_barge_in)
         except Exception as e:
             logger.error(f"Erro ao capturar áudio do microfone: {e}")
+            stream.finish()
             return None
 
+        capture_end = time.perf_counter()
+        transcribed_text = stream.finish()
+        logger.info(
+            f"STT: captura {capture_end - capture_start:.2f}s, reamostragem {self._resample_seconds * 1000:.1f}ms, "
+            f"inferência {stream.inference_seconds:.2f}s, após o fim da fala {time.perf_counter() - capture_end:.2f}s"
+        )
+        if not spoke:
+            logger.info("Nenhuma fala detectada.")
+            return None
+        logger.info(f"Texto transcrito: '{transcribed_text}'")
+        return transcribed_text if transcribed_text else None
+
+    def transcribe_keywords(self, keywords: list[str], duration_seconds: int = 5,
+                            prompt_done: threading.Event | None = None, on_barge_in=None) -> str | None:
+        """
+        Reconhece uma resposta de vocabulário fechado (ex.: sim/não, intenção).
+
+        O áudio é decodificado pelo Vosk com uma gramática restrita às
+        palavras-chave durante a captura, o que leva uma fração do tempo do
+        Whisper. Retorna só as palavras-chave reconhecidas; se nenhuma tiver
+        confiança >= KEYWORD_CONFIDENCE, o mesmo áudio é transcrito pelo
+        Whisper, sem perguntar de novo. prompt_done e on_barge_in funcionam
+        como em transcribe_audio.
+        """
+        keyword_model = self._load_keyword_model()
+        if keyword_model is None:
+            return self.transcribe_audio(duration_seconds, prompt_done, on_barge_in)
+
+        # "[unk]" absorve o que está fora da gramática, em vez de forçar uma palavra-chave
+        recognizer = vosk.KaldiRecognizer(keyword_model, MODEL_SAMPLE_RATE, json.dumps(list(keywords) + ["[unk]"]))
+        recognizer.SetWords(True)
+        segments = []
+
+        def on_segment(samples):
+            segments.append(samples)
+            recognizer.AcceptWaveform((np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+
+        self._resample_seconds = 0.0
+        capture_start = time.perf_counter()
         try:
-            logger.info("Transcrevendo áudio com Whisper...")
-            result = self.audio_model.transcribe(output_filename, language="en")
-            transcribed_text = result["text"].strip()
-            logger.info(f"Texto transcrito: '{transcribed_text}'")
-            return transcribed_text if transcribed_text else None
+            logger.info(f"Gravando palavra-chave... (máx {duration_seconds}s ou até silêncio)")
+            spoke = self._listen(duration_seconds, on_segment, prompt_done, on_barge_in)
+        except Exception as e:
+            logger.error(f"Erro ao capturar áudio do microfone: {e}")
+            return None
+        if not spoke:
+            logger.info("Nenhuma fala detectada.")
+            return None
+
+        capture_end = time.perf_counter()
+        words = json.loads(recognizer.FinalResult()).get("result", [])
+        matched = [w for w in words if w["word"] != "[unk]"]
+        confidence = min((w["conf"] for w in matched), default=0.0)
+        logger.info(
+            f"STT (Vosk): captura {capture_end - capture_start:.2f}s, após o fim da fala "
+            f"{time.perf_counter() - capture_end:.2f}s, palavras {[(w['word'], round(w['conf'], 2)) for w in words]}"
+        )
+        if matched and confidence >= KEYWORD_CONFIDENCE:
+            transcribed_text = " ".join(w["word"] for w in matched)
+            logger.info(f"Palavras-chave reconhecidas: '{transcribed_text}'")
+            return transcribed_text
+
+        logger.info(f"Confiança baixa ({confidence:.2f}), transcrevendo a mesma fala com o Whisper.")
+        start = time.perf_counter()
+        try:
+            result = self._load_model().transcribe(np.concatenate(segments), language="en")
         except Exception as e:
             logger.error(f"Erro ao transcrever áudio com Whisper: {e}")
             return None
+        transcribed_text = result["text"].strip()
+        logger.info(f"STT (Whisper): inferência {time.perf_counter() - start:.2f}s, texto '{transcribed_text}'")
+        return transcribed_text if transcribed_text else None
+
+    def _to_model_input(self, segment):
+        start = time.perf_counter()
+        samples = self.frontend.to_model_input(segment)
+        self._resample_seconds += time.perf_counter() - start
+        return samples
+
+    def _listen(self, duration_seconds: float, on_segment, prompt_done: threading.Event | None = None,
+                on_barge_in=None) -> bool:
+        """
+        Lê o microfone em quadros até o VAD indicar end_of_speech_seconds de
+        silêncio depois da fala (ou duration_seconds). Cada trecho fechado por
+        uma pausa curta é passado a on_segment já pronto para o Whisper.
+        Retorna False se ninguém falou.
+
+        Enquanto prompt_done não estiver setado, os quadros só alimentam o
+        BargeInDetector; o prazo de duration_seconds conta a partir do fim da pergunta.
+        """
+        self.vad.reset()
+        barge_in = BargeInDetector(self.frontend.sample_rate) if prompt_done is not None else None
+        with self.frontend.open() as source:
+            chunk_seconds = source.CHUNK / source.SAMPLE_RATE
+            pre_roll = deque(maxlen=max(1, round(PRE_ROLL_SECONDS / chunk_seconds)))
+            segment, segment_has_speech = [], False
+            elapsed = silence = 0.0
+            speech_start = None
+
+            while True:
+                chunk = np.frombuffer(source.stream.read(source.CHUNK), dtype=np.int16)
+                elapsed += chunk_seconds
+
+                if barge_in is not None:
+                    pre_roll.append(chunk)
+                    if barge_in.process(chunk):
+                        logger.info("Visitante falou durante a pergunta, interrompendo o TTS.")
+                        if on_barge_in:
+                            on_barge_in()
+                        barge_in = None
+                        speech_start = elapsed
+                        segment, segment_has_speech = list(pre_roll), True
+                    elif prompt_done.is_set():
+                        # Pergunta terminou sem interrupção: descarta o eco e escuta normalmente
+                        barge_in = None
+                        pre_roll.clear()
+                        elapsed = 0.0
+                    continue
+
+                speaking = self.vad.process(chunk)
+
+                if speech_start is None:
+                    pre_roll.append(chunk)
+                    if speaking:
+                        speech_start = elapsed
+                        segment, segment_has_speech = list(pre_roll), True
+                    elif elapsed >= duration_seconds:
+                        return False
+                    continue
+
+                segment.append(chunk)
+                silence = 0.0 if speaking else silence + chunk_seconds
+                segment_has_speech = segment_has_speech or speaking
+                if silence >= self.end_of_speech_seconds or elapsed - speech_start >= duration_seconds:
+                    break
+                if silence >= SEGMENT_PAUSE and len(segment) * chunk_seconds >= MIN_SEGMENT_SECONDS:
+                    on_segment(self._to_model_input(segment))
+                    segment, segment_has_speech = [], False
+
+            # O silêncio depois do hangover não vai para o Whisper: só encarece a decodificação
+            trailing = int(silence / chunk_seconds)
+            if trailing > 0:
+                segment = segment[:-trailing]
+            if segment and segment_has_speech:
+                on_segment(self._to_model_input(segment))
+            logger.debug(f"Fim da fala detectado (ruído de fundo {self.vad.noise_floor_db:.1f} dBFS).")
+            return True
 
 if __name__ == "__main__":
     def list_audio_devices():
@@ -81,12 +397,9 @@ if __name__ == "__main__":
 
     try:
         stt = STTService(model_name=MODEL_NAME, device_id=MICROPHONE_ID)
+        stt.warm_up()
         if stt.audio_model:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            output_file = f"gravacao_completa_{timestamp}.wav"
-            print(
-                f"\nPor favor, fale no microfone... A gravação completa será salva em '{output_file}'"
-            )
+            print("\nPor favor, fale no microfone...")
             transcription = stt.transcribe_audio()
             if transcription:
                 print(f"\nResultado Final: {transcription}")
@@ -3,9 +3,9 @@ import hashlib
 import logging
 import threading
 import queue
+import subprocess
 from typing import Optional, Union
 from gtts import gTTS
-from playsound import playsound
 
 logger = logging.getLogger(__name__)
 CACHE_DIR = os.path.join("data", "audios")
@@ -28,6 +28,8 @@ class TTSService:
         
         # This flag will be used to signal the worker to stop playing.
         self._interrupt_event = threading.Event()
+        # The ffplay process of the phrase being played, so stop() can cut it short.
+        self._player: Optional[subprocess.Popen] = None
 
         # The worker thread processes items from the queue.
         self._worker_thread = threading.Thread(target=self._tts_worker)
@@ -72,6 +74,8 @@ class TTSService:
                     tts.save(filepath)
                 except Exception as e:
                     logger.error(f"Failed to call gTTS API: {e}")
+                    if started_event:
+                        started_event.set()
                     if done_event:
                         done_event.set()
                     self._speech_queue.task_done()
@@ -80,23 +84,43 @@ class TTSService:
                 logger.info(f"CACHE HIT: Playing '{text}' from file.")
 
             # Play the audio file.
-            # NOTE: playsound is blocking, so the queue will wait here.
-            # The override functionality works by clearing the queue of upcoming
-            # items, but it cannot interrupt a sound that has already started.
+            # NOTE: playback is blocking, so the queue will wait here. The override
+            # functionality clears the queue of upcoming items; stop() also ends
+            # the sound that is already playing.
             try:
-                if started_event:
-                    started_event.set()
-                # We check the interrupt event before playing.
-                if not self._interrupt_event.is_set():
-                    playsound(filepath)
+                self._play(filepath, started_event)
             except Exception as e:
                 logger.error(f"Error playing sound file {filepath}: {e}")
             finally:
+                # A skipped or failed play still releases a caller waiting for the start
+                if started_event:
+                    started_event.set()
                 # If this was a synchronous call, signal its completion
                 if done_event:
                     done_event.set()
                 self._speech_queue.task_done()
 
+    def _play(self, filepath: str, started_event: Optional[threading.Event] = None):
+        """
+        Plays a file with ffplay and waits for it to end or to be stopped.
+        started_event is set once the player process is running.
+        """
+        with self._lock:
+            # We check the interrupt event before playing.
+            if self._interrupt_event.is_set():
+                return
+            self._player = subprocess.Popen(
+                ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", filepath],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        if started_event:
+            started_event.set()
+        try:
+            self._player.wait()
+        finally:
+            with self._lock:
+                self._player = None
+
     def _clear_speech_queue(self):
         """Clears all upcoming speech requests from the queue."""
         with self._lock:
@@ -105,7 +129,10 @@ class TTSService:
                     item = self._speech_queue.get_nowait()
                     # If the discarded item was a synchronous call, unblock it
                     if isinstance(item, tuple):
-                        item[1].set()
+                        for event in item[1:]:
+                            if event:
+                                event.set()
+                    self._speech_queue.task_done()
                 except queue.Empty:
                     break
         
@@ -132,6 +159,33 @@ class TTSService:
         # Wait here until the worker thread signals that this text is finished
         done_event.wait()
 
+    def stop(self):
+        """Stops the phrase being played, if any, and drops the queued ones."""
+        self._clear_speech_queue()
+        with self._lock:
+            if self._player and self._player.poll() is None:
+                self._player.terminate()
+                logger.info("Playback interrupted.")
+
+    def start_speaking(self, text_to_say: str, override: bool = False) -> threading.Event:
+        """
+        Queues the text, waits until its audio starts and returns an event
+        that is set when it finishes (or is stopped). Lets the caller listen
+        while the prompt is playing.
+        """
+        done_event = threading.Event()
+        if not text_to_say:
+            done_event.set()
+            return done_event
+
+        if override:
+            self._clear_speech_queue()
+
+        started_event = threading.Event()
+        self._speech_queue.put((text_to_say, started_event, done_event))
+        started_event.wait()
+        return done_event
+
     def speak_async(self, text_to_say: str, override: bool = False):
         """
         Adds text to the speech queue and returns after the speech starts playing.
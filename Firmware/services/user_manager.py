@@ -12,14 +12,16 @@ class UserManager:
     Manages the user database stored in a local JSON file.
     Handles creation of users with unique IDs and retrieval of user data.
     """
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, face_index=None):
         """
         Initializes the user manager.
 
         Args:
             db_path: The Path object pointing to the user JSON file.
+            face_index: Optional FaceIndex whose rows are dropped when a user is deleted.
         """
         self.db_path = db_path
+        self.face_index = face_index
         self.users = self._load_users()
         logger.info(f"UserManager initialized with database file: {self.db_path}")
 
@@ -97,6 +99,10 @@ class UserManager:
                     shutil.rmtree(user_dir)
                     logger.info(f"User folder {user_id} removed: {user_dir}")
 
+            # Drop only this user's embeddings, the rest of the face index is untouched
+            if self.face_index is not None:
+                self.face_index.remove_user(user_id)
+
             # Remove user from in-memory dictionary
             deleted_user = self.users.pop(user_id)
             
@@ -0,0 +1,162 @@
+import numpy as np
+
+SPEECH_MARGIN_DB = 10.0  # Frame energy above the noise floor that counts as speech
+FRICATIVE_MARGIN_DB = 5.0  # Lower margin for noisy, high-ZCR frames (s, f, sh)
+FRICATIVE_ZCR = 0.25  # Zero-crossing rate above which a frame looks like a fricative
+MIN_SPEECH_DBFS = -55.0  # Nothing quieter than this is speech, however quiet the room
+ONSET_SECONDS = 0.06  # Consecutive speech needed to start, so clicks and taps are ignored
+HANGOVER_SECONDS = 0.25  # Speech state is held this long after the last speech frame
+CALIBRATION_SECONDS = 0.2  # Initial frames that set the noise floor quickly
+FLOOR_FALL = 0.5  # Per-frame adaptation of the noise floor towards quieter frames
+FLOOR_RISE = 0.05  # Per-frame adaptation of the noise floor on non-speech frames
+FLOOR_RISE_IN_SPEECH = 0.002  # Much slower during speech, so a new steady noise is still learned
+MIN_FLOOR_DBFS = -90.0  # Digital silence (muted input) would otherwise pull the floor to -200 dB
+
+BARGE_IN_MARGIN_DB = 12.0  # How much louder than the prompt's echo the visitor must be
+BARGE_IN_SECONDS = 0.2  # Sustained loud speech needed to interrupt a prompt
+ECHO_ONSET_DB = 6.0  # Rise above the room level that marks the prompt reaching the microphone
+ECHO_ONSET_TIMEOUT_SECONDS = 1.0  # Without such a rise by then, the echo is taken to be at room level
+ECHO_CALIBRATION_SECONDS = 0.3  # Time after the echo onset used only to learn its echo level
+ECHO_RISE = 0.5  # Per-frame adaptation of the echo level towards louder frames
+ECHO_DECAY_DB = 0.25  # Per-frame decay of the echo level, so pauses between words do not reset it
+
+
+def frame_energy_db(frame: np.ndarray) -> float:
+    """RMS level of an int16 frame in dBFS."""
+    rms = np.sqrt(np.mean(frame.astype(np.float32) ** 2)) / 32768.0
+    return float(20.0 * np.log10(rms + 1e-10))
+
+
+class VoiceActivityDetector:
+    """
+    Frame-level voice activity detection from energy and zero-crossing rate,
+    measured against an adaptive noise floor.
+
+    The floor follows the background level on non-speech frames (drops
+    quickly, rises slowly), so a fan or street noise does not read as speech
+    the way a fixed energy threshold does. Speech has to last ONSET_SECONDS
+    before it starts, and the speech state is held for the hangover after
+    the last speech frame so short gaps inside words do not end it.
+    """
+
+    def __init__(self, sample_rate: int, speech_margin_db: float = SPEECH_MARGIN_DB,
+                 onset_seconds: float = ONSET_SECONDS, hangover_seconds: float = HANGOVER_SECONDS):
+        self.sample_rate = sample_rate
+        self.speech_margin_db = speech_margin_db
+        self.onset_seconds = onset_seconds
+        self.hangover_seconds = hangover_seconds
+
+        self.noise_floor_db = None
+        self._calibration_left = CALIBRATION_SECONDS
+        self.reset()
+
+    def reset(self):
+        """Starts a new utterance. The noise floor is kept, it describes the room, not the utterance."""
+        self.in_speech = False
+        self._speech_run = 0.0
+        self._since_speech = 0.0
+
+    def process(self, frame: np.ndarray) -> bool:
+        """
+        Classifies one int16 frame and returns the smoothed speech state:
+        True from onset until the hangover after the last speech frame.
+        """
+        duration = len(frame) / self.sample_rate
+        energy_db = frame_energy_db(frame)
+        zcr = np.count_nonzero(np.diff(np.signbit(frame))) / max(1, len(frame) - 1)
+
+        if self.noise_floor_db is None:
+            self.noise_floor_db = energy_db
+        if self._calibration_left > 0:
+            # The first frames only learn the background level
+            self._calibration_left -= duration
+            self.noise_floor_db = max(MIN_FLOOR_DBFS, 0.5 * (self.noise_floor_db + energy_db))
+            return False
+
+        above_floor = energy_db - self.noise_floor_db
+        is_speech = energy_db > MIN_SPEECH_DBFS and (
+            above_floor > self.speech_margin_db
+            or (zcr > FRICATIVE_ZCR and above_floor > FRICATIVE_MARGIN_DB)
+        )
+        self._update_floor(energy_db, is_speech)
+
+        if is_speech:
+            self._speech_run += duration
+            self._since_speech = 0.0
+            if self._speech_run >= self.onset_seconds:
+                self.in_speech = True
+        else:
+            self._speech_run = 0.0
+            self._since_speech += duration
+            if self._since_speech > self.hangover_seconds:
+                self.in_speech = False
+        return self.in_speech
+
+    def _update_floor(self, energy_db: float, is_speech: bool):
+        if energy_db < self.noise_floor_db:
+            rate = FLOOR_FALL
+        else:
+            rate = FLOOR_RISE_IN_SPEECH if is_speech else FLOOR_RISE
+        self.noise_floor_db = max(MIN_FLOOR_DBFS, self.noise_floor_db + rate * (energy_db - self.noise_floor_db))
+
+
+class BargeInDetector:
+    """
+    Detects the visitor talking over the device's own prompt.
+
+    There is no echo cancellation, so the microphone also hears the prompt.
+    The player takes a moment to start, so the detector first learns the
+    room level and waits for the input to rise ECHO_ONSET_DB above it. The
+    ECHO_CALIBRATION_SECONDS from that onset set the level of the echo,
+    which is then followed on the frames that are not candidates. A
+    barge-in is reported when the input stays at least margin_db above the
+    echo for BARGE_IN_SECONDS.
+    """
+
+    def __init__(self, sample_rate: int, margin_db: float = BARGE_IN_MARGIN_DB,
+                 min_seconds: float = BARGE_IN_SECONDS):
+        self.sample_rate = sample_rate
+        self.margin_db = margin_db
+        self.min_seconds = min_seconds
+        self.reset()
+
+    def reset(self):
+        """Starts a new prompt."""
+        self.room_db = None
+        self.echo_db = None
+        self._waited = 0.0
+        self._calibration_left = None  # None until the echo onset
+        self._loud_run = 0.0
+
+    def process(self, frame: np.ndarray) -> bool:
+        """Classifies one int16 frame captured during playback; True once the visitor barges in."""
+        duration = len(frame) / self.sample_rate
+        energy_db = frame_energy_db(frame)
+
+        if self._calibration_left is None:
+            if self.room_db is not None and energy_db > self.room_db + ECHO_ONSET_DB:
+                self._calibration_left = ECHO_CALIBRATION_SECONDS
+            else:
+                self.room_db = energy_db if self.room_db is None else 0.5 * (self.room_db + energy_db)
+                self._waited += duration
+                if self._waited >= ECHO_ONSET_TIMEOUT_SECONDS:
+                    # The prompt is too quiet to show up over the room
+                    self.echo_db = self.room_db
+                    self._calibration_left = 0.0
+                return False
+
+        if self._calibration_left > 0:
+            self._calibration_left -= duration
+            self.echo_db = energy_db if self.echo_db is None else max(self.echo_db, energy_db)
+            return False
+
+        if energy_db > MIN_SPEECH_DBFS and energy_db > self.echo_db + self.margin_db:
+            self._loud_run += duration
+            return self._loud_run >= self.min_seconds
+
+        self._loud_run = 0.0
+        if energy_db > self.echo_db:
+            self.echo_db += ECHO_RISE * (energy_db - self.echo_db)
+        else:
+            self.echo_db = max(energy_db, self.echo_db - ECHO_DECAY_DB)
+        return False